@@ -0,0 +1,175 @@
+# admission.py
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Deque, Dict, Optional
+
+from config import settings
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot get a provider slot (queue full or wait timed out)."""
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Best-effort detection of provider throttling across the SDKs we use."""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    if type(error).__name__ in ("RateLimitError", "ResourceExhausted"):
+        return True
+    message = str(error).lower()
+    return "429" in message or "rate limit" in message or "resource exhausted" in message
+
+
+class ProviderScheduler:
+    """
+    Concurrency gate for one provider.
+
+    The limit follows AIMD: it grows by roughly one slot per window of fast
+    successes, shrinks a little when time-to-first-token exceeds the target and
+    halves on a 429. Requests over the limit wait in per-user queues that are
+    served round-robin, so one heavy user cannot starve the others.
+    """
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.limit = float(settings.admission_initial_limit)
+        self.in_flight = 0
+        self._queues: "OrderedDict[object, Deque[asyncio.Future]]" = OrderedDict()
+        self.queue_depth = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.throttled = 0
+        self.avg_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    async def acquire(self, user_id) -> None:
+        started_at = time.monotonic()
+        if self.in_flight < int(self.limit) and not self._queues:
+            self.in_flight += 1
+            self._record_wait(started_at)
+            return
+
+        if self.queue_depth >= settings.admission_max_queue_depth:
+            self.rejected += 1
+            raise AdmissionRejected(f"{self.provider} queue is full")
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user_id, deque()).append(future)
+        self.queue_depth += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), settings.admission_queue_timeout_seconds)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # The slot was granted just as we gave up; hand it back
+                self.release(None, None)
+            else:
+                future.cancel()
+                self._drop(user_id, future)
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected += 1
+                raise AdmissionRejected(f"Timed out waiting for a {self.provider} slot")
+            raise
+        self._record_wait(started_at)
+
+    def release(self, ttft_seconds: Optional[float], error: Optional[BaseException]) -> None:
+        """Free a slot. A None ttft with no error (cancelled or empty stream) leaves the limit alone."""
+        self.in_flight -= 1
+
+        if error is not None and is_rate_limit_error(error):
+            self.throttled += 1
+            self.limit = max(settings.admission_min_limit, self.limit * 0.5)
+            print(f"--- INFO: {self.provider} throttled, concurrency limit now {int(self.limit)} ---")
+        elif error is None and ttft_seconds is not None and ttft_seconds > settings.admission_target_ttft_seconds:
+            self.limit = max(settings.admission_min_limit, self.limit * 0.9)
+        elif error is None and ttft_seconds is not None:
+            self.limit = min(settings.admission_max_limit, self.limit + 1.0 / self.limit)
+
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self.in_flight < int(self.limit) and self._queues:
+            user_id, queue = self._queues.popitem(last=False)
+            future = queue.popleft()
+            self.queue_depth -= 1
+            if queue:
+                # Back of the line: the next waiting user goes first
+                self._queues[user_id] = queue
+            if future.done():
+                continue
+            self.in_flight += 1
+            future.set_result(True)
+
+    def _drop(self, user_id, future: asyncio.Future) -> None:
+        queue = self._queues.get(user_id)
+        if queue and future in queue:
+            queue.remove(future)
+            self.queue_depth -= 1
+            if not queue:
+                del self._queues[user_id]
+
+    def _record_wait(self, started_at: float) -> None:
+        wait_ms = (time.monotonic() - started_at) * 1000
+        self.admitted += 1
+        self.avg_wait_ms = wait_ms if self.admitted == 1 else 0.9 * self.avg_wait_ms + 0.1 * wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def stats(self) -> Dict:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "queued_users": len(self._queues),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "throttled": self.throttled,
+            "avg_wait_ms": round(self.avg_wait_ms, 1),
+            "max_wait_ms": round(self.max_wait_ms, 1),
+        }
+
+
+class AdmissionScheduler:
+    def __init__(self):
+        self._providers: Dict[str, ProviderScheduler] = {}
+
+    def for_provider(self, provider: str) -> ProviderScheduler:
+        if provider not in self._providers:
+            self._providers[provider] = ProviderScheduler(provider)
+        return self._providers[provider]
+
+    async def admitted_stream(self, provider: str, user_id, stream: AsyncIterator[str]) -> AsyncIterator[str]:
+        """
+        Waits for a provider slot, then yields from stream while holding it.
+        The time to first chunk and any error are fed back into the provider's limit.
+        """
+        if not settings.admission_enabled:
+            async for chunk in stream:
+                yield chunk
+            return
+
+        scheduler = self.for_provider(provider)
+        await scheduler.acquire(user_id)
+        started_at = time.monotonic()
+        ttft = None
+        error = None
+        try:
+            async for chunk in stream:
+                if ttft is None:
+                    ttft = time.monotonic() - started_at
+                yield chunk
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+                # Cancelled by hedging or a client disconnect: not a provider signal
+                error = None
+                ttft = None
+            scheduler.release(ttft, error)
+            await stream.aclose()
+
+    def stats(self) -> Dict:
+        return {provider: scheduler.stats() for provider, scheduler in self._providers.items()}
+
+
+admission_scheduler = AdmissionScheduler()
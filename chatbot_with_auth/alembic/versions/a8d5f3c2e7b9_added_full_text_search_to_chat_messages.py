@@ -0,0 +1,66 @@
+"""added full text search to chat_messages
+
+Revision ID: a8d5f3c2e7b9
+Revises: f6b3d8e2a4c1
+Create Date: 2026-10-18 21:02:37.482913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8d5f3c2e7b9'
+down_revision: Union[str, Sequence[str], None] = 'f6b3d8e2a4c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        # An expression index stays in sync by itself
+        op.execute(
+            "CREATE INDEX ix_chat_messages_content_fts "
+            "ON chat_messages USING GIN (to_tsvector('english', content))"
+        )
+        return
+
+    # FTS5 table with its own copy of the text and the owner's user_id, so searches stay
+    # inside one user's messages. Deletes and updates only need the rowid.
+    op.execute(
+        "CREATE VIRTUAL TABLE chat_messages_fts USING fts5("
+        "content, user_id, tokenize='porter unicode61 remove_diacritics 2')"
+    )
+    op.execute(
+        "CREATE TRIGGER chat_messages_fts_insert AFTER INSERT ON chat_messages BEGIN "
+        "INSERT INTO chat_messages_fts(rowid, content, user_id) "
+        "SELECT new.id, new.content, user_id FROM chat_sessions WHERE id = new.session_id; END"
+    )
+    op.execute(
+        "CREATE TRIGGER chat_messages_fts_delete AFTER DELETE ON chat_messages BEGIN "
+        "DELETE FROM chat_messages_fts WHERE rowid = old.id; END"
+    )
+    op.execute(
+        "CREATE TRIGGER chat_messages_fts_update AFTER UPDATE OF content ON chat_messages BEGIN "
+        "UPDATE chat_messages_fts SET content = new.content WHERE rowid = new.id; END"
+    )
+    # Index the existing messages
+    op.execute(
+        "INSERT INTO chat_messages_fts(rowid, content, user_id) "
+        "SELECT m.id, m.content, s.user_id FROM chat_messages m JOIN chat_sessions s ON s.id = m.session_id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP INDEX ix_chat_messages_content_fts")
+        return
+
+    op.execute("DROP TRIGGER chat_messages_fts_update")
+    op.execute("DROP TRIGGER chat_messages_fts_delete")
+    op.execute("DROP TRIGGER chat_messages_fts_insert")
+    op.execute("DROP TABLE chat_messages_fts")
@@ -0,0 +1,91 @@
+"""
+Benchmark: DELETE /chats/all for a heavy account, ORM cascade vs set-based deletes.
+
+Builds a scratch SQLite database holding one user with many sessions and
+messages, then times:
+  - "orm cascade": load every session and session.delete() it, so the
+                   cascade loads and deletes every message row by row
+  - "set-based":   chat_history.delete_user_sessions, two DELETE statements
+Both commit once. The vector store purge runs in the background and is not timed.
+
+Run from chatbot_with_auth/:  python benchmarks/bench_delete_all.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, UTC
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from chat_history import delete_user_sessions
+from models import ChatMessage, ChatSession, User
+
+SESSIONS = 2000
+MESSAGES_PER_SESSION = 50
+
+
+def build_database(path: str) -> int:
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    started = datetime.now(UTC)
+    with Session(engine) as db:
+        user = User(username="heavy", email="heavy@example.com", hashed_password="x")
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        user_id = user.id
+    with engine.begin() as connection:
+        connection.execute(ChatSession.__table__.insert(), [
+            {"title": f"Session {i}", "user_id": user_id, "has_documents": False,
+             "created_at": started, "last_message_at": started}
+            for i in range(SESSIONS)
+        ])
+        rows = []
+        for session_id in range(1, SESSIONS + 1):
+            for n in range(MESSAGES_PER_SESSION):
+                rows.append({
+                    "content": f"message {n} " + "lorem ipsum dolor " * 20,
+                    "role": "user" if n % 2 == 0 else "model",
+                    "session_id": session_id,
+                    "truncated": False,
+                    "created_at": started + timedelta(milliseconds=len(rows)),
+                })
+        connection.execute(ChatMessage.__table__.insert(), rows)
+    engine.dispose()
+    return user_id
+
+
+def orm_cascade(db: Session, user_id: int) -> int:
+    chat_sessions = db.exec(select(ChatSession).where(ChatSession.user_id == user_id)).all()
+    for chat_session in chat_sessions:
+        db.delete(chat_session)
+    db.commit()
+    return len(chat_sessions)
+
+
+def set_based(db: Session, user_id: int) -> int:
+    deleted_ids, _ = delete_user_sessions(db, user_id)
+    db.commit()
+    return len(deleted_ids)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        template = os.path.join(directory, "template.db")
+        user_id = build_database(template)
+        print(f"1 user x {SESSIONS} sessions x {MESSAGES_PER_SESSION} messages")
+        for name, delete_all in (("orm cascade", orm_cascade), ("set-based", set_based)):
+            path = os.path.join(directory, f"{name.replace(' ', '_')}.db")
+            shutil.copy(template, path)
+            engine = create_engine(f"sqlite:///{path}")
+            with Session(engine) as db:
+                started = time.perf_counter()
+                deleted = delete_all(db, user_id)
+                elapsed = time.perf_counter() - started
+                remaining = len(db.exec(select(ChatMessage.id)).all())
+            engine.dispose()
+            print(f"  {name:>11}: {elapsed * 1000:9.1f} ms  ({deleted} sessions deleted, {remaining} messages left)")
@@ -0,0 +1,107 @@
+"""
+Benchmark: loading the recent history of a long chat session.
+
+Builds a scratch SQLite database with several sessions of 10k+ messages and
+times, per turn:
+  - "old query":   ORDER BY created_at ASC LIMIT n, which returns the OLDEST n rows
+  - "no index":    the correct newest-first query without the composite index
+  - "keyset":      chat_history.fetch_recent_messages on
+                   ix_chat_messages_session_id_created_at
+
+Run from chatbot_with_auth/:  python benchmarks/bench_history_fetch.py
+"""
+import os
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta, UTC
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from chat_history import fetch_recent_messages
+from models import ChatMessage, ChatSession, User
+
+SESSIONS = 5
+MESSAGES_PER_SESSION = 12000
+LIMIT = 51
+ROUNDS = 50
+
+
+def build_database(path: str):
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    started = datetime.now(UTC)
+    with Session(engine) as db:
+        user = User(username="bench", email="bench@example.com", hashed_password="x")
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        sessions = [ChatSession(title=f"Session {i}", user_id=user.id) for i in range(SESSIONS)]
+        db.add_all(sessions)
+        db.commit()
+        session_ids = [s.id for s in sessions]
+
+    rows = []
+    # Interleave sessions like real traffic, so a session's rows are spread across the table
+    for n in range(MESSAGES_PER_SESSION):
+        for session_id in session_ids:
+            rows.append({
+                "content": f"message {n} " + "lorem ipsum dolor " * 20,
+                "role": "user" if n % 2 == 0 else "model",
+                "session_id": session_id,
+                "truncated": False,
+                "created_at": started + timedelta(milliseconds=len(rows)),
+            })
+    with engine.begin() as connection:
+        connection.execute(ChatMessage.__table__.insert(), rows)
+    return engine, session_ids
+
+
+def old_query(db: Session, session_id: int):
+    statement = (
+        select(ChatMessage)
+        .where(ChatMessage.session_id == session_id)
+        .order_by(ChatMessage.created_at)
+        .limit(LIMIT)
+    )
+    return db.exec(statement).all()
+
+
+def newest_first_unindexed(db: Session, session_id: int):
+    statement = (
+        select(ChatMessage.id, ChatMessage.role, ChatMessage.content)
+        .where(ChatMessage.session_id == session_id)
+        .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+        .limit(LIMIT)
+    )
+    return db.exec(statement).all()
+
+
+def time_per_fetch(db: Session, session_id: int, fetch) -> float:
+    return min(timeit.repeat(lambda: fetch(db, session_id), number=ROUNDS, repeat=3)) / ROUNDS * 1000
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        engine, session_ids = build_database(os.path.join(directory, "bench.db"))
+        session_id = session_ids[-1]
+        print(f"{SESSIONS} sessions x {MESSAGES_PER_SESSION} messages, fetching {LIMIT} rows per turn")
+
+        with Session(engine) as db:
+            db.exec(text("DROP INDEX ix_chat_messages_session_id_created_at"))
+            oldest = old_query(db, session_id)
+            print(f"  old query returns messages {oldest[0].content.split()[1]}..{oldest[-1].content.split()[1]} (the oldest)")
+            print(f"  old query:  {time_per_fetch(db, session_id, old_query):7.3f} ms/turn")
+            print(f"  no index:   {time_per_fetch(db, session_id, newest_first_unindexed):7.3f} ms/turn")
+
+            db.exec(text(
+                "CREATE INDEX ix_chat_messages_session_id_created_at "
+                "ON chat_messages (session_id, created_at DESC, id DESC)"
+            ))
+            recent = fetch_recent_messages(db, session_id, LIMIT)
+            print(f"  keyset:     {time_per_fetch(db, session_id, lambda d, s: fetch_recent_messages(d, s, LIMIT)):7.3f} ms/turn")
+            print(f"  keyset returns messages {recent[0].content.split()[1]}..{recent[-1].content.split()[1]} (the latest)")
+        engine.dispose()
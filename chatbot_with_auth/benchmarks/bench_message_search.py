@@ -0,0 +1,117 @@
+"""
+Benchmark: searching a user's chat history.
+
+Builds a scratch SQLite database with many users' messages (words drawn from a
+Zipf-distributed vocabulary, like natural text) and times one page of results
+for the current user:
+  - "LIKE scan":  content LIKE '%word%' for each word over the user's messages,
+                  newest first
+                  (no ranking, no snippets)
+  - "FTS5":       chat_history.search_messages on chat_messages_fts, ranked by
+                  bm25 with snippets
+
+Run from chatbot_with_auth/:  python benchmarks/bench_message_search.py
+"""
+import os
+import random
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta, UTC
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from sqlmodel import Session, SQLModel, create_engine
+
+from chat_history import create_search_index, search_messages
+from models import ChatMessage, ChatSession, User
+
+USERS = 100
+SESSIONS_PER_USER = 10
+MESSAGES_PER_SESSION = 200
+PAGE_SIZE = 20
+ROUNDS = 20
+# The most frequent words first; the long tail is synthetic
+VOCABULARY = (
+    "model answer question python error stream token cache latency database index query "
+    "session history prompt context document retrieval search result server client request"
+).split() + [f"term{n}" for n in range(5000)]
+WEIGHTS = [1 / rank for rank in range(1, len(VOCABULARY) + 1)]
+COMMON_WORD = VOCABULARY[8]
+RARE_WORD = "kubernetes"
+
+
+def build_database(path: str):
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        create_search_index(connection)
+    random.seed(0)
+    started = datetime.now(UTC)
+    with Session(engine) as db:
+        users = [User(username=f"user{i}", email=f"user{i}@example.com", hashed_password="x") for i in range(USERS)]
+        db.add_all(users)
+        db.commit()
+        user_ids = [u.id for u in users]
+        sessions = [ChatSession(title=f"Session {n}", user_id=user_id) for user_id in user_ids for n in range(SESSIONS_PER_USER)]
+        db.add_all(sessions)
+        db.commit()
+        session_ids = [s.id for s in sessions]
+
+    rows = []
+    for n in range(MESSAGES_PER_SESSION):
+        for session_id in session_ids:
+            words = random.choices(VOCABULARY, weights=WEIGHTS, k=40)
+            if random.random() < 0.01:
+                words[random.randrange(len(words))] = RARE_WORD
+            rows.append({
+                "content": " ".join(words),
+                "role": "user" if n % 2 == 0 else "model",
+                "session_id": session_id,
+                "truncated": False,
+                "status": "COMPLETE",
+                "created_at": started + timedelta(milliseconds=len(rows)),
+            })
+    # The insert trigger indexes every row as it is written
+    with engine.begin() as connection:
+        connection.execute(ChatMessage.__table__.insert(), rows)
+    return engine, user_ids
+
+
+def like_scan(db: Session, user_id: int, query: str):
+    words = query.split()
+    conditions = " AND ".join(f"m.content LIKE :pattern{n}" for n in range(len(words)))
+    statement = text(
+        "SELECT m.id, m.session_id, m.content FROM chat_messages m "
+        "JOIN chat_sessions s ON s.id = m.session_id "
+        f"WHERE s.user_id = :user_id AND {conditions} "
+        "ORDER BY m.created_at DESC LIMIT :limit"
+    )
+    params = {f"pattern{n}": f"%{word}%" for n, word in enumerate(words)}
+    return db.exec(statement, params={**params, "user_id": user_id, "limit": PAGE_SIZE}).all()
+
+
+def time_per_search(search) -> float:
+    return min(timeit.repeat(search, number=ROUNDS, repeat=3)) / ROUNDS * 1000
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        engine, user_ids = build_database(os.path.join(directory, "bench.db"))
+        user_id = user_ids[len(user_ids) // 2]
+        total = USERS * SESSIONS_PER_USER * MESSAGES_PER_SESSION
+        print(f"{USERS} users x {SESSIONS_PER_USER * MESSAGES_PER_SESSION} messages ({total} total), {PAGE_SIZE} hits per page")
+
+        with Session(engine) as db:
+            searches = (
+                ("common word", COMMON_WORD),
+                ("two words", f"{COMMON_WORD} {VOCABULARY[30]}"),
+                ("rare word", RARE_WORD),
+            )
+            for label, word in searches:
+                hits, _ = search_messages(db, user_id, word, 0, PAGE_SIZE)
+                print(f"\n{label} '{word}' ({len(hits)} hits on the first page)")
+                print(f"  LIKE scan:  {time_per_search(lambda: like_scan(db, user_id, word)):7.3f} ms/search")
+                print(f"  FTS5:       {time_per_search(lambda: search_messages(db, user_id, word, 0, PAGE_SIZE)):7.3f} ms/search")
+        engine.dispose()
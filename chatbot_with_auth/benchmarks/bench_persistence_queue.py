@@ -0,0 +1,134 @@
+"""
+Benchmark: end-of-turn write throughput at 500 concurrent chats, direct commits vs the write-behind queue.
+
+Every chat runs TURNS_PER_CHAT turns back to back and each turn persists what
+finish_bot_response writes: the bot message (with the session's
+last_message_at) and the user's usage increment.
+  - "direct": the old path, two transactions per turn in worker threads
+              (message insert, then UsageTracker's own session)
+  - "queued": persistence_queue.PersistenceQueue, which groups the writes of
+              all concurrent turns into a few transactions on one writer thread
+Latency is the time a turn waits for its writes to be accepted (direct: committed).
+Runs against a scratch SQLite file.
+
+Run from chatbot_with_auth/:  python benchmarks/bench_persistence_queue.py
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, UTC
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlmodel import Session, SQLModel, create_engine, func, select
+
+from chat_history import touch_session
+from models import ChatMessage, ChatSession, UsageStats, User
+from persistence_queue import PersistenceQueue
+from usage_tracker import UsageDelta, UsageTracker
+
+CHATS = 500
+USERS = 50
+TURNS_PER_CHAT = 10
+WORKER_THREADS = 40  # Starlette's default threadpool size
+
+
+def build_database(path: str):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    started = datetime.now(UTC)
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {"username": f"user{i}", "email": f"user{i}@example.com", "hashed_password": "x",
+             "disabled": False, "role": "user", "is_verified": True}
+            for i in range(USERS)
+        ])
+        connection.execute(ChatSession.__table__.insert(), [
+            {"title": f"Chat {i}", "user_id": i % USERS + 1, "has_documents": False,
+             "created_at": started, "last_message_at": started}
+            for i in range(CHATS)
+        ])
+    return engine
+
+
+def bot_message(session_id: int, turn: int) -> ChatMessage:
+    return ChatMessage(
+        content=f"answer {turn} " + "lorem ipsum dolor " * 40, role="model", session_id=session_id,
+        model_name="gemini-2.0-flash", input_tokens=300, output_tokens=120,
+    )
+
+
+def usage_delta() -> UsageDelta:
+    return UsageDelta.for_message(model_name="gemini-2.0-flash", input_tokens=300, output_tokens=120)
+
+
+def write_direct(engine, session_id: int, user_id: int, turn: int):
+    with Session(engine) as db_session:
+        message = bot_message(session_id, turn)
+        db_session.add(message)
+        touch_session(db_session, session_id, message.created_at)
+        db_session.commit()
+    with Session(engine) as db_session:
+        UsageTracker.apply_deltas(db_session, {user_id: usage_delta()})
+        db_session.commit()
+
+
+async def run(engine, queued: bool):
+    persistence = PersistenceQueue(db_engine=engine) if queued else None
+    latencies = []
+    errors = 0
+
+    async def chat(session_id: int):
+        nonlocal errors
+        user_id = (session_id - 1) % USERS + 1
+        for turn in range(TURNS_PER_CHAT):
+            started = time.perf_counter()
+            try:
+                if queued:
+                    await persistence.asave_message(bot_message(session_id, turn))
+                    await persistence.atrack_usage(user_id, usage_delta())
+                else:
+                    await asyncio.to_thread(write_direct, engine, session_id, user_id, turn)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=WORKER_THREADS))
+    started = time.perf_counter()
+    await asyncio.gather(*(chat(session_id) for session_id in range(1, CHATS + 1)))
+    if queued:
+        # Durable: everything is committed before the clock stops
+        await asyncio.to_thread(persistence.stop)
+    elapsed = time.perf_counter() - started
+    return elapsed, latencies, errors, persistence.stats() if queued else None
+
+
+def check(engine):
+    with Session(engine) as db_session:
+        messages = db_session.exec(select(func.count(ChatMessage.id))).one()
+        usage_messages = db_session.exec(select(func.sum(UsageStats.messages_sent))).one()
+    return messages, usage_messages
+
+
+if __name__ == "__main__":
+    turns = CHATS * TURNS_PER_CHAT
+    print(f"{CHATS} concurrent chats ({USERS} users) x {TURNS_PER_CHAT} turns = {turns} turns, 2 writes each")
+    for queued in (False, True):
+        with tempfile.TemporaryDirectory() as directory:
+            engine = build_database(os.path.join(directory, "bench.db"))
+            elapsed, latencies, errors, stats = asyncio.run(run(engine, queued))
+            messages, usage_messages = check(engine)
+            engine.dispose()
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000
+        name = "queued" if queued else "direct"
+        print(f"\n  {name}: {turns / elapsed:8.0f} turns/s  ({elapsed:.2f}s, {errors} failed turns)")
+        print(f"          turn write latency p50 {statistics.median(latencies) * 1000:7.2f} ms  p99 {p99:7.2f} ms")
+        print(f"          rows: {messages} messages, {usage_messages} messages in usage stats")
+        if stats:
+            print(f"          {stats['batches']} transactions, {stats['avg_batch']} writes per transaction")
@@ -0,0 +1,89 @@
+"""
+Micro-benchmark: per-turn prompt assembly overhead, before and after prebuilt templates.
+
+"before" repeats what every turn used to do: build LangChain messages from the
+DB rows, concatenate the system prompt, compile a fresh ChatPromptTemplate,
+StrOutputParser and LCEL chain, then format the template. "template" formats
+the prompt compiled once at import and "fast path" builds the message list
+directly. No LLM is called.
+
+Run from chatbot_with_auth/:  python benchmarks/bench_prompt_assembly.py
+"""
+import os
+import sys
+import timeit
+from operator import itemgetter
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableLambda
+
+from prompts import (
+    RAG_MODE, RAG_SYSTEM_PROMPT, WEB_CONTEXT_HEADERS,
+    build_messages, format_documents, format_messages_with_template, history_from_rows,
+)
+
+HISTORY_ROWS = 20
+TURNS = 2000
+
+rows = [
+    SimpleNamespace(role="user" if i % 2 == 0 else "model", content=f"Message {i} " + "lorem ipsum " * 40)
+    for i in range(HISTORY_ROWS)
+]
+documents = [Document(page_content=f"Chunk {i} " + "dolor sit amet " * 60) for i in range(4)]
+web_context = "**Web Search Results:**\n\n" + "".join(f"**{i}. Title**\nSource: https://example.com/{i}\nSnippet\n\n" for i in range(5))
+prompt = "What does the document say about the quarterly results?"
+fake_model = RunnableLambda(lambda messages: messages)
+
+
+def before():
+    chat_history = []
+    for row in rows:
+        if row.role == "user":
+            chat_history.append(HumanMessage(content=row.content))
+        elif row.role == "model":
+            chat_history.append(AIMessage(content=row.content))
+    system_message = RAG_SYSTEM_PROMPT + WEB_CONTEXT_HEADERS[RAG_MODE] + web_context
+    rag_prompt = ChatPromptTemplate.from_messages([
+        ("system", system_message),
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("user", "{input}")
+    ])
+    chain = (
+        {
+            "context": lambda x: format_documents(documents),
+            "input": itemgetter("input"),
+            "chat_history": itemgetter("chat_history"),
+        }
+        | rag_prompt
+        | fake_model
+        | StrOutputParser()
+    )
+    # The part of chain.invoke that runs before the model
+    return rag_prompt.format_messages(context=format_documents(documents), input=prompt, chat_history=chat_history)
+
+
+def template():
+    return format_messages_with_template(
+        RAG_MODE, prompt, history_from_rows(rows), format_documents(documents), web_context
+    )
+
+
+def fast_path():
+    return build_messages(RAG_MODE, prompt, history_from_rows(rows), format_documents(documents), web_context)
+
+
+if __name__ == "__main__":
+    assert before() == template() == fast_path(), "assembly paths disagree"
+    print(f"RAG turn with {HISTORY_ROWS} history rows, {len(documents)} chunks, web context; {TURNS} turns each")
+    baseline = None
+    for name, fn in (("before", before), ("template", template), ("fast path", fast_path)):
+        seconds = min(timeit.repeat(fn, number=TURNS, repeat=3))
+        per_turn_us = seconds / TURNS * 1e6
+        baseline = baseline or per_turn_us
+        print(f"{name:>10}: {per_turn_us:8.1f} us/turn  ({baseline / per_turn_us:.1f}x)")
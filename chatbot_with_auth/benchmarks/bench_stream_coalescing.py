@@ -0,0 +1,100 @@
+"""
+Benchmark: writes and CPU per streamed answer, with and without chunk coalescing.
+
+Each stream replays a token-sized upstream (about 4 characters per chunk)
+through a StreamingResponse driven directly over ASGI. Like uvicorn, every
+"http.response.body" message is framed as an HTTP/1.1 chunk with h11 and
+written to a socket with one send() syscall; a thread drains the other end
+of the socket pair. CPU is process time (framing, syscalls and the drain
+thread) for all concurrent streams divided by the number of streams.
+
+Run from chatbot_with_auth/:  python benchmarks/bench_stream_coalescing.py
+"""
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("STREAM_COALESCING_ENABLED", "true")
+
+import h11
+from starlette.responses import StreamingResponse
+
+from stream_coalescer import coalesce_chunks
+
+STREAMS = 50
+TOKENS = 400
+TOKEN = "tok "
+
+
+async def upstream(tokens_per_second: float):
+    started_at = time.monotonic()
+    for index in range(TOKENS):
+        if tokens_per_second:
+            delay = started_at + index / tokens_per_second - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        yield TOKEN
+
+
+async def run_stream(coalesce: bool, tokens_per_second: float) -> int:
+    body = upstream(tokens_per_second)
+    if coalesce:
+        body = coalesce_chunks(body, max_bytes=64, max_delay_seconds=0.030)
+    response = StreamingResponse(body, media_type="text/plain; charset=utf-8")
+    server_sock, client_sock = socket.socketpair()
+    drainer = threading.Thread(target=drain, args=(client_sock,), daemon=True)
+    drainer.start()
+    conn = h11.Connection(h11.SERVER)
+    conn.receive_data(b"GET / HTTP/1.1\r\nHost: bench\r\n\r\n")
+    conn.next_event()
+    writes = 0
+
+    async def receive():
+        await asyncio.sleep(3600)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal writes
+        if message["type"] == "http.response.start":
+            data = conn.send(h11.Response(status_code=message["status"], headers=list(message["headers"])))
+        elif message.get("body"):
+            data = conn.send(h11.Data(data=message["body"]))
+        else:
+            data = conn.send(h11.EndOfMessage())
+        server_sock.sendall(data)
+        writes += 1
+
+    scope = {"type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "method": "GET", "headers": []}
+    await response(scope, receive, send)
+    server_sock.close()
+    drainer.join()
+    client_sock.close()
+    # Only body writes differ between the two modes
+    return writes - 2
+
+
+def drain(sock: socket.socket):
+    while sock.recv(65536):
+        pass
+
+
+async def measure(coalesce: bool, tokens_per_second: float):
+    cpu_started, wall_started = time.process_time(), time.monotonic()
+    writes = await asyncio.gather(*(run_stream(coalesce, tokens_per_second) for _ in range(STREAMS)))
+    cpu = time.process_time() - cpu_started
+    wall = time.monotonic() - wall_started
+    return sum(writes) / STREAMS, cpu / STREAMS * 1000, wall
+
+
+if __name__ == "__main__":
+    print(f"{STREAMS} concurrent streams x {TOKENS} chunks of {len(TOKEN)} bytes; coalescing at 64 bytes / 30 ms")
+    for label, rate in (("burst upstream", 0), ("paced upstream, 200 tok/s", 200)):
+        print(f"\n{label}")
+        for coalesce in (False, True):
+            writes, cpu_ms, wall = asyncio.run(measure(coalesce, rate))
+            name = "coalesced" if coalesce else "per chunk"
+            print(f"  {name:>9}: {writes:6.1f} writes/stream  {cpu_ms:7.2f} ms CPU/stream  ({wall:.2f}s wall)")
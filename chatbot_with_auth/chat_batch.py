@@ -0,0 +1,132 @@
+# chat_batch.py
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Dict, List
+
+from langchain_core.messages import BaseMessage
+
+from chatbot_service import get_chatbot_response, get_rag_chatbot_response
+from models import ChatMessage, MessageStatus
+from persistence_queue import persistence_queue
+from prompts import history_from_rows
+from usage_tracker import UsageDelta
+
+
+class BatchSession:
+    """A chat session used by a batch: its items run one at a time, each seeing the answers before it."""
+
+    def __init__(self, session_id: int, has_documents: bool, chat_history: List[BaseMessage]):
+        self.session_id = session_id
+        self.has_documents = has_documents
+        self.chat_history = chat_history
+        self.lock = asyncio.Lock()
+
+
+async def run_chat_batch(
+    items: List,
+    sessions: List[BatchSession],
+    user_id: int,
+    max_concurrency: int,
+) -> AsyncIterator[str]:
+    """
+    Answers many chat items (prompt, model_name, use_web_search, custom_id; sessions[i]
+    belongs to items[i]) and yields one NDJSON result line per item as it completes,
+    then a summary line.
+
+    At most max_concurrency items run at once; on top of that every provider call
+    goes through the same circuit breakers and admission scheduler as interactive
+    chats, so a batch gets the user's fair share of a provider and backs off on 429s.
+    Messages and usage go to the persistence queue, which commits the results of
+    items finishing close together in one transaction. If the client disconnects,
+    items still running are cancelled; finished ones are already saved.
+    """
+    started_at = time.monotonic()
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_item(index: int, item, batch_session: BatchSession) -> Dict:
+        # Waiting for an earlier item of the same session does not hold a concurrency slot
+        async with batch_session.lock:
+            async with semaphore:
+                return await answer_item(index, item, batch_session, user_id)
+
+    tasks = [asyncio.create_task(run_item(index, item, session)) for index, (item, session) in enumerate(zip(items, sessions))]
+    failed = 0
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            result = await next_result
+            if result["status"] != MessageStatus.COMPLETE.value:
+                failed += 1
+            yield json.dumps({"type": "result", **result}) + "\n"
+    finally:
+        pending = [task for task in tasks if not task.done()]
+        if pending:
+            print(f"--- INFO: Batch client disconnected, cancelling {len(pending)} unfinished items ---")
+            for task in pending:
+                task.cancel()
+            await asyncio.wait(pending)
+
+    yield json.dumps({
+        "type": "summary",
+        "items": len(items),
+        "completed": len(items) - failed,
+        "failed": failed,
+        "duration_ms": round((time.monotonic() - started_at) * 1000, 1),
+    }) + "\n"
+
+
+async def answer_item(index: int, item, batch_session: BatchSession, user_id: int) -> Dict:
+    """Runs one item through the regular chat pipeline and queues its messages and usage."""
+    session_id = batch_session.session_id
+    result = {"index": index, "custom_id": item.custom_id, "session_id": session_id}
+    started_at = time.monotonic()
+    try:
+        user_message = ChatMessage(content=item.prompt, role="user", session_id=session_id)
+        response_meta = {}
+        if batch_session.has_documents:
+            response_generator = get_rag_chatbot_response(
+                item.prompt, batch_session.chat_history, session_id, item.model_name, item.use_web_search,
+                response_meta, user_id=user_id
+            )
+        else:
+            response_generator = get_chatbot_response(
+                item.prompt, batch_session.chat_history, item.model_name, item.use_web_search,
+                response_meta, user_id=user_id
+            )
+        content = "".join([chunk async for chunk in response_generator])
+
+        answered_by = response_meta.get("model", item.model_name)
+        usage = response_meta.get("usage") or {"input_tokens": 0, "output_tokens": 0, "source": "none"}
+        final_status = MessageStatus.FAILED if response_meta.get("error") else MessageStatus.COMPLETE
+        bot_message = ChatMessage(
+            content=content,
+            role="model",
+            session_id=session_id,
+            model_name=answered_by,
+            input_tokens=usage["input_tokens"],
+            output_tokens=usage["output_tokens"],
+            status=final_status
+        )
+        await persistence_queue.asave_message(user_message)
+        await persistence_queue.asave_message(bot_message)
+        await persistence_queue.atrack_usage(user_id, UsageDelta.for_message(
+            model_name=answered_by,
+            web_search_used=item.use_web_search,
+            input_tokens=usage["input_tokens"],
+            output_tokens=usage["output_tokens"]
+        ))
+        # Later items of this session see this turn, as they would in a chat
+        batch_session.chat_history.extend(history_from_rows((user_message, bot_message)))
+
+        result.update({
+            "status": final_status.value,
+            "model": answered_by,
+            "content": content,
+            "usage": usage,
+            "error": response_meta.get("error"),
+        })
+    except Exception as e:
+        print(f"--- ERROR: Batch item {index} failed: {e} ---")
+        result.update({"status": MessageStatus.FAILED.value, "error": str(e)})
+    result["latency_ms"] = round((time.monotonic() - started_at) * 1000, 1)
+    return result
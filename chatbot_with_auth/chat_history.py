@@ -0,0 +1,275 @@
+# chat_history.py
+import re
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, text, tuple_, update
+from sqlmodel import Session, select
+
+from models import ChatMessage, ChatSession, MessageStatus
+
+
+def fetch_recent_messages(db_session: Session, session_id: int, limit: int) -> List:
+    """
+    The latest `limit` messages of a session, oldest first, as (id, role, content) rows.
+
+    Walks ix_chat_messages_session_id_created_at newest-first and stops after
+    `limit` entries, so the cost depends on `limit`, not on the session length.
+    """
+    statement = (
+        select(ChatMessage.id, ChatMessage.role, ChatMessage.content)
+        .where(ChatMessage.session_id == session_id)
+        .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+        .limit(limit)
+    )
+    rows = db_session.exec(statement).all()
+    rows.reverse()
+    return rows
+
+
+def fetch_message_page(
+    db_session: Session, session_id: int, before_id: Optional[int], limit: int
+) -> Tuple[List, Optional[int]]:
+    """
+    One page of a session's messages, oldest first, as (id, role, content, truncated, status) rows.
+
+    The page holds the `limit` messages just before the message `before_id`
+    (the latest messages when before_id is None). Returns the rows and the
+    cursor for the next, older page: the id of the oldest row on this page,
+    or None once the start of the session is reached. The keyset condition on
+    (created_at, id) keeps each page a short range scan of
+    ix_chat_messages_session_id_created_at, however far back the client scrolls.
+    """
+    statement = (
+        select(ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.truncated, ChatMessage.status)
+        .where(ChatMessage.session_id == session_id)
+    )
+    if before_id is not None:
+        cursor = db_session.exec(
+            select(ChatMessage.created_at)
+            .where(ChatMessage.id == before_id, ChatMessage.session_id == session_id)
+        ).first()
+        if cursor is None:
+            return [], None
+        statement = statement.where(
+            tuple_(ChatMessage.created_at, ChatMessage.id) < tuple_(cursor, before_id)
+        )
+    statement = statement.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(limit + 1)
+    rows = db_session.exec(statement).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    next_cursor = rows[0].id if has_more else None
+    return rows, next_cursor
+
+
+def touch_session(db_session: Session, session_id: int, message_at: datetime):
+    """
+    Moves a session's last_message_at forward to message_at, in the caller's transaction.
+
+    Call it next to every message insert so the sidebar ordering never needs
+    to look at chat_messages. It never moves the timestamp backwards.
+    """
+    db_session.exec(
+        update(ChatSession)
+        .where(ChatSession.id == session_id, ChatSession.last_message_at < message_at)
+        .values(last_message_at=message_at)
+    )
+
+
+def fetch_session_page(
+    db_session: Session, user_id: int, before_id: Optional[int], limit: int
+) -> Tuple[List, Optional[int]]:
+    """
+    One page of a user's sessions, most recently active first, as (id, title, last_message_at) rows.
+
+    Same cursor contract as fetch_message_page: before_id is the last session of
+    the previous page and the returned cursor is the last session of this page,
+    or None when there are no more. Each page is a range scan of
+    ix_chat_sessions_user_id_last_message_at.
+    """
+    statement = (
+        select(ChatSession.id, ChatSession.title, ChatSession.last_message_at)
+        .where(ChatSession.user_id == user_id)
+    )
+    if before_id is not None:
+        cursor = db_session.exec(
+            select(ChatSession.last_message_at)
+            .where(ChatSession.id == before_id, ChatSession.user_id == user_id)
+        ).first()
+        if cursor is None:
+            return [], None
+        statement = statement.where(
+            tuple_(ChatSession.last_message_at, ChatSession.id) < tuple_(cursor, before_id)
+        )
+    statement = statement.order_by(ChatSession.last_message_at.desc(), ChatSession.id.desc()).limit(limit + 1)
+    rows = db_session.exec(statement).all()
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def delete_user_sessions(
+    db_session: Session, user_id: int, session_ids: Optional[List[int]] = None
+) -> Tuple[List[int], List[int]]:
+    """
+    Deletes a user's sessions (all of them, or only session_ids) and their messages.
+
+    Runs two set-based DELETE statements in the caller's transaction instead of
+    loading every session and message for the ORM cascade; the caller commits.
+    Returns the deleted session ids and the subset that may have document
+    chunks in the vector store (has_documents set or unknown).
+    """
+    conditions = [ChatSession.user_id == user_id]
+    if session_ids is not None:
+        conditions.append(ChatSession.id.in_(session_ids))
+    rows = db_session.exec(select(ChatSession.id, ChatSession.has_documents).where(*conditions)).all()
+    if not rows:
+        return [], []
+
+    owned_sessions = select(ChatSession.id).where(*conditions)
+    db_session.exec(
+        delete(ChatMessage)
+        .where(ChatMessage.session_id.in_(owned_sessions))
+        .execution_options(synchronize_session=False)
+    )
+    db_session.exec(delete(ChatSession).where(*conditions).execution_options(synchronize_session=False))
+    deleted_ids = [row.id for row in rows]
+    document_session_ids = [row.id for row in rows if row.has_documents is not False]
+    return deleted_ids, document_session_ids
+
+
+def fail_stale_streams(db_session: Session, started_before: datetime, exclude_ids: Iterable[int] = ()) -> int:
+    """
+    Marks bot messages still STREAMING that started before started_before as FAILED
+    and truncated; they keep their last checkpoint. Such rows belong to a worker
+    that crashed or was redeployed mid-answer. exclude_ids are messages the caller
+    is still streaming. Returns the number of rows marked.
+    """
+    statement = (
+        update(ChatMessage)
+        .where(ChatMessage.status == MessageStatus.STREAMING, ChatMessage.created_at < started_before)
+        .values(status=MessageStatus.FAILED, truncated=True)
+    )
+    exclude_ids = list(exclude_ids)
+    if exclude_ids:
+        statement = statement.where(ChatMessage.id.not_in(exclude_ids))
+    return db_session.exec(statement).rowcount
+
+
+# Full-text index over chat_messages.content. On SQLite an FTS5 table kept in sync
+# by triggers; on PostgreSQL a GIN index on to_tsvector(content), which needs no
+# triggers. The Alembic migration creates the same objects.
+#
+# The FTS5 table stores its own copy of the text plus the owner's user_id as an
+# indexed column, so a search matches `user_id : "7" AND content : ...` inside the
+# index instead of matching every user's messages and filtering afterwards.
+SEARCH_TABLE = "chat_messages_fts"
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS chat_messages_fts USING fts5("
+    "content, user_id, tokenize='porter unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS chat_messages_fts_insert AFTER INSERT ON chat_messages BEGIN "
+    "INSERT INTO chat_messages_fts(rowid, content, user_id) "
+    "SELECT new.id, new.content, user_id FROM chat_sessions WHERE id = new.session_id; END",
+    "CREATE TRIGGER IF NOT EXISTS chat_messages_fts_delete AFTER DELETE ON chat_messages BEGIN "
+    "DELETE FROM chat_messages_fts WHERE rowid = old.id; END",
+    # Streaming checkpoints rewrite content; other column updates leave the index alone
+    "CREATE TRIGGER IF NOT EXISTS chat_messages_fts_update AFTER UPDATE OF content ON chat_messages BEGIN "
+    "UPDATE chat_messages_fts SET content = new.content WHERE rowid = new.id; END",
+]
+SQLITE_SEARCH_FILL = (
+    "INSERT INTO chat_messages_fts(rowid, content, user_id) "
+    "SELECT m.id, m.content, s.user_id FROM chat_messages m JOIN chat_sessions s ON s.id = m.session_id"
+)
+POSTGRES_SEARCH_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_chat_messages_content_fts "
+    "ON chat_messages USING GIN (to_tsvector('english', content))",
+]
+# Tokens in an FTS5 snippet (ts_headline uses its own defaults)
+SNIPPET_TOKENS = 16
+
+
+def create_search_index(connection):
+    """
+    Creates the full-text index if it is missing (databases built by create_all
+    rather than Alembic) and fills it from the existing messages.
+    """
+    if connection.dialect.name == "sqlite":
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": SEARCH_TABLE}
+        ).first()
+        for statement in SQLITE_SEARCH_DDL:
+            connection.execute(text(statement))
+        if not exists:
+            connection.execute(text(SQLITE_SEARCH_FILL))
+            print("--- INFO: Built the chat message search index ---")
+    elif connection.dialect.name == "postgresql":
+        for statement in POSTGRES_SEARCH_DDL:
+            connection.execute(text(statement))
+
+
+def build_match_query(user_id: int, query: str) -> Optional[str]:
+    """
+    Turns user input into an FTS5 query over the user's messages: every word must
+    match (after stemming, so "latencies" finds "latency"). Words are quoted, so FTS5
+    operators and syntax characters in the input are searched for literally.
+    None if there are no words.
+
+    No prefix matching: without a prefix index of the same length FTS5 expands a
+    prefix over every user's terms, which costs more than the whole search.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    return " AND ".join([f'user_id : "{user_id}"'] + [f'content : "{word}"' for word in words])
+
+
+def search_messages(
+    db_session: Session,
+    user_id: int,
+    query: str,
+    offset: int,
+    limit: int,
+) -> Tuple[List, Optional[int]]:
+    """
+    Messages of the user's sessions matching `query`, best match first, as
+    (message_id, session_id, session_title, role, created_at, snippet, rank) rows;
+    matches in the snippet are wrapped in ** (markdown bold). Returns the rows and
+    the offset of the next page, or None on the last page.
+
+    Ranking is bm25 on SQLite (lower is better) and ts_rank_cd on PostgreSQL
+    (higher is better); rank is only meaningful for ordering within one search.
+    """
+    if db_session.get_bind().dialect.name == "postgresql":
+        statement = text(
+            "SELECT m.id AS message_id, m.session_id, s.title AS session_title, m.role, m.created_at, "
+            "ts_headline('english', m.content, q, 'StartSel=**, StopSel=**') AS snippet, "
+            "ts_rank_cd(to_tsvector('english', m.content), q) AS rank "
+            "FROM chat_messages m JOIN chat_sessions s ON s.id = m.session_id, "
+            "websearch_to_tsquery('english', :query) q "
+            "WHERE to_tsvector('english', m.content) @@ q AND s.user_id = :user_id "
+            "ORDER BY rank DESC, m.id DESC LIMIT :limit OFFSET :offset"
+        )
+        params = {"query": query, "user_id": user_id}
+    else:
+        match_query = build_match_query(user_id, query)
+        if match_query is None:
+            return [], None
+        statement = text(
+            "SELECT m.id AS message_id, m.session_id, s.title AS session_title, m.role, m.created_at, "
+            "snippet(chat_messages_fts, 0, '**', '**', '...', :snippet_tokens) AS snippet, "
+            "chat_messages_fts.rank AS rank "
+            "FROM chat_messages_fts "
+            "JOIN chat_messages m ON m.id = chat_messages_fts.rowid "
+            "JOIN chat_sessions s ON s.id = m.session_id "
+            # The user_id column matches every row of the user, so it gets no weight. Ordering by
+            # FTS5's own rank column lets it sort the matches itself, so snippets are only built
+            # for the rows of the page
+            "WHERE chat_messages_fts MATCH :query AND chat_messages_fts.rank MATCH 'bm25(1.0, 0.0)' "
+            "ORDER BY chat_messages_fts.rank LIMIT :limit OFFSET :offset"
+        )
+        params = {"query": match_query, "snippet_tokens": SNIPPET_TOKENS}
+    # One extra row tells whether there is a next page
+    rows = db_session.exec(statement, params={**params, "limit": limit + 1, "offset": offset}).all()
+    next_offset = offset + limit if len(rows) > limit else None
+    return rows[:limit], next_offset
+
@@ -40,11 +40,13 @@ const ChatSettings = ({
                                     {models.map((model) => (
                                         <button
                                             key={model.name}
+                                            disabled={model.available === false}
+                                            title={model.available === false ? 'Provider temporarily unavailable' : undefined}
                                             onClick={() => {
                                                 onModelChange(model.name);
                                                 setIsModelDropdownOpen(false);
                                             }}
-                                            className={`w-full text-left px-3 py-2 rounded-md text-sm hover:bg-[hsl(var(--accent))] transition-colors ${
+                                            className={`w-full text-left px-3 py-2 rounded-md text-sm hover:bg-[hsl(var(--accent))] transition-colors disabled:opacity-50 disabled:cursor-not-allowed ${
                                                 selectedModel === model.name ? 'bg-[hsl(var(--primary))/10] text-[hsl(var(--primary))]' : 'text-[hsl(var(--foreground))]'
                                             }`}
                                         >
@@ -113,16 +113,23 @@ import { ChevronRightIcon } from "lucide-react";
 import { Send, MessageCircle, Paperclip} from 'lucide-react';
 import ChatMessage from './ChatMessage';
 
-export default function ChatWindow({ messages, onSendMessage, isLoading, onFileUpload, fileInputRef, chatInputRef }) {
+export default function ChatWindow({ messages, onSendMessage, isLoading, onFileUpload, fileInputRef, chatInputRef, hasOlderMessages, onLoadOlderMessages, isOlderLoading }) {
     const [input, setInput] = useState('');
     const messagesEndRef = useRef(null);
     const localInputRef = useRef(null);
+    const lastMessageIdRef = useRef(null);
 
     // Use the passed ref or create a local one
     const inputRef = chatInputRef || localInputRef;
 
     useEffect(() => {
-        messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
+        // Only follow the bottom when the newest message changes, not when older pages are prepended
+        const lastMessage = messages[messages.length - 1];
+        const lastMessageId = lastMessage ? lastMessage.id : null;
+        if (lastMessageId !== lastMessageIdRef.current || isLoading) {
+            messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
+        }
+        lastMessageIdRef.current = lastMessageId;
     }, [messages]);
 
     const handleSend = () => {
@@ -151,6 +158,18 @@ export default function ChatWindow({ messages, onSendMessage, isLoading, onFileU
                     </div>
                 )}
                 
+                {hasOlderMessages && (
+                    <div className="flex justify-center mb-4">
+                        <button
+                            onClick={onLoadOlderMessages}
+                            disabled={isOlderLoading}
+                            className="text-sm text-muted-foreground hover:text-foreground px-3 py-1 rounded-md border border-[hsl(var(--border))] disabled:opacity-50"
+                        >
+                            {isOlderLoading ? 'Loading...' : 'Load earlier messages'}
+                        </button>
+                    </div>
+                )}
+
                 <div className="space-y-4">
                     {messages.map((msg) => (
                         <div key={msg.id || Date.now()} className="fade-in">
@@ -117,7 +117,7 @@ const SessionItem = ({ session, onSelect, onDelete, onRename, activeSessionId })
 };
 
 
-export default function Sidebar({ sessions, onSelectSession, onNewChat, onDeleteSession, onRenameSession, activeSessionId, isLoading, isCollapsed, onToggleCollapse }) {
+export default function Sidebar({ sessions, onSelectSession, onNewChat, onDeleteSession, onRenameSession, activeSessionId, isLoading, isCollapsed, onToggleCollapse, hasMoreSessions, onLoadMoreSessions }) {
     const { logout } = useAuth();
     const { theme, toggleTheme } = useTheme();
 
@@ -203,6 +203,14 @@ export default function Sidebar({ sessions, onSelectSession, onNewChat, onDelete
                                 />
                             ))
                         )}
+                        {!isLoading && hasMoreSessions && (
+                            <button
+                                onClick={onLoadMoreSessions}
+                                className="w-full px-2 py-1.5 mt-1 text-xs text-[hsl(var(--muted-foreground))] hover:text-[hsl(var(--foreground))] rounded-md hover:bg-[hsl(var(--accent))] transition-colors"
+                            >
+                                Load older chats
+                            </button>
+                        )}
                     </div>
 
                     {/* Settings Button - Use CSS variables */}
@@ -13,9 +13,12 @@ import { Hand, PanelRight, Paperclip } from 'lucide-react';
 export default function ChatPage() {
     const { token } = useAuth();
     const [sessions, setSessions] = useState([]);
+    const [sessionsCursor, setSessionsCursor] = useState(null);
     const [activeSession, setActiveSession] = useState(null);
     const [currentUser,SetCurrentUser] = useState(null);
     const [messages, setMessages] = useState([]);
+    const [historyCursor, setHistoryCursor] = useState(null);
+    const [isOlderLoading, setIsOlderLoading] = useState(false);
     const [isLoading, setIsLoading] = useState(false);
     const [isHistoryLoading, setIsHistoryLoading] = useState(false);
     const [isSidebarCollapsed, setIsSidebarCollapsed] = useState(false);
@@ -35,7 +38,8 @@ export default function ChatPage() {
         setIsHistoryLoading(true);
         try {
             const data = await api.getChatSessions(token);
-            setSessions(data);
+            setSessions(data.sessions);
+            setSessionsCursor(data.next_cursor);
 
             console.log('--- DEBUG: Fetched data:', data);
             console.log('--- DEBUG: Fetched sessions:', sessions);
@@ -46,6 +50,17 @@ export default function ChatPage() {
         }
     };
 
+    const fetchMoreSessions = async () => {
+        if (!token || !sessionsCursor) return;
+        try {
+            const data = await api.getChatSessions(token, sessionsCursor);
+            setSessions(prev => [...prev, ...data.sessions]);
+            setSessionsCursor(data.next_cursor);
+        } catch (error) {
+            console.error("Failed to fetch more sessions:", error);
+        }
+    };
+
     const fetchAvailableModels = async () => {
         if (!token) return;
         setIsModelsLoading(true);
@@ -68,6 +83,7 @@ export default function ChatPage() {
     const handleNewChat = () => {
         setActiveSession(null);
         setMessages([]);
+        setHistoryCursor(null);
     };
 
     const handleSelectSession = async (sessionId) => {
@@ -76,14 +92,30 @@ export default function ChatPage() {
         try {
             const data = await api.getChatHistory(token, sessionId);
             setMessages(data.messages);
+            setHistoryCursor(data.next_cursor);
         } catch (error) {
             console.error("Failed to fetch chat history:", error);
             setMessages([]);
+            setHistoryCursor(null);
         } finally {
             setIsLoading(false);
         }
     };
 
+    const handleLoadOlderMessages = async () => {
+        if (!activeSession || !historyCursor || isOlderLoading) return;
+        setIsOlderLoading(true);
+        try {
+            const data = await api.getChatHistory(token, activeSession, historyCursor);
+            setMessages(prev => [...data.messages, ...prev]);
+            setHistoryCursor(data.next_cursor);
+        } catch (error) {
+            console.error("Failed to fetch older messages:", error);
+        } finally {
+            setIsOlderLoading(false);
+        }
+    };
+
     // Keyboard shortcuts handlers
     const handleFocusInput = () => {
         if (chatInputRef.current) {
@@ -287,6 +319,8 @@ export default function ChatPage() {
                 onRenameSession={handleRenameSession}
                 activeSessionId={activeSession}
                 isLoading={isHistoryLoading}
+                hasMoreSessions={Boolean(sessionsCursor)}
+                onLoadMoreSessions={fetchMoreSessions}
             />
             <div className="flex flex-col flex-1 min-h-0">
                 <ChatSettings
@@ -304,6 +338,9 @@ export default function ChatPage() {
                     onFileUpload={handleFileUpload}
                     fileInputRef={fileInputRef}
                     chatInputRef={chatInputRef}
+                    hasOlderMessages={Boolean(historyCursor)}
+                    onLoadOlderMessages={handleLoadOlderMessages}
+                    isOlderLoading={isOlderLoading}
                 />
             </div>
             
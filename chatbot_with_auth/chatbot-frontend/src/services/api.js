@@ -21,6 +21,10 @@ export const setupAuthInterceptor = (logout) => {
 };
 
 
+// A dropped stream is reattached to (GET /chats/{id}/stream) this many times before giving up
+const STREAM_REATTACH_ATTEMPTS = 3;
+const STREAM_REATTACH_DELAY_MS = 1000;
+
 // CHANGE: We are adding a new, separate function specifically for streaming.
 // This uses the native Fetch API because it handles response streams more effectively than Axios.
 /**
@@ -69,29 +73,66 @@ export async function streamMessage(token, prompt, sessionId, modelName = "gemin
         // *** ENHANCED DEBUG: Log session information from headers ***
         console.log('--- DEBUG: Session ID from headers:', sessionIdFromHeaders);
         console.log('--- DEBUG: Session was created:', sessionWasCreated);
-        // The reader allows us to process the response stream chunk by chunk.
-        const reader = response.body.getReader();
+        const messageId = response.headers.get('X-Message-ID');
         // The decoder converts the raw binary chunks (Uint8Array) into readable text.
+        // It is shared across reattaches, so a character split between two connections still decodes.
         const decoder = new TextDecoder();
-        
+        // Bytes of the answer received so far; a reattach continues from here
+        let received = 0;
+        let body = response.body;
+        // Byte offset of the answer at which the current connection starts
+        let position = 0;
+        let reattachesLeft = STREAM_REATTACH_ATTEMPTS;
+
         // DEBUG: Log that the frontend is ready to read the stream.
         console.log("--- DEBUG: Frontend ready to read stream ---");
 
-        // Loop indefinitely to read from the stream
         while (true) {
-            const { done, value } = await reader.read();
-            if (done) {
-                // DEBUG: Log when the stream has ended.
-                console.log("--- DEBUG: Stream finished ---");
-                break; // Exit the loop when the stream is complete.
+            // The reader allows us to process the response stream chunk by chunk.
+            const reader = body.getReader();
+            try {
+                while (true) {
+                    const { done, value } = await reader.read();
+                    if (done) {
+                        // DEBUG: Log when the stream has ended.
+                        console.log("--- DEBUG: Stream finished ---");
+                        break;
+                    }
+                    // After a reattach, skip the bytes of the first character that were already received
+                    const skip = Math.min(Math.max(received - position, 0), value.length);
+                    position += value.length;
+                    if (skip === value.length) {
+                        continue;
+                    }
+                    received += value.length - skip;
+                    const chunk = decoder.decode(value.subarray(skip), { stream: true });
+                    // DEBUG: Log each chunk received from the backend.
+                    console.log("--- DEBUG: FRONTEND CHUNK:", chunk);
+
+                    // Call the provided callback function with the new chunk of text.
+                    onChunk(chunk);
+                }
+                break;
+            } catch (error) {
+                // The connection dropped mid-answer: reattach for what the server buffered (and the
+                // rest of the answer when it is configured to keep generating for a reattach)
+                if (!messageId || reattachesLeft === 0) {
+                    throw error;
+                }
+                reattachesLeft -= 1;
+                console.log(`--- DEBUG: Stream dropped after ${received} bytes, reattaching ---`);
+                await new Promise(resolve => setTimeout(resolve, STREAM_REATTACH_DELAY_MS));
+                const resumed = await fetch(
+                    `${API_BASE_URL}/chats/${sessionIdFromHeaders}/stream?offset=${received}&message_id=${messageId}`,
+                    { headers: { 'Authorization': `Bearer ${token}` } }
+                );
+                if (!resumed.ok || !resumed.body) {
+                    // 410/404: the answer is no longer buffered, it is in the chat history instead
+                    throw new Error(`Could not reattach to the stream, status: ${resumed.status}`);
+                }
+                body = resumed.body;
+                position = parseInt(resumed.headers.get('X-Stream-Offset') || '0');
             }
-            
-            const chunk = decoder.decode(value);
-            // DEBUG: Log each chunk received from the backend.
-            console.log("--- DEBUG: FRONTEND CHUNK:", chunk);
-            
-            // Call the provided callback function with the new chunk of text.
-            onChunk(chunk);
         }
         return {
             sessionId: sessionIdFromHeaders ? parseInt(sessionIdFromHeaders) : sessionId,
@@ -145,10 +186,13 @@ export const api = {
         }
     },
 
-    async getChatSessions(token) {
+    async getChatSessions(token, beforeId = null) {
         try {
+            // Most recently active first; pass the previous response's next_cursor for the next page
+            const params = beforeId ? { before_id: beforeId } : {};
             const response = await apiClient.get('/chats/', {
-                headers: { 'Authorization': `Bearer ${token}` }
+                headers: { 'Authorization': `Bearer ${token}` },
+                params
             });
             return response.data;
         } catch (error) {
@@ -157,10 +201,13 @@ export const api = {
         }
     },
 
-    async getChatHistory(token, sessionId) {
+    async getChatHistory(token, sessionId, beforeId = null) {
         try {
+            // Latest page by default; pass the previous response's next_cursor to load older messages
+            const params = beforeId ? { before_id: beforeId } : {};
             const response = await apiClient.get(`/chats/${sessionId}`, {
-                headers: { 'Authorization': `Bearer ${token}` }
+                headers: { 'Authorization': `Bearer ${token}` },
+                params
             });
             return response.data;
         } catch (error) {
@@ -66,166 +66,299 @@
 
 import os
 import re
+import asyncio
+import time
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_openai import ChatOpenAI
 from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder, PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 from langchain_core.runnables import RunnablePassthrough
-from rag_service import get_session_retriever,get_session_retriever_with_scores
+from rag_service import get_session_retriever,get_session_retriever_with_scores, aembed_query
 from web_search_service import TavilySearchService
+from model_registry import model_registry
+from semantic_cache import semantic_cache, stream_cached_response
+from request_coalescer import request_coalescer
+from prompt_budget import fit_prompt
+from failover import stream_with_failover
+from admission import admission_scheduler
+from circuit_breaker import circuit_breakers
+from model_router import model_router, AUTO_MODEL
+from local_llm import LOCAL_PROVIDER
+from token_usage import StreamUsage, stream_text_with_usage, cached_usage, resolve_usage
+from prompts import CHAT_MODE, RAG_MODE, SYSTEM_PROMPTS, build_messages, format_documents
+from stream_protocol import describe_sources
 from config import settings
-from typing import List, Optional
-from operator import itemgetter
+from typing import List, Optional, AsyncIterator
 
 
+# Streamed in place of an answer when generating it failed
+ERROR_REPLY = "Sorry, I encountered an error while processing your request."
+
 # Model configurations
+# context_window is the prompt + output budget we allow per request; max_output_tokens is
+# reserved for the answer. Groq on-demand limits keep the 8B model's usable window small.
+# fallbacks are tried in order when the model fails or is slow to produce its first token.
 MODELS = {
+    # Virtual entry: each turn is routed to a concrete model by model_router
+    AUTO_MODEL: {
+        "provider": "auto",
+        "model_name": AUTO_MODEL
+    },
     # Google models
     "gemini-1.5-flash": {
         "provider": "google",
-        "model_name": "models/gemini-1.5-flash"
+        "model_name": "models/gemini-1.5-flash",
+        "context_window": 1048576,
+        "max_output_tokens": 8192,
+        "fallbacks": ["gemini-2.0-flash"]
     },
     "gemini-2.0-flash-lite": {
         "provider": "google", 
-        "model_name": "models/gemini-2.0-flash-lite"
+        "model_name": "models/gemini-2.0-flash-lite",
+        "context_window": 1048576,
+        "max_output_tokens": 8192,
+        "fallbacks": ["llama-3.1-8b-instant"]
     },
     "gemini-2.0-flash": {
         "provider": "google",
-        "model_name": "models/gemini-2.0-flash"
+        "model_name": "models/gemini-2.0-flash",
+        "context_window": 1048576,
+        "max_output_tokens": 8192,
+        "fallbacks": ["llama-3.3-70b-versatile"]
     },
     "gemini-2.5-pro": {
         "provider": "google",
-        "model_name": "models/gemini-2.5-pro"
+        "model_name": "models/gemini-2.5-pro",
+        "context_window": 1048576,
+        "max_output_tokens": 8192,
+        "fallbacks": ["gemini-2.0-flash"]
     },
     # Groq models
     "deepseek-r1-distill-llama-70b": {
         "provider": "groq",
-        "model_name": "deepseek-r1-distill-llama-70b"
+        "model_name": "deepseek-r1-distill-llama-70b",
+        "context_window": 131072,
+        "max_output_tokens": 8192,
+        "fallbacks": ["gemini-2.0-flash"]
     },
     "llama-3.1-8b-instant": {
         "provider": "groq",
-        "model_name": "llama-3.1-8b-instant"
+        "model_name": "llama-3.1-8b-instant",
+        "context_window": 8192,
+        "max_output_tokens": 2048,
+        "fallbacks": ["gemini-2.0-flash-lite"]
     },
     "llama-3.3-70b-versatile": {
         "provider": "groq",
-        "model_name": "llama-3.3-70b-versatile"
+        "model_name": "llama-3.3-70b-versatile",
+        "context_window": 131072,
+        "max_output_tokens": 4096,
+        "fallbacks": ["gemini-2.0-flash"]
     },
     "llama3-70b-8192": {
         "provider": "groq",
-        "model_name": "llama3-70b-8192"
+        "model_name": "llama3-70b-8192",
+        "context_window": 8192,
+        "max_output_tokens": 2048,
+        "fallbacks": ["llama-3.3-70b-versatile"]
     },
     "meta-llama/llama-4-maverick-17b-128e-instruct": {
         "provider": "groq",
-        "model_name": "meta-llama/llama-4-maverick-17b-128e-instruct"
+        "model_name": "meta-llama/llama-4-maverick-17b-128e-instruct",
+        "context_window": 131072,
+        "max_output_tokens": 4096,
+        "fallbacks": ["gemini-2.0-flash"]
     },
     # OpenRouter models
     "openai/gpt-oss-120b:free": {
         "provider": "openrouter",
-        "model_name": "openai/gpt-oss-120b:free"
+        "model_name": "openai/gpt-oss-120b:free",
+        "context_window": 131072,
+        "max_output_tokens": 4096,
+        "fallbacks": ["llama-3.3-70b-versatile"]
     },
     "qwen/qwen3-coder:free": {
         "provider": "openrouter",
-        "model_name": "qwen/qwen3-coder:free"
+        "model_name": "qwen/qwen3-coder:free",
+        "context_window": 262144,
+        "max_output_tokens": 4096,
+        "fallbacks": ["llama-3.3-70b-versatile"]
     },
     "qwen/qwen3-235b-a22b:free": {
         "provider": "openrouter",
-        "model_name": "qwen/qwen3-235b-a22b:free"
+        "model_name": "qwen/qwen3-235b-a22b:free",
+        "context_window": 40960,
+        "max_output_tokens": 4096,
+        "fallbacks": ["llama-3.3-70b-versatile"]
     },
     "deepseek/deepseek-r1-distill-llama-70b:free": {
         "provider": "openrouter",
-        "model_name": "deepseek/deepseek-r1-distill-llama-70b:free"
+        "model_name": "deepseek/deepseek-r1-distill-llama-70b:free",
+        "context_window": 32768,
+        "max_output_tokens": 4096,
+        "fallbacks": ["deepseek-r1-distill-llama-70b"]
     }
 }
 
+# Offline fake model for load tests (see local_llm.py), only listed when enabled
+if settings.local_llm_enabled:
+    MODELS[LOCAL_PROVIDER] = {
+        "provider": LOCAL_PROVIDER,
+        "model_name": "local-fake",
+        "context_window": 32768,
+        "max_output_tokens": 4096,
+        "fallbacks": []
+    }
+
 
 def get_model_instance(model_name: str = "gemini-1.5-flash"):
     """
-    Get the appropriate model instance based on model name
+    Get the pooled model instance for a model name.
+    Clients are created once per MODELS entry and reused across requests.
     """
     if model_name not in MODELS:
         raise ValueError(f"Unknown model: {model_name}. Available models: {list(MODELS.keys())}")
     
-    model_config = MODELS[model_name]
-    provider = model_config["provider"]
-    actual_model_name = model_config["model_name"]
-    
-    if provider == "google":
-        return ChatGoogleGenerativeAI(
-            model=actual_model_name,
-            google_api_key=settings.google_api_key
-        )
-    elif provider == "groq":
-        return ChatGroq(
-            model=actual_model_name,
-            groq_api_key=settings.grok_api_key
-        )
-    elif provider == "openrouter":
-        return ChatOpenAI(
-            model=actual_model_name,
-            openai_api_key=settings.openrouter_api_key,
-            openai_api_base="https://openrouter.ai/api/v1"
-        )
-    else:
-        raise ValueError(f"Unknown provider: {provider}")
+    return model_registry.get(model_name, MODELS[model_name])
 
 
-def get_chatbot_response(
+def get_model_candidates(model_name: str) -> List[str]:
+    """The requested model followed by its configured fallbacks."""
+    if model_name not in MODELS:
+        raise ValueError(f"Unknown model: {model_name}. Available models: {list(MODELS.keys())}")
+    fallbacks = [m for m in MODELS[model_name].get("fallbacks", []) if m in MODELS and m != model_name]
+    return [model_name] + fallbacks
+
+
+def guard_provider_stream(model_name: str, user_id: Optional[int], stream: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Wraps an upstream LLM stream in its provider's circuit breaker and admission scheduler.
+    Raises CircuitOpenError right away if the provider is known to be down.
+    """
+    provider = MODELS[model_name]["provider"]
+    circuit_breakers.for_provider(provider).check()
+    return admission_scheduler.admitted_stream(
+        provider, user_id, circuit_breakers.guarded_stream(provider, stream)
+    )
+
+
+async def get_chatbot_response(
     prompt: str, 
     chat_history: List[BaseMessage], 
     model_name: str = "gemini-1.5-flash",
-    use_web_search: bool = False
-):
+    use_web_search: bool = False,
+    response_meta: Optional[dict] = None,
+    user_id: Optional[int] = None
+) -> AsyncIterator[str]:
     """
-    Initializes the chatbot model and gets a streaming response,
+    Initializes the chatbot model and gets an async streaming response,
     now with conversational context, model selection, and optional web search.
+    Identical concurrent requests share one upstream stream.
+    If given, response_meta is filled with the model that actually answered and its token usage,
+    the web results ("sources") when web search is used, plus "error" when the answer failed
+    and an apology was streamed instead.
+    user_id is used for fair queueing when a provider is at its concurrency limit.
     """
-    llm = get_model_instance(model_name)
+    if response_meta is None:
+        response_meta = {}
+    if model_name == AUTO_MODEL:
+        model_name = model_router.route(prompt, chat_history)
+        response_meta["routed_from"] = AUTO_MODEL
+
+    # Serve near-duplicate standalone prompts from the semantic cache
+    cache_scope, cache_embedding = None, None
+    if semantic_cache.is_eligible(chat_history, use_web_search):
+        cache_scope = semantic_cache.chat_scope(model_name)
+        cached_response, cache_embedding = await semantic_cache.lookup(cache_scope, prompt)
+        if cached_response is not None:
+            response_meta.update({"model": model_name, "cached": True, "usage": cached_usage()})
+            async for chunk in stream_cached_response(cached_response):
+                yield chunk
+            return
+    
+    def produce(meta: dict):
+        return stream_chat_completion(
+            prompt, chat_history, model_name, use_web_search, cache_scope, cache_embedding, meta, user_id
+        )
+   
+    try:
+        if settings.request_coalescing_enabled:
+            flight_key = request_coalescer.make_key(model_name, prompt, chat_history, use_web_search)
+            response_stream = request_coalescer.stream(flight_key, produce, response_meta)
+        else:
+            response_stream = produce(response_meta)
+
+        async for chunk in response_stream:
+            yield chunk
+
+    except Exception as e:
+        print(f"--- DEBUG: Error streaming from LangChain: {e}")
+        response_meta["error"] = str(e)
+        yield ERROR_REPLY
+
+
+async def stream_chat_completion(
+    prompt: str, 
+    chat_history: List[BaseMessage], 
+    model_name: str,
+    use_web_search: bool,
+    cache_scope: Optional[tuple] = None,
+    cache_embedding=None,
+    response_meta: Optional[dict] = None,
+    user_id: Optional[int] = None
+) -> AsyncIterator[str]:
+    """
+    The upstream part of a plain chat turn: web search, prompt and LLM stream,
+    with failover to the model's fallbacks. The answering model's token usage
+    is recorded in response_meta["usage"], the web results in response_meta["sources"].
+    Raises on provider errors; get_chatbot_response turns them into the error reply.
+    """
+    candidates = get_model_candidates(model_name)
     
     # Initialize web search if enabled
-    web_search_context = ""
+    search_service = TavilySearchService()
+    search_results = []
     if use_web_search:
-        search_service = TavilySearchService()
-        search_results = search_service.search(prompt)
-        if search_results:
-            web_search_context = search_service.format_search_results(search_results)
+        search_results = await search_service.asearch(prompt, timeout=settings.web_search_timeout_seconds)
+        response_meta["sources"] = describe_sources([], search_results)
     
-    # Create system prompt with optional web search context
-    system_message = (
-        "You are a helpful assistant. You provide concise answers based on the provided context. "
-        "Format your responses using GitHub-flavored Markdown."
-    )
-    
-    if web_search_context:
-        system_message += f"\n\nHere is some relevant information from web search:\n\n{web_search_context}"
-    
-    prompt_template = ChatPromptTemplate.from_messages([
-        ("system", system_message),
-        MessagesPlaceholder(variable_name="chat_history"),
-        ("user", "{input}")
-    ])
-   
-    output_parser = StrOutputParser()
-    chain = prompt_template | llm | output_parser
-   
-    try:
-        print(f"--- DEBUG: Using model: {model_name} ---")
+    usage_by_model = {}
+
+    def start_stream(candidate: str):
+        llm = get_model_instance(candidate)
+
+        # Trim history and search results to this candidate's context window
+        fitted = fit_prompt(
+            MODELS[candidate], SYSTEM_PROMPTS[CHAT_MODE], prompt, chat_history, web_results=search_results
+        )
+        web_context = search_service.format_search_results(fitted.web_results) if fitted.web_results else ""
+        # The message list goes straight to the model; no per-turn template or chain
+        messages = build_messages(CHAT_MODE, prompt, fitted.chat_history, web_context=web_context)
+
+        print(f"--- DEBUG: Using model: {candidate} ---")
         print(f"--- DEBUG: Web search enabled: {use_web_search} ---")
         print(f"--- DEBUG: Streaming with prompt: '{prompt}' ---")
-        print(f"--- DEBUG: Chat history length: {len(chat_history)} ---")
-
-        response_stream = chain.stream({
-            "input": prompt,
-            "chat_history": chat_history
-        })
+        print(f"--- DEBUG: Chat history length: {len(fitted.chat_history)} ---")
+        print(f"--- DEBUG: Estimated prompt tokens: {fitted.prompt_tokens} ---")
+
+        usage = usage_by_model[candidate] = StreamUsage(fitted.prompt_tokens)
+        return guard_provider_stream(
+            candidate,
+            user_id,
+            stream_text_with_usage(llm.astream(messages), usage)
+        )
 
-        for chunk in response_stream:
+    full_response = ""
+    try:
+        async for chunk in stream_with_failover(candidates, start_stream, response_meta):
+            full_response += chunk
             yield chunk
+    finally:
+        response_meta["usage"] = resolve_usage(usage_by_model, response_meta.get("model"))
 
-    except Exception as e:
-        print(f"--- DEBUG: Error streaming from LangChain: {e}")
-        yield "Sorry, I encountered an error while processing your request."
+    # Stored once by the upstream stream, not once per coalesced subscriber
+    if cache_scope:
+        semantic_cache.store(cache_scope, cache_embedding, full_response)
 
 
 
@@ -269,97 +402,148 @@ def get_model(model_name:str = "gemini-1.5-flash"):
         raise ValueError(f"Unknown model name: {model_name}")
 
 
-def get_rag_chatbot_response(
+def retrieve_session_documents(session_id: int, query: str, query_embedding: Optional[list] = None) -> tuple[list, bool]:
+    """
+    Builds the session retriever and runs the relevance check.
+    Blocking (Chroma, plus the embedding call when no query_embedding is given),
+    so async callers run it in a worker thread.
+    """
+    retriever = get_session_retriever_with_scores(
+        session_id, similarity_threshold=0.95, query_embedding=query_embedding
+    )
+    return check_document_relevance(retriever, query, min_docs=1)
+
+
+async def gather_rag_context(
+    search_service: TavilySearchService,
+    prompt: str,
+    session_id: int,
+    use_web_search: bool
+) -> tuple[list, list, bool]:
+    """
+    Runs the web search and the query embedding + vector retrieval concurrently,
+    each stage under its own timeout from settings.
+    A slow or failed search degrades to no web context and a slow embedding call
+    falls back to embedding inside the retrieval thread. If retrieval itself
+    overruns, the turn is treated as having no relevant documents.
+    Returns (search_results, retrieved_docs, has_sufficient_docs).
+    """
+    started_at = time.monotonic()
+
+    async def web_search() -> list:
+        if not use_web_search:
+            return []
+        results = await search_service.asearch(prompt, timeout=settings.web_search_timeout_seconds)
+        print(f"--- DEBUG: Web search finished in {time.monotonic() - started_at:.2f}s ---")
+        return results
+
+    async def retrieve() -> tuple[list, bool]:
+        query_embedding = None
+        try:
+            query_embedding = await asyncio.wait_for(
+                aembed_query(prompt), settings.query_embedding_timeout_seconds
+            )
+        except Exception as e:
+            print(f"--- INFO: Query embedding failed or timed out ({e!r}), embedding during retrieval ---")
+        try:
+            # The worker thread cannot be interrupted; on timeout its result is simply ignored
+            result = await asyncio.wait_for(
+                asyncio.to_thread(retrieve_session_documents, session_id, prompt, query_embedding),
+                settings.retrieval_timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            print(f"--- ERROR: Document retrieval took longer than {settings.retrieval_timeout_seconds}s ---")
+            return [], False
+        print(f"--- DEBUG: Document retrieval finished in {time.monotonic() - started_at:.2f}s ---")
+        return result
+
+    search_results, (retrieved_docs, has_sufficient_docs) = await asyncio.gather(web_search(), retrieve())
+    return search_results, retrieved_docs, has_sufficient_docs
+
+
+async def get_rag_chatbot_response(
     prompt: str, 
     chat_history: List[BaseMessage], 
     session_id: int,
     model_name: str = "gemini-1.5-flash",
-    use_web_search: bool = False
-):
+    use_web_search: bool = False,
+    response_meta: Optional[dict] = None,
+    user_id: Optional[int] = None
+) -> AsyncIterator[str]:
     """
-    Generates a streaming RAG response using conversational context and retrieved documents
+    Generates an async streaming RAG response using conversational context and retrieved documents
     filtered by the session_id with model selection and optional web search.
+    If given, response_meta is filled with the model that actually answered and its token usage,
+    the retrieved documents and web results ("sources"), plus "error" when the answer failed
+    and an apology was streamed instead.
     """
-    model = get_model_instance(model_name)
+    if response_meta is None:
+        response_meta = {}
+    if model_name == AUTO_MODEL:
+        model_name = model_router.route(prompt, chat_history, rag_mode=True)
+        response_meta["routed_from"] = AUTO_MODEL
     
-    # Initialize web search if enabled
-    web_search_context = ""
-    if use_web_search:
-        search_service = TavilySearchService()
-        search_results = search_service.search(prompt)
-        if search_results:
-            web_search_context = search_service.format_search_results(search_results)
-
-    retriever = get_session_retriever_with_scores(session_id, similarity_threshold=0.95)
-
-    retrieved_docs, has_sufficient_docs = check_document_relevance(retriever, prompt, min_docs=1)
-    if not has_sufficient_docs:
-        print(f"--- INFO: Rejecting query due to insufficient relevant documents ---")
-        def rejection_generator():
-            yield "I cannot answer this question as I don't find sufficient relevant information in the uploaded documents. Please ensure your question is related to the content of the uploaded files."
-        return rejection_generator()
+    # Cached answers are scoped to this session so document-grounded replies never leak
+    cache_scope, cache_embedding = None, None
+    if semantic_cache.is_eligible(chat_history, use_web_search):
+        cache_scope = semantic_cache.rag_scope(model_name, session_id)
+        cached_response, cache_embedding = await semantic_cache.lookup(cache_scope, prompt)
+        if cached_response is not None:
+            response_meta.update({"model": model_name, "cached": True, "usage": cached_usage()})
+            async for chunk in stream_cached_response(cached_response):
+                yield chunk
+            return
     
-    def format_docs(docs_list):
-        if not docs_list:
-            return "No relevant documents found."
-        return "\n\n".join(doc.page_content for doc in docs_list)
-
-    # Create system prompt with optional web search context
-    system_message = (
-        """You are a document analysis assistant. Your ONLY job is to answer questions based STRICTLY on the provided context from uploaded documents.
-
-CRITICAL RULES:
-1. You MUST ONLY use information that is explicitly stated in the context provided below
-2. If the answer is not in the context, you MUST respond with: "I cannot answer this question as the information is not available in the uploaded documents."
-3. Do NOT use any general knowledge, assumptions, or information from outside the provided context
-4. Do NOT provide partial answers by mixing document content with general knowledge
-5. Do NOT make inferences beyond what is explicitly stated in the documents
-
-BEFORE answering any question:
-- First, carefully scan the provided context
-- Verify that the specific information needed to answer the question exists in the context
-- If you cannot find the specific information, use the rejection response above
-
-FORMAT REQUIREMENTS:
-- Use GitHub-flavored Markdown for formatting
-- Be concise and direct
-- Quote relevant sections when possible
-- If answering, cite which part of the document the information comes from
-
-CONTEXT:
-{context}
-
-THE CONTEXT IS YOUR KNOWLEDGE BASE THE CONTEXT IS ALL YOU KNOW
-
-Remember: It's better to say "I don't know based on the documents" than to provide information not found in the context."""
+    # Web search and document retrieval run concurrently, each with its own timeout
+    search_service = TavilySearchService()
+    search_results, retrieved_docs, has_sufficient_docs = await gather_rag_context(
+        search_service, prompt, session_id, use_web_search
     )
+    response_meta["sources"] = describe_sources(retrieved_docs, search_results)
+    if not has_sufficient_docs:
+        print(f"--- INFO: Rejecting query due to insufficient relevant documents ---")
+        yield "I cannot answer this question as I don't find sufficient relevant information in the uploaded documents. Please ensure your question is related to the content of the uploaded files."
+        return
     
-    if web_search_context:
-        system_message += f"\n\nAdditional web search information (use only if relevant to document context):\n\n{web_search_context}"
+    usage_by_model = {}
 
-    rag_prompt = ChatPromptTemplate.from_messages([
-        ("system", system_message),
-        MessagesPlaceholder(variable_name="chat_history"),
-        ("user", "{input}")
-    ])
+    def start_stream(candidate: str):
+        model = get_model_instance(candidate)
 
-    print(f"--- DEBUG: Creating RAG chain for session_id: {session_id} with model: {model_name} ---")
-    print(f"--- DEBUG: Web search enabled: {use_web_search} ---")
-    
-    rag_chain = (
-        {
-            "context": lambda x: format_docs(retrieved_docs),
-            "input": itemgetter("input"),
-            "chat_history": itemgetter("chat_history"),
-        }
-        | rag_prompt
-        | model
-        | StrOutputParser()
-    )
-    
-    print(f"--- DEBUG: RAG chain created for session_id: {session_id} ---")
-    return rag_chain.stream({
-        "input": prompt,
-        "chat_history": chat_history
-    })
+        # Trim history, retrieved chunks and search results to this candidate's context window
+        fitted = fit_prompt(
+            MODELS[candidate], SYSTEM_PROMPTS[RAG_MODE], prompt, chat_history,
+            documents=retrieved_docs, web_results=search_results
+        )
+        web_context = search_service.format_search_results(fitted.web_results) if fitted.web_results else ""
+        messages = build_messages(
+            RAG_MODE, prompt, fitted.chat_history,
+            context=format_documents(fitted.documents), web_context=web_context
+        )
 
+        print(f"--- DEBUG: Streaming RAG answer for session_id: {session_id} with model: {candidate} ---")
+        print(f"--- DEBUG: Web search enabled: {use_web_search} ---")
+        print(f"--- DEBUG: Estimated prompt tokens: {fitted.prompt_tokens} ---")
+        usage = usage_by_model[candidate] = StreamUsage(fitted.prompt_tokens)
+        return guard_provider_stream(
+            candidate,
+            user_id,
+            stream_text_with_usage(model.astream(messages), usage)
+        )
+
+    try:
+        candidates = get_model_candidates(model_name)
+        full_response = ""
+        async for chunk in stream_with_failover(candidates, start_stream, response_meta):
+            full_response += chunk
+            yield chunk
+
+        if cache_scope:
+            semantic_cache.store(cache_scope, cache_embedding, full_response)
+
+    except Exception as e:
+        print(f"--- DEBUG: Error streaming RAG response: {e}")
+        response_meta["error"] = str(e)
+        yield ERROR_REPLY
+    finally:
+        response_meta["usage"] = resolve_usage(usage_by_model, response_meta.get("model"))
@@ -1,20 +1,58 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import time
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
 from sqlmodel import Session, select
-from typing import List, Optional
-from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
 from fastapi import Body
 from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from anyio import from_thread
+from functools import partial
 from limiter import limiter
-from database import get_session
-from models import User, ChatSession, ChatMessage
-from dependencies import get_current_active_user
-from chatbot_service import get_chatbot_response, get_rag_chatbot_response, MODELS
+from database import get_session, engine
+from models import User, ChatSession, ChatMessage, MessageStatus
+from dependencies import get_current_active_user, require_admin
+from chatbot_service import ERROR_REPLY, get_chatbot_response, get_rag_chatbot_response, MODELS
 from slowapi import Limiter
 from slowapi.util import get_remote_address
-from langchain_core.messages import HumanMessage, AIMessage
-from usage_tracker import UsageTracker
+from usage_tracker import UsageDelta, UsageTracker
+from persistence_queue import persistence_queue
+from semantic_cache import semantic_cache
+from request_coalescer import request_coalescer
+from admission import admission_scheduler
+from circuit_breaker import circuit_breakers
+from model_router import model_router, AUTO_MODEL
+from prompts import history_from_rows
+from chat_history import (
+    delete_user_sessions, fetch_message_page, fetch_recent_messages, fetch_session_page, search_messages,
+    touch_session
+)
+from rag_service import delete_session_documents
+from stream_coalescer import coalesce_chunks
+from stream_buffer import stream_buffers
+from stream_protocol import MEDIA_TYPES, NDJSON_FORMAT, TEXT_FORMAT, frame_events
+from chat_batch import BatchSession, run_chat_batch
+from prompt_budget import count_tokens
+from config import settings
 
 CHAT_RATE_LIMIT = "30/minute"
+# Most recent history rows loaded per turn; prompt_budget trims them to the model's window
+HISTORY_FETCH_LIMIT = 50
+# Page size for GET /chats/{session_id} (default and upper bound)
+HISTORY_PAGE_SIZE = 50
+HISTORY_PAGE_MAX = 200
+# Page size for GET /chats/ (default and upper bound)
+SESSION_PAGE_SIZE = 50
+SESSION_PAGE_MAX = 200
+# Page size for GET /chats/search (default and upper bound)
+SEARCH_PAGE_SIZE = 20
+SEARCH_PAGE_MAX = 100
+# Longest a new turn waits for the previous answer of its session to be committed
+HISTORY_WRITE_WAIT_SECONDS = 2.0
+# Keeps detached persistence tasks alive until they finish
+_background_tasks = set()
 router = APIRouter(
     prefix="/chats",
     tags=["Chats"],
@@ -27,21 +65,62 @@ class ChatMessageResponse(BaseModel):
     id: int
     content: str
     role: str
+    truncated: bool = False
+    status: MessageStatus = MessageStatus.COMPLETE
 
 class ChatSessionResponse(BaseModel):
     id: int
     title: str
+    last_message_at: Optional[datetime] = None
+
+class ChatSessionPageResponse(BaseModel):
+    sessions: List[ChatSessionResponse]
+    # Pass as before_id to load the next page; None after the least recently active session
+    next_cursor: Optional[int] = None
 
 class ChatHistoryResponse(BaseModel):
     id: int
     title: str
     messages: List[ChatMessageResponse]
+    # Pass as before_id to load the previous page; None once the first message is reached
+    next_cursor: Optional[int] = None
+
+class ChatSearchHit(BaseModel):
+    message_id: int
+    session_id: int
+    session_title: str
+    role: str
+    created_at: datetime
+    # Matching words are wrapped in ** (markdown bold)
+    snippet: str
+    rank: float
+
+class ChatSearchResponse(BaseModel):
+    hits: List[ChatSearchHit]
+    # Pass as offset to load the next page; None on the last page
+    next_offset: Optional[int] = None
 
 class NewChatMessageRequest(BaseModel):
     prompt: str
     session_id: Optional[int] = None
     model_name: Optional[str] = "gemini-1.5-flash"
     use_web_search: Optional[bool] = False
+    # "ndjson" / "sse" stream framed events (sources, model, ttft, token, done) instead of plain text
+    stream_format: Literal["text", "ndjson", "sse"] = TEXT_FORMAT
+
+class BatchChatItem(BaseModel):
+    prompt: str
+    # None starts a new session for this item
+    session_id: Optional[int] = None
+    model_name: Optional[str] = "gemini-1.5-flash"
+    use_web_search: Optional[bool] = False
+    # Echoed back in the item's result line
+    custom_id: Optional[str] = None
+
+class BatchChatRequest(BaseModel):
+    items: List[BatchChatItem] = Field(min_length=1, max_length=settings.batch_max_items)
+    # Items answered at once; capped at settings.batch_max_concurrency
+    max_concurrency: Optional[int] = Field(None, ge=1)
 
 class RenameChatRequest(BaseModel):
     new_title: str
@@ -131,76 +210,171 @@ class RenameChatRequest(BaseModel):
 #         media_type="text/plain; charset=utf-8"
 #     )
 # *** CHANGE: Modified to return session ID in response headers ***
-def stream_and_save_response_with_headers(
+def check_model_name(model_name: Optional[str]):
+    """Rejects a model that is not configured before any rows are created for it."""
+    if model_name not in MODELS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown model: {model_name}. Available models: {list(MODELS.keys())}"
+        )
+
+
+def discard_bot_message(message_id: int):
+    """Deletes a bot message row that never received any content (runs in a worker thread)."""
+    with Session(engine) as db_session:
+        bot_message = db_session.get(ChatMessage, message_id)
+        if bot_message is not None:
+            db_session.delete(bot_message)
+            db_session.commit()
+
+
+async def stream_and_save_response_with_headers(
     prompt: str, 
     chat_session_id: int, 
     chat_history: list, 
-    db_session: Session,
+    has_documents: bool,
+    user_id: int,
+    bot_message_id: int,
     model_name: str = "gemini-1.5-flash",
     use_web_search: bool = False,
-    current_user:User = Depends(get_current_active_user)
+    response_meta: Optional[dict] = None
 ):
     """
-    Streams the chatbot response and saves the full message.
-    Now yields both content and session metadata with model selection and web search.
+    Streams the chatbot response asynchronously and saves it into the bot message row
+    created for this turn. While streaming, the text so far is checkpointed to the row
+    every stream_checkpoint_tokens tokens or stream_checkpoint_interval_ms, whichever
+    comes first, so a crash or redeploy loses at most the last few tokens.
+    Pass response_meta to read the model, usage and sources the chatbot service records.
     """
     print(f"--- DEBUG: Starting stream for session {chat_session_id} with model {model_name} ---")
     print(f"--- DEBUG: Web search enabled: {use_web_search} ---")
     print(f"--- DEBUG: Chat history length being passed: {len(chat_history)} ---")
 
-    chat_session = db_session.get(ChatSession, chat_session_id)
-    if not chat_session:
-        # This is a fallback, though the main endpoint should prevent this
-        raise HTTPException(status_code=404, detail="Chat session not found during streaming")
+    # Filled by the chatbot service with the model that actually answered and its token usage
+    if response_meta is None:
+        response_meta = {}
 
     # THE CORE LOGIC: Decide which response generator to use
-    if chat_session.has_documents:
+    if has_documents:
         print(f"--- INFO: Using RAG chain for session {chat_session_id} ---")
         response_generator = get_rag_chatbot_response(
-            prompt, chat_history, chat_session_id, model_name, use_web_search
+            prompt, chat_history, chat_session_id, model_name, use_web_search, response_meta,
+            user_id=user_id
         )
     else:
         print(f"--- INFO: Using standard chain for session {chat_session_id} ---")
         response_generator = get_chatbot_response(
-            prompt, chat_history, model_name, use_web_search
+            prompt, chat_history, model_name, use_web_search, response_meta,
+            user_id=user_id
         )
 
     full_bot_response = ""
-    for chunk in response_generator:
-        full_bot_response += chunk
-        yield chunk
+    # Tokens are estimated at 4 characters each (prompt_budget's fallback), nothing is counted per chunk
+    checkpoint_chars = settings.stream_checkpoint_tokens * 4
+    checkpoint_interval = settings.stream_checkpoint_interval_ms / 1000
+    checkpointed_length = 0
+    checkpoint_due_at = time.monotonic() + checkpoint_interval
+    try:
+        async for chunk in response_generator:
+            full_bot_response += chunk
+            yield chunk
+            unsaved_chars = len(full_bot_response) - checkpointed_length
+            if unsaved_chars >= checkpoint_chars or (unsaved_chars and time.monotonic() >= checkpoint_due_at):
+                await persistence_queue.acheckpoint_message(
+                    bot_message_id, chat_session_id, {"content": full_bot_response}
+                )
+                checkpointed_length = len(full_bot_response)
+                checkpoint_due_at = time.monotonic() + checkpoint_interval
+    except (asyncio.CancelledError, GeneratorExit):
+        # The client went away: stop pulling from the provider and keep what was generated.
+        # Awaiting here may be interrupted again by the cancellation, so the rest runs detached.
+        print(f"--- INFO: Client disconnected from session {chat_session_id}, cancelling upstream stream ---")
+        await response_generator.aclose()
+        task = asyncio.get_running_loop().create_task(
+            finish_bot_response(
+                chat_session_id, bot_message_id, user_id, full_bot_response, response_meta,
+                model_name, use_web_search, truncated=True
+            )
+        )
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        raise
+    except Exception as e:
+        # Failed before the chatbot service could reply with its own apology (e.g. in
+        # retrieval or the semantic cache): the row must not stay STREAMING
+        print(f"--- ERROR: Stream for session {chat_session_id} failed: {e} ---")
+        response_meta["error"] = str(e)
+        response_meta["usage"] = None
+        full_bot_response += ERROR_REPLY
+        await finish_bot_response(
+            chat_session_id, bot_message_id, user_id, full_bot_response, response_meta, model_name, use_web_search
+        )
+        yield ERROR_REPLY
+        return
        
     print(f"--- DEBUG: Finished streaming. Full response: '{full_bot_response[:100]}...' ---")
-   
-    bot_message_to_save = ChatMessage(
-        content=full_bot_response,
-        role="model",
-        session_id=chat_session_id
+    await finish_bot_response(
+        chat_session_id, bot_message_id, user_id, full_bot_response, response_meta, model_name, use_web_search
     )
-    db_session.add(bot_message_to_save)
-    
+
+
+async def finish_bot_response(
+    chat_session_id: int,
+    bot_message_id: int,
+    user_id: int,
+    content: str,
+    response_meta: dict,
+    model_name: str,
+    use_web_search: bool,
+    truncated: bool = False
+):
+    """
+    Writes the final text, status and token usage into the bot message and records usage.
+    A truncated answer (client disconnected) keeps its partial text and is billed
+    only for the tokens generated before the upstream stream was cancelled.
+    """
+    if truncated and not content:
+        print(f"--- INFO: Nothing was generated for session {chat_session_id} before disconnect, not saving ---")
+        await run_in_threadpool(discard_bot_message, bot_message_id)
+        return
+
+    answered_by = response_meta.get("model", model_name)
+    usage = response_meta.get("usage")
+    if usage is None and truncated:
+        # The upstream did not get to report usage before it was cancelled
+        usage = {"input_tokens": 0, "output_tokens": count_tokens(content), "source": "estimate"}
+    # No usage means no provider call completed (e.g. a rejected RAG query or an error reply)
+    usage = usage or {"input_tokens": 0, "output_tokens": 0, "source": "none"}
+    print(f"--- DEBUG: Token usage ({usage['source']}): {usage['input_tokens']} in / {usage['output_tokens']} out ---")
+   
+    final_status = MessageStatus.FAILED if response_meta.get("error") else MessageStatus.COMPLETE
+
+    # Both writes are committed by the persistence queue, batched with other turns
     try:
-        db_session.commit()
-        print(f"--- DEBUG: Successfully saved bot response to DB for session {chat_session_id} ---")
-        
-        # Track usage statistics
-        try:
-            # Estimate tokens (rough approximation: 1 token ≈ 4 characters)
-            estimated_tokens = len(full_bot_response) // 4
-            UsageTracker.track_message(
-                user_id=current_user.id,
-                tokens_used=estimated_tokens,
-                model_name=model_name,
-                web_search_used=use_web_search
-            )
-            print(f"--- DEBUG: Usage tracked for user {current_user.id} ---")
-        except Exception as tracking_error:
-            print(f"--- DEBUG: Error tracking usage: {tracking_error} ---")
-            
+        await persistence_queue.aupdate_message(bot_message_id, chat_session_id, {
+            "content": content,
+            "status": final_status,
+            "model_name": answered_by,
+            "input_tokens": usage["input_tokens"],
+            "output_tokens": usage["output_tokens"],
+            "truncated": truncated
+        })
+        print(f"--- DEBUG: Queued {'truncated ' if truncated else ''}bot response ({final_status.value}) for session {chat_session_id} ---")
     except Exception as e:
         print(f"--- DEBUG: Error saving bot response to DB: {e} ---")
-        db_session.rollback()
         raise
+        
+    # Track usage statistics
+    try:
+        await persistence_queue.atrack_usage(user_id, UsageDelta.for_message(
+            model_name=answered_by,
+            web_search_used=use_web_search,
+            input_tokens=usage["input_tokens"],
+            output_tokens=usage["output_tokens"]
+        ))
+        print(f"--- DEBUG: Usage tracked for user {user_id} ---")
+    except Exception as tracking_error:
+        print(f"--- DEBUG: Error tracking usage: {tracking_error} ---")
 
 
 @router.post("/", summary="Post a new message and get a streaming response")
@@ -211,6 +385,9 @@ def post_new_message(
     db_session: Session = Depends(get_session),
     current_user: User = Depends(get_current_active_user),
 ):
+    # TTFT in the framed protocol is measured from here
+    started_at = time.monotonic()
+    check_model_name(request_data.model_name)
     chat_session = None
     # *** CHANGE: Track if we created a new session ***
     session_was_created = False
@@ -230,18 +407,10 @@ def post_new_message(
         db_session.add(chat_session)
         
         try:
-            db_session.commit()
-            db_session.refresh(chat_session)
+            # Assigns the id; the session is committed together with the user message below
+            db_session.flush()
             session_was_created = True  # *** CHANGE: Mark that we created a new session ***
             print(f"--- DEBUG: Created NEW chat session with ID: {chat_session.id} ---")
-            
-            # Track session creation
-            try:
-                UsageTracker.track_session_created(current_user.id)
-                print(f"--- DEBUG: Session creation tracked for user {current_user.id} ---")
-            except Exception as tracking_error:
-                print(f"--- DEBUG: Error tracking session creation: {tracking_error} ---")
-                
         except Exception as e:
             print(f"--- DEBUG: Error creating chat session: {e} ---")
             db_session.rollback()
@@ -254,8 +423,20 @@ def post_new_message(
         session_id=chat_session.id
     )
     db_session.add(user_message)
+    # The answer's row exists from the start so checkpoints of the stream have somewhere to go
+    bot_message = ChatMessage(
+        content="",
+        role="model",
+        session_id=chat_session.id,
+        model_name=request_data.model_name,
+        status=MessageStatus.STREAMING
+    )
+    db_session.add(bot_message)
+    touch_session(db_session, chat_session.id, bot_message.created_at)
     
     try:
+        db_session.flush()
+        user_message_id, bot_message_id = user_message.id, bot_message.id
         db_session.commit()
         print(f"--- DEBUG: User message saved for session {chat_session.id} ---")
     except Exception as e:
@@ -263,23 +444,26 @@ def post_new_message(
         db_session.rollback()
         raise HTTPException(status_code=500, detail="Failed to save user message")
 
-    # Fetch chat history (excluding current message)
-    statement = (
-        select(ChatMessage)
-        .where(ChatMessage.session_id == chat_session.id)
-        .order_by(ChatMessage.created_at)
-        .limit(20)
-    )
-    db_messages = db_session.exec(statement).all()
+    if session_was_created:
+        # Track session creation
+        try:
+            persistence_queue.track_usage(current_user.id, UsageDelta(sessions_created=1))
+            print(f"--- DEBUG: Session creation tracked for user {current_user.id} ---")
+        except Exception as tracking_error:
+            print(f"--- DEBUG: Error tracking session creation: {tracking_error} ---")
+
+    # The previous answer may still be queued; history must include it
+    if not persistence_queue.wait_for_session(chat_session.id, timeout=HISTORY_WRITE_WAIT_SECONDS):
+        print(f"--- WARNING: Queued messages of session {chat_session.id} not committed yet, history may be incomplete ---")
+
+    # Fetch the most recent history; the newest rows are the two messages we just saved
+    db_messages = fetch_recent_messages(db_session, chat_session.id, HISTORY_FETCH_LIMIT + 2)
     print(f"--- DEBUG: Fetched {len(db_messages)} messages from DB for session {chat_session.id} ---")
 
-    # Format history for LangChain (excluding the current user message)
-    chat_history_for_chain = []
-    for msg in db_messages[:-1]:
-        if msg.role == "user":
-            chat_history_for_chain.append(HumanMessage(content=msg.content))
-        elif msg.role == "model":
-            chat_history_for_chain.append(AIMessage(content=msg.content))
+    # Format history for LangChain (excluding the current user message and the pending answer)
+    current_ids = (user_message_id, bot_message_id)
+    history_rows = [row for row in db_messages if row.id not in current_ids][-HISTORY_FETCH_LIMIT:]
+    chat_history_for_chain = history_from_rows(history_rows)
     
     print(f"--- DEBUG: Formatted {len(chat_history_for_chain)} messages for LangChain ---")
     print(request_data.prompt, 
@@ -287,62 +471,257 @@ def post_new_message(
             chat_history_for_chain, 
             db_session
         )
+    response_meta = {}
+    answer_stream = stream_and_save_response_with_headers(
+        request_data.prompt, 
+        chat_session.id, 
+        chat_history_for_chain, 
+        chat_session.has_documents,
+        current_user.id,
+        bot_message_id,
+        request_data.model_name,
+        request_data.use_web_search,
+        response_meta
+    )
+    if request_data.stream_format != TEXT_FORMAT:
+        answer_stream = frame_events(answer_stream, request_data.stream_format, response_meta, started_at, {
+            "session_id": chat_session.id,
+            "session_created": session_was_created,
+            "message_id": bot_message_id,
+            "requested_model": request_data.model_name
+        })
+    media_type = MEDIA_TYPES[request_data.stream_format]
+
+    # The answer is generated into a stream buffer, so a client that drops can reattach to it
+    # (to the rest of the answer only if stream_resume_grace_seconds keeps it generating)
+    # A response body nobody reads never starts the answer, so its placeholder row is deleted on eviction.
+    # The registry belongs to the event loop; this endpoint runs in a worker thread.
+    stream_buffer = from_thread.run_sync(partial(
+        stream_buffers.open, chat_session.id, bot_message_id, answer_stream, media_type,
+        on_unread=partial(discard_bot_message, bot_message_id)
+    ))
     # *** CHANGE: Create StreamingResponse with custom headers that include session ID ***
+    # Provider chunks are merged into fewer, larger writes before they reach the client
     response = StreamingResponse(
-        stream_and_save_response_with_headers(
-            request_data.prompt, 
-            chat_session.id, 
-            chat_history_for_chain, 
-            db_session,
-            request_data.model_name,
-            request_data.use_web_search
-        ),
-        media_type="text/plain; charset=utf-8"
+        coalesce_chunks(stream_buffer.follow(0)),
+        media_type=media_type
     )
     
     # *** CHANGE: Add session ID to response headers so frontend can capture it ***
     response.headers["X-Session-ID"] = str(chat_session.id)
     # *** CHANGE: Add flag to indicate if this was a new session ***
     response.headers["X-Session-Created"] = str(session_was_created).lower()
+    response.headers["X-Message-ID"] = str(bot_message_id)
     
     print(f"--- DEBUG: Returning response with session ID {chat_session.id} in headers ---")
     return response
 
+@router.post("/batch", summary="Answer many chat prompts, streaming NDJSON results as they complete (admin only)")
+def post_chat_batch(
+    *,
+    request_data: BatchChatRequest,
+    db_session: Session = Depends(get_session),
+    admin_user: User = Depends(require_admin),
+):
+    """
+    For evaluation and backfill jobs. Each item is answered like POST /chats/ and saved to
+    its session (a new one when session_id is None); items of the same session run in order.
+    Streams {"type": "result", ...} per item in completion order (match them by index or
+    custom_id), then {"type": "summary", ...}.
+    """
+    items = request_data.items
+    for item in items:
+        check_model_name(item.model_name)
+    session_ids = {item.session_id for item in items if item.session_id is not None}
+    # session_id -> has_documents
+    existing_sessions = {}
+    if session_ids:
+        existing_sessions = dict(db_session.exec(
+            select(ChatSession.id, ChatSession.has_documents)
+            .where(ChatSession.id.in_(session_ids), ChatSession.user_id == admin_user.id)
+        ).all())
+    missing_ids = sorted(session_ids - existing_sessions.keys())
+    if missing_ids:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Chat sessions not found: {missing_ids}")
+
+    # Sessions for the items without one, created in one transaction
+    new_sessions = [
+        ChatSession(title=item.prompt[:100], user_id=admin_user.id) for item in items if item.session_id is None
+    ]
+    new_session_ids = []
+    if new_sessions:
+        db_session.add_all(new_sessions)
+        try:
+            db_session.flush()
+            new_session_ids = [chat_session.id for chat_session in new_sessions]
+            db_session.commit()
+        except Exception as e:
+            print(f"--- DEBUG: Error creating batch chat sessions: {e} ---")
+            db_session.rollback()
+            raise HTTPException(status_code=500, detail="Failed to create chat sessions")
+        persistence_queue.track_usage(admin_user.id, UsageDelta(sessions_created=len(new_sessions)))
+
+    batch_sessions = {}
+    for session_id, has_documents in existing_sessions.items():
+        if not persistence_queue.wait_for_session(session_id, timeout=HISTORY_WRITE_WAIT_SECONDS):
+            print(f"--- WARNING: Queued messages of session {session_id} not committed yet, history may be incomplete ---")
+        history_rows = fetch_recent_messages(db_session, session_id, HISTORY_FETCH_LIMIT)
+        batch_sessions[session_id] = BatchSession(session_id, has_documents, history_from_rows(history_rows))
+    new_session_id_iter = iter(new_session_ids)
+    item_sessions = []
+    for item in items:
+        if item.session_id is None:
+            session_id = next(new_session_id_iter)
+            batch_sessions[session_id] = BatchSession(session_id, False, [])
+            item_sessions.append(batch_sessions[session_id])
+        else:
+            item_sessions.append(batch_sessions[item.session_id])
+
+    max_concurrency = min(request_data.max_concurrency or settings.batch_max_concurrency, settings.batch_max_concurrency)
+    print(f"--- INFO: Running a batch of {len(items)} chat items, {max_concurrency} at a time ---")
+    return StreamingResponse(
+        run_chat_batch(items, item_sessions, admin_user.id, max_concurrency),
+        media_type=MEDIA_TYPES[NDJSON_FORMAT]
+    )
+
 # --- Other Endpoints (No changes) ---
 @router.get("/models", summary="Get available models")
 def get_available_models():
-    """Get list of available models grouped by provider"""
+    """Get list of available models grouped by provider, with each provider's circuit state"""
     models_by_provider = {}
     for model_name, config in MODELS.items():
         provider = config["provider"]
         if provider not in models_by_provider:
             models_by_provider[provider] = []
+        if model_name == AUTO_MODEL:
+            # Routed per turn, and failover covers an unhealthy tier model
+            models_by_provider[provider].append({
+                "name": model_name,
+                "display_name": "Auto (picks a model per message)",
+                "available": True,
+                "circuit_state": None
+            })
+            continue
+        breaker = circuit_breakers.for_provider(provider)
         models_by_provider[provider].append({
             "name": model_name,
-            "display_name": model_name.replace("models/", "").replace("/", " / ")
+            "display_name": model_name.replace("models/", "").replace("/", " / "),
+            "available": breaker.is_available(),
+            "circuit_state": breaker.state
         })
     return models_by_provider
 
 
-@router.get("/", response_model=List[ChatSessionResponse], summary="Get all chat sessions for the current user")
+@router.get("/metrics", summary="Get chat pipeline metrics (admin only)")
+async def get_chat_metrics(admin_user: User = Depends(require_admin)):
+    """Runtime counters for the in-process chat pipeline"""
+    return {
+        "semantic_cache": semantic_cache.stats(),
+        "request_coalescing": request_coalescer.stats(),
+        "admission": admission_scheduler.stats(),
+        "circuit_breakers": circuit_breakers.stats(),
+        "auto_routing": model_router.stats(),
+        "persistence_queue": persistence_queue.stats(),
+        "stream_buffers": stream_buffers.stats()
+    }
+
+
+@router.get("/", response_model=ChatSessionPageResponse, summary="Get the chat sessions of the current user, most recently active first")
 def get_user_chat_sessions(
     *, 
+    before_id: Optional[int] = None,
+    limit: int = Query(SESSION_PAGE_SIZE, ge=1, le=SESSION_PAGE_MAX),
     session: Session = Depends(get_session), 
     current_user: User = Depends(get_current_active_user)
 ):
-    return current_user.sessions
+    sessions, next_cursor = fetch_session_page(session, current_user.id, before_id, limit)
+    return ChatSessionPageResponse(
+        sessions=[ChatSessionResponse(**row._mapping) for row in sessions],
+        next_cursor=next_cursor,
+    )
+
+@router.get("/search", response_model=ChatSearchResponse, summary="Search the messages of the current user's chat sessions")
+def search_chat_messages(
+    *,
+    q: str = Query(..., min_length=1, max_length=200),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=SEARCH_PAGE_MAX),
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Full-text search over message content, best match first. Every word of `q` must
+    match (word forms are stemmed, so "latencies" finds "latency"). Open a hit with
+    GET /chats/{session_id}.
+    """
+    hits, next_offset = search_messages(session, current_user.id, q, offset, limit)
+    return ChatSearchResponse(
+        hits=[ChatSearchHit(**hit._mapping) for hit in hits],
+        next_offset=next_offset,
+    )
 
 @router.get("/{session_id}", response_model=ChatHistoryResponse, summary="Get the history of a specific chat session")
 def get_chat_history(
     *, 
     session_id: int, 
+    before_id: Optional[int] = None,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_PAGE_MAX),
     session: Session = Depends(get_session), 
     current_user: User = Depends(get_current_active_user)
 ):
+    """
+    Returns the latest `limit` messages, or the `limit` messages before `before_id`.
+    Scroll back by passing the returned next_cursor as before_id.
+    """
     chat_session = session.get(ChatSession, session_id)
     if not chat_session or chat_session.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat session not found")
-    return chat_session
+    messages, next_cursor = fetch_message_page(session, session_id, before_id, limit)
+    return ChatHistoryResponse(
+        id=chat_session.id,
+        title=chat_session.title,
+        messages=[ChatMessageResponse(**message._mapping) for message in messages],
+        next_cursor=next_cursor,
+    )
+
+@router.get("/{session_id}/stream", summary="Reattach to the answer being streamed in a chat session")
+async def resume_chat_stream(
+    *,
+    session_id: int,
+    offset: int = Query(0, ge=0),
+    message_id: Optional[int] = None,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Streams the answer from byte `offset` (UTF-8 bytes of the response body already received) on,
+    live until it is finished, in the stream format it was requested with. Without `message_id` the newest answer of the session is used.
+    X-Stream-Offset is where the stream actually starts: an offset inside a character is moved
+    back to the start of that character, so the client skips the bytes it already has.
+    410 means that part of the answer is no longer buffered; reload the history instead.
+    Runs on the event loop, which owns the stream buffers; only the session lookup goes to a thread.
+    """
+    chat_session = await run_in_threadpool(session.get, ChatSession, session_id)
+    if not chat_session or chat_session.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat session not found")
+    stream_buffer = stream_buffers.get(session_id, message_id)
+    if stream_buffer is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No answer is being streamed for this message")
+    if offset > stream_buffer.end_offset:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Offset is past the end of the answer")
+    if offset < stream_buffer.start_offset:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="This part of the answer is no longer buffered")
+
+    start_offset = stream_buffer.resolve_offset(offset)
+    print(f"--- DEBUG: Reattaching to message {stream_buffer.message_id} at offset {start_offset} ---")
+    response = StreamingResponse(
+        coalesce_chunks(stream_buffer.follow(start_offset)),
+        media_type=stream_buffer.media_type
+    )
+    response.headers["X-Session-ID"] = str(session_id)
+    response.headers["X-Message-ID"] = str(stream_buffer.message_id)
+    response.headers["X-Stream-Offset"] = str(start_offset)
+    return response
 
 @router.put("/{session_id}", response_model=ChatSessionResponse, summary="Rename a chat session")
 def rename_chat_session(
@@ -366,30 +745,34 @@ def rename_chat_session(
 @router.delete("/all", status_code=status.HTTP_200_OK, summary="Delete all chat sessions for current user")
 def delete_all_chat_sessions(
     *,
+    background_tasks: BackgroundTasks,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_active_user)
 ):
-    # Get all chat sessions for the current user
-    chat_sessions = session.exec(
-        select(ChatSession).where(ChatSession.user_id == current_user.id)
-    ).all()
+    # Set-based deletes of all sessions and their messages, in one transaction
+    try:
+        deleted_ids, document_session_ids = delete_user_sessions(session, current_user.id)
+        session.commit()
+    except Exception as e:
+        print(f"--- ERROR: Failed to delete chat sessions for user {current_user.id}: {e} ---")
+        session.rollback()
+        raise HTTPException(status_code=500, detail="Failed to delete chat sessions")
     
-    if not chat_sessions:
+    if not deleted_ids:
         return {"message": "No chat sessions found to delete"}
     
-    # Delete all sessions (messages will be deleted automatically due to cascade)
-    for chat_session in chat_sessions:
-        session.delete(chat_session)
-    
-    session.commit()
+    semantic_cache.invalidate_sessions(deleted_ids)
+    # Purging the vector store is slow, so it runs after the response is sent
+    background_tasks.add_task(delete_session_documents, document_session_ids)
     
-    return {"message": f"Successfully deleted {len(chat_sessions)} chat sessions"}
+    return {"message": f"Successfully deleted {len(deleted_ids)} chat sessions"}
 
 
 @router.delete("/{session_id}", status_code=status.HTTP_200_OK, summary="Delete a chat session")
 def delete_chat_session(
     *,
     session_id: int,
+    background_tasks: BackgroundTasks,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_active_user)
 ):
@@ -398,8 +781,10 @@ def delete_chat_session(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat session not found")
     if chat_session.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to delete this chat session")
-    session.delete(chat_session)
+    semantic_cache.invalidate_session(session_id)
+    _, document_session_ids = delete_user_sessions(session, current_user.id, [session_id])
     session.commit()
+    background_tasks.add_task(delete_session_documents, document_session_ids)
     return {"message": "Chat session deleted successfully"}
 
 # @router.post("/")
@@ -0,0 +1,160 @@
+# circuit_breaker.py
+import asyncio
+import time
+from typing import AsyncIterator, Dict
+
+from admission import AdmissionRejected, is_rate_limit_error
+from config import settings
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Tracks the health of one provider.
+
+    After circuit_failure_threshold consecutive failures or first-token timeouts
+    the circuit opens and calls fail immediately. Once circuit_open_seconds have
+    passed it goes half-open and lets a few trial requests through: a success
+    closes it again, a failure re-opens it. Rate limiting is the admission
+    scheduler's job, so 429s do not count as failures here.
+    """
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trials_in_flight = 0
+        self.total_failures = 0
+        self.times_opened = 0
+
+    def _refresh(self):
+        if self.state == OPEN and time.monotonic() - self.opened_at >= settings.circuit_open_seconds:
+            self.state = HALF_OPEN
+            self.trials_in_flight = 0
+            print(f"--- INFO: Circuit for {self.provider} is half-open, allowing trial requests ---")
+
+    def is_available(self) -> bool:
+        """Non-consuming check used to skip a provider before queueing for it."""
+        self._refresh()
+        if self.state == OPEN:
+            return False
+        if self.state == HALF_OPEN:
+            return self.trials_in_flight < settings.circuit_half_open_max_trials
+        return True
+
+    def check(self):
+        if not self.is_available():
+            raise CircuitOpenError(f"{self.provider} is temporarily unavailable")
+
+    def begin(self) -> bool:
+        """Claim permission for one call. Returns True if the call is a half-open trial."""
+        self.check()
+        if self.state == HALF_OPEN:
+            self.trials_in_flight += 1
+            return True
+        return False
+
+    def record_success(self, trial: bool):
+        if trial:
+            self.trials_in_flight -= 1
+        if self.state != CLOSED:
+            print(f"--- INFO: Circuit for {self.provider} closed after a successful trial ---")
+        self.state = CLOSED
+        self.consecutive_failures = 0
+
+    def record_failure(self, trial: bool):
+        if trial:
+            self.trials_in_flight -= 1
+        self.consecutive_failures += 1
+        self.total_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= settings.circuit_failure_threshold:
+            if self.state != OPEN:
+                self.times_opened += 1
+                print(f"--- INFO: Circuit for {self.provider} opened after {self.consecutive_failures} failures ---")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def record_neutral(self, trial: bool):
+        """The call ended without telling us anything about provider health."""
+        if trial:
+            self.trials_in_flight -= 1
+
+    def stats(self) -> Dict:
+        self._refresh()
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "total_failures": self.total_failures,
+            "times_opened": self.times_opened,
+        }
+
+
+class CircuitBreakerRegistry:
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def for_provider(self, provider: str) -> CircuitBreaker:
+        if provider not in self._breakers:
+            self._breakers[provider] = CircuitBreaker(provider)
+        return self._breakers[provider]
+
+    async def guarded_stream(self, provider: str, stream: AsyncIterator[str]) -> AsyncIterator[str]:
+        """
+        Yields from stream while recording the outcome on the provider's breaker.
+        Waiting longer than circuit_ttft_timeout_seconds for the first chunk counts as a failure.
+        """
+        if not settings.circuit_breaker_enabled:
+            async for chunk in stream:
+                yield chunk
+            return
+
+        breaker = self.for_provider(provider)
+        trial = breaker.begin()
+        outcome = None
+        try:
+            try:
+                first_chunk = await asyncio.wait_for(stream.__anext__(), settings.circuit_ttft_timeout_seconds)
+            except StopAsyncIteration:
+                breaker.record_success(trial)
+                outcome = "success"
+                return
+            # The provider answered, so it is healthy even if the rest of the stream is cut short
+            breaker.record_success(trial)
+            outcome = "success"
+            yield first_chunk
+            async for chunk in stream:
+                yield chunk
+        except asyncio.TimeoutError:
+            if outcome is None:
+                breaker.record_failure(trial)
+                outcome = "failure"
+                raise TimeoutError(f"{provider} produced no output within {settings.circuit_ttft_timeout_seconds}s")
+            raise
+        except Exception as e:
+            if outcome is None:
+                if is_rate_limit_error(e) or isinstance(e, AdmissionRejected):
+                    breaker.record_neutral(trial)
+                else:
+                    breaker.record_failure(trial)
+                outcome = "failure"
+            raise
+        finally:
+            if outcome is None:
+                # Cancelled before the first chunk (hedge loser or client gone)
+                breaker.record_neutral(trial)
+            await stream.aclose()
+
+    def stats(self) -> Dict:
+        return {provider: breaker.stats() for provider, breaker in self._breakers.items()}
+
+
+circuit_breakers = CircuitBreakerRegistry()
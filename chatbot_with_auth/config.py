@@ -1,3 +1,4 @@
+from typing import Dict
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -17,6 +18,90 @@ class Settings(BaseSettings):
     mail_server: str
     mail_starttls: bool
     mail_ssl_tls: bool
+    # Connection pool size per LLM provider, e.g. LLM_MAX_CONNECTIONS='{"groq": 50}' ("tavily" for web search)
+    llm_max_connections: Dict[str, int] = {}
+    llm_default_max_connections: int = 20
+    llm_keepalive_expiry_seconds: float = 60.0
+    # Semantic response cache (off by default)
+    semantic_cache_enabled: bool = False
+    semantic_cache_threshold: float = 0.92
+    semantic_cache_max_entries: int = 1000
+    semantic_cache_ttl_seconds: int = 3600
+    semantic_cache_max_response_chars: int = 20000
+    # Turns with more prior messages than this bypass the cache
+    semantic_cache_max_history: int = 0
+    semantic_cache_embedding_model: str = "models/embedding-001"
+    # Share one upstream stream between identical concurrent chat requests
+    request_coalescing_enabled: bool = True
+    # Start the next fallback model if no token has arrived within this many seconds
+    hedging_enabled: bool = True
+    hedge_ttft_seconds: float = 5.0
+    # Adaptive (AIMD) per-provider concurrency limits with fair per-user queueing
+    admission_enabled: bool = True
+    admission_initial_limit: int = 8
+    admission_min_limit: int = 1
+    admission_max_limit: int = 64
+    admission_target_ttft_seconds: float = 3.0
+    admission_queue_timeout_seconds: float = 30.0
+    admission_max_queue_depth: int = 200
+    # Per-provider circuit breaker
+    circuit_breaker_enabled: bool = True
+    circuit_failure_threshold: int = 5
+    circuit_open_seconds: float = 30.0
+    circuit_half_open_max_trials: int = 1
+    circuit_ttft_timeout_seconds: float = 30.0
+    # Concrete model used for each tier when the "auto" model is selected
+    auto_route_tiers: Dict[str, str] = {
+        "fast": "llama-3.1-8b-instant",
+        "balanced": "gemini-2.0-flash",
+        "heavy": "gemini-2.5-pro",
+    }
+    # Per-stage timeouts for gathering prompt context; a stage that overruns is skipped
+    web_search_timeout_seconds: float = 3.0
+    query_embedding_timeout_seconds: float = 5.0
+    retrieval_timeout_seconds: float = 10.0
+    # Merge small streamed chunks into fewer writes: flush at this many bytes or after this delay
+    stream_coalescing_enabled: bool = True
+    stream_flush_bytes: int = 64
+    stream_flush_interval_ms: float = 30.0
+    # Deterministic offline "local" model for load tests; never enable in production
+    local_llm_enabled: bool = False
+    local_llm_ttft_seconds: float = 0.2
+    local_llm_tokens_per_second: float = 50.0
+    local_llm_response_tokens: int = 120
+    local_llm_error_rate: float = 0.0
+    local_llm_rate_limit_rate: float = 0.0
+    local_llm_seed: int = 0
+    # Hash-based embeddings for RAG with the local model; use a scratch Chroma directory
+    local_embeddings_enabled: bool = False
+    # Write-behind queue: bot messages and usage increments are committed in grouped transactions
+    persistence_queue_enabled: bool = True
+    persistence_flush_interval_ms: float = 5.0
+    persistence_batch_size: int = 500
+    # Writers block once this many writes are pending (back-pressure)
+    persistence_queue_max_size: int = 5000
+    # Streaming answers are saved to their row every N tokens or T ms, whichever comes first
+    stream_checkpoint_tokens: int = 50
+    stream_checkpoint_interval_ms: float = 1000.0
+    # Rows still STREAMING after this long, and not being streamed by this worker, belonged to a
+    # crashed or restarted worker and are marked FAILED; the sweep runs at startup and then every
+    # stream_sweep_interval_seconds. An answer of another worker that runs longer is marked too,
+    # but its final write sets the real status again.
+    stream_stale_after_seconds: int = 600
+    stream_sweep_interval_seconds: float = 60.0
+    # In-flight answers are kept in a ring buffer so a dropped client can reattach (GET /chats/{id}/stream)
+    stream_buffer_max_bytes: int = 262144
+    # Finished answers stay resumable this long; answers nobody started reading are discarded after it
+    stream_buffer_ttl_seconds: float = 30.0
+    # An answer with no client attached keeps generating this long before it is cancelled. 0 (the
+    # default) cancels the upstream as soon as the client disconnects, so nothing is generated or
+    # billed for nobody; a reattach then only gets what was buffered before the disconnect. A few
+    # seconds lets clients on flaky networks resume the full answer, at the cost of paying for
+    # answers whose client never comes back.
+    stream_resume_grace_seconds: float = 0.0
+    # POST /chats/batch: items per request and items answered at once (per request)
+    batch_max_items: int = 1000
+    batch_max_concurrency: int = 8
     model_config = SettingsConfigDict(env_file = ".env")
 
 settings = Settings()
\ No newline at end of file
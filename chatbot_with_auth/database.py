@@ -1,4 +1,5 @@
 from models import User
+from chat_history import create_search_index
 from sqlmodel import SQLModel,create_engine,Session
 from pathlib import Path
 from config import settings
@@ -11,6 +12,9 @@ engine = create_engine(settings.database_url,echo= True,connect_args={"check_sam
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    # The full-text index is raw DDL that create_all does not know about
+    with engine.begin() as connection:
+        create_search_index(connection)
 
 def get_session():
     with Session(engine) as session:
@@ -0,0 +1,107 @@
+# failover.py
+import asyncio
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from config import settings
+
+
+class _Attempt:
+    def __init__(self, model_name: str, stream: AsyncIterator[str]):
+        self.model_name = model_name
+        self.stream = stream
+        self.first_chunk_task = asyncio.ensure_future(stream.__anext__())
+
+
+async def _discard(attempt: _Attempt):
+    """Cancel a losing attempt and close its upstream stream."""
+    attempt.first_chunk_task.cancel()
+    try:
+        await attempt.first_chunk_task
+    except BaseException:
+        pass
+    try:
+        await attempt.stream.aclose()
+    except Exception:
+        pass
+
+
+async def stream_with_failover(
+    candidates: List[str],
+    start_stream: Callable[[str], AsyncIterator[str]],
+    response_meta: Optional[Dict] = None,
+) -> AsyncIterator[str]:
+    """
+    Streams from the first candidate model, failing over and hedging across the rest.
+
+    If a candidate errors before its first chunk, the next one starts immediately.
+    If no chunk has arrived within settings.hedge_ttft_seconds, the next candidate is
+    started alongside it. The first stream to produce a chunk wins and the others are
+    cancelled. Once a winner has yielded text, errors propagate as usual since part of
+    the answer has already been sent. The winning model is recorded in response_meta.
+    """
+    pending = list(candidates)
+    attempts: List[_Attempt] = []
+    last_error: Optional[BaseException] = None
+
+    def start_next():
+        model_name = pending.pop(0)
+        print(f"--- INFO: Starting upstream stream on {model_name} ---")
+        try:
+            attempts.append(_Attempt(model_name, start_stream(model_name)))
+        except Exception as e:
+            nonlocal last_error
+            last_error = e
+            print(f"--- DEBUG: Could not start {model_name}: {e} ---")
+
+    winner: Optional[_Attempt] = None
+    first_chunk = None
+
+    try:
+        while winner is None:
+            while not attempts and pending:
+                start_next()
+            if not attempts:
+                raise last_error or RuntimeError("No model candidates available")
+
+            can_hedge = settings.hedging_enabled and bool(pending)
+            done, _ = await asyncio.wait(
+                [a.first_chunk_task for a in attempts],
+                timeout=settings.hedge_ttft_seconds if can_hedge else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+
+            if not done:
+                print(f"--- INFO: No first token within {settings.hedge_ttft_seconds}s, hedging to {pending[0]} ---")
+                start_next()
+                continue
+
+            for attempt in [a for a in attempts if a.first_chunk_task in done]:
+                try:
+                    first_chunk = attempt.first_chunk_task.result()
+                except StopAsyncIteration:
+                    last_error = RuntimeError(f"{attempt.model_name} returned an empty response")
+                    attempts.remove(attempt)
+                    continue
+                except Exception as e:
+                    last_error = e
+                    print(f"--- DEBUG: {attempt.model_name} failed before first token: {e} ---")
+                    attempts.remove(attempt)
+                    continue
+                winner = attempt
+                break
+    finally:
+        for attempt in attempts:
+            if attempt is not winner:
+                await _discard(attempt)
+
+    if response_meta is not None:
+        response_meta["model"] = winner.model_name
+    if winner.model_name != candidates[0]:
+        print(f"--- INFO: Answer served by fallback model {winner.model_name} ---")
+
+    try:
+        yield first_chunk
+        async for chunk in winner.stream:
+            yield chunk
+    finally:
+        await winner.stream.aclose()
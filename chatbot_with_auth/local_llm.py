@@ -0,0 +1,136 @@
+# local_llm.py
+import asyncio
+import hashlib
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from prompt_budget import count_message_tokens
+
+
+LOCAL_PROVIDER = "local"
+
+_VOCABULARY = (
+    "the model streams a deterministic answer for load testing so that every run of the same "
+    "prompt produces identical text while latency throughput errors and throttling follow the "
+    "configured profile without calling any remote provider or spending quota"
+).split()
+
+
+class LocalProviderError(Exception):
+    """Injected provider failure."""
+
+
+class LocalRateLimitError(Exception):
+    """Injected throttling; carries status_code 429 like the real SDK errors."""
+
+    status_code = 429
+
+
+class LocalFakeChatModel(BaseChatModel):
+    """
+    Offline stand-in for a provider chat model, for benchmarking the chat stack.
+
+    The answer is derived from a hash of the prompt, so the same conversation
+    always gets the same text. Streaming waits ttft_seconds before the first token
+    and then paces tokens at tokens_per_second. error_rate and rate_limit_rate
+    inject failures and 429s, drawn from an RNG seeded with seed so a run's
+    sequence of outcomes is reproducible. The final chunk reports usage metadata.
+    """
+
+    ttft_seconds: float = 0.2
+    tokens_per_second: float = 50.0
+    response_tokens: int = 120
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    seed: int = 0
+
+    _rng: random.Random = None
+    _rng_lock: threading.Lock = None
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._rng = random.Random(self.seed)
+        self._rng_lock = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "local-fake"
+
+    def _answer_tokens(self, messages: List[BaseMessage]) -> List[str]:
+        digest = hashlib.sha256(f"{self.seed}:{messages[-1].content if messages else ''}".encode()).digest()
+        words = random.Random(digest)
+        return [words.choice(_VOCABULARY) + " " for _ in range(self.response_tokens)]
+
+    def _maybe_fail(self):
+        with self._rng_lock:
+            roll = self._rng.random()
+        if roll < self.rate_limit_rate:
+            raise LocalRateLimitError("429 Too Many Requests (injected by local provider)")
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise LocalProviderError("Injected local provider error")
+
+    def _usage(self, messages: List[BaseMessage], output_tokens: int) -> dict:
+        input_tokens = sum(count_message_tokens(message) for message in messages)
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.ttft_seconds)
+        self._maybe_fail()
+        tokens = self._answer_tokens(messages)
+        time.sleep(len(tokens) / self.tokens_per_second)
+        message = AIMessage(content="".join(tokens), usage_metadata=self._usage(messages, len(tokens)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.ttft_seconds)
+        self._maybe_fail()
+        tokens = self._answer_tokens(messages)
+        for token in tokens:
+            time.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(content="", usage_metadata=self._usage(messages, len(tokens)))
+        )
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.ttft_seconds)
+        self._maybe_fail()
+        tokens = self._answer_tokens(messages)
+        started_at = time.monotonic()
+        for index, token in enumerate(tokens):
+            # Pace against the start time so sleep overhead does not lower the rate
+            delay = started_at + index / self.tokens_per_second - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(content="", usage_metadata=self._usage(messages, len(tokens)))
+        )
@@ -1,5 +1,15 @@
+import asyncio
 from fastapi import FastAPI
-from database import create_db_and_tables
+from datetime import datetime, timedelta, UTC
+from sqlmodel import Session
+from config import settings
+from database import create_db_and_tables, engine
+from chat_history import fail_stale_streams
+from model_registry import model_registry
+from web_search_service import aclose_search_client
+from persistence_queue import persistence_queue
+from stream_buffer import stream_buffers
+from fastapi.concurrency import run_in_threadpool
 import auth
 import users
 import chats
@@ -19,10 +29,44 @@ app = FastAPI(
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)  
 setup_cors(app)
+_stream_sweeper = None
+
+def sweep_stale_streams(exclude_ids=()):
+    # Answers interrupted by a crash or restart keep their last checkpoint but are no longer streaming
+    started_before = datetime.now(UTC) - timedelta(seconds=settings.stream_stale_after_seconds)
+    with Session(engine) as session:
+        marked = fail_stale_streams(session, started_before, exclude_ids)
+        session.commit()
+    if marked:
+        print(f"--- INFO: Marked {marked} interrupted bot messages as failed ---")
+
+async def run_stream_sweeper():
+    # Rows left by a restart are younger than stream_stale_after_seconds at startup, so sweep again later
+    while True:
+        await asyncio.sleep(settings.stream_sweep_interval_seconds)
+        try:
+            evicted = await stream_buffers.evict_unstarted()
+            if evicted:
+                print(f"--- INFO: Discarded {evicted} answers whose response was never read ---")
+            await run_in_threadpool(sweep_stale_streams, stream_buffers.message_ids())
+        except Exception as e:
+            print(f"--- ERROR: Stale stream sweep failed: {e} ---")
 
 @app.on_event("startup")
-def on_startup():
-    create_db_and_tables()
+async def on_startup():
+    global _stream_sweeper
+    await run_in_threadpool(create_db_and_tables)
+    await run_in_threadpool(sweep_stale_streams)
+    _stream_sweeper = asyncio.get_running_loop().create_task(run_stream_sweeper())
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if _stream_sweeper is not None:
+        _stream_sweeper.cancel()
+    await model_registry.aclose()
+    await aclose_search_client()
+    # Commit every queued chat message and usage increment before the process exits
+    await run_in_threadpool(persistence_queue.stop)
 
 app.include_router(auth.router)
 app.include_router(users.router)
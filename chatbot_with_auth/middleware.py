@@ -17,5 +17,6 @@ def setup_cors(app: FastAPI):
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
-        expose_headers=["X-Session-ID", "X-Session-Created"]
+        # Read by the cross-origin clients; X-Message-ID and X-Stream-Offset to reattach to a dropped answer
+        expose_headers=["X-Session-ID", "X-Session-Created", "X-Message-ID", "X-Stream-Offset"]
     )
@@ -0,0 +1,125 @@
+# model_registry.py
+import threading
+from typing import Dict
+
+import httpx
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_openai import ChatOpenAI
+from langchain_groq import ChatGroq
+from config import settings
+from local_llm import LocalFakeChatModel, LOCAL_PROVIDER
+
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+
+class ModelClientRegistry:
+    """
+    Process-wide cache of chat model clients, keyed by MODELS entry.
+
+    Each client is built once and reused across requests and threads, so its
+    keep-alive connection pool survives between chat turns. The httpx pools are
+    shared per provider and capped by settings.llm_max_connections.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, object] = {}
+        self._http_clients: Dict[str, httpx.Client] = {}
+        self._async_http_clients: Dict[str, httpx.AsyncClient] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_key: str, model_config: dict):
+        """Return the cached client for a MODELS entry, creating it on first use."""
+        client = self._clients.get(model_key)
+        if client is not None:
+            return client
+
+        with self._lock:
+            # Another thread may have built it while we waited for the lock
+            client = self._clients.get(model_key)
+            if client is None:
+                client = self._build_client(model_config)
+                self._clients[model_key] = client
+                print(f"--- INFO: Created pooled client for model {model_key} ---")
+            return client
+
+    def _limits(self, provider: str) -> httpx.Limits:
+        max_connections = settings.llm_max_connections.get(
+            provider, settings.llm_default_max_connections
+        )
+        return httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=settings.llm_keepalive_expiry_seconds,
+        )
+
+    def _http_client(self, provider: str) -> httpx.Client:
+        if provider not in self._http_clients:
+            self._http_clients[provider] = httpx.Client(limits=self._limits(provider))
+        return self._http_clients[provider]
+
+    def _async_http_client(self, provider: str) -> httpx.AsyncClient:
+        if provider not in self._async_http_clients:
+            self._async_http_clients[provider] = httpx.AsyncClient(limits=self._limits(provider))
+        return self._async_http_clients[provider]
+
+    def _build_client(self, model_config: dict):
+        provider = model_config["provider"]
+        actual_model_name = model_config["model_name"]
+        # Cap the answer at the output size the prompt budget reserved for it
+        max_output_tokens = model_config.get("max_output_tokens")
+
+        if provider == "google":
+            # The Gemini SDK manages its own channel; reusing the client object keeps it warm
+            return ChatGoogleGenerativeAI(
+                model=actual_model_name,
+                google_api_key=settings.google_api_key,
+                max_output_tokens=max_output_tokens
+            )
+        elif provider == "groq":
+            return ChatGroq(
+                model=actual_model_name,
+                groq_api_key=settings.grok_api_key,
+                max_tokens=max_output_tokens,
+                http_client=self._http_client(provider),
+                http_async_client=self._async_http_client(provider)
+            )
+        elif provider == "openrouter":
+            return ChatOpenAI(
+                model=actual_model_name,
+                openai_api_key=settings.openrouter_api_key,
+                openai_api_base=OPENROUTER_BASE_URL,
+                max_tokens=max_output_tokens,
+                # Ask for the usage block on the final streamed chunk
+                stream_usage=True,
+                http_client=self._http_client(provider),
+                http_async_client=self._async_http_client(provider)
+            )
+        elif provider == LOCAL_PROVIDER:
+            return LocalFakeChatModel(
+                ttft_seconds=settings.local_llm_ttft_seconds,
+                tokens_per_second=settings.local_llm_tokens_per_second,
+                response_tokens=min(settings.local_llm_response_tokens, max_output_tokens or settings.local_llm_response_tokens),
+                error_rate=settings.local_llm_error_rate,
+                rate_limit_rate=settings.local_llm_rate_limit_rate,
+                seed=settings.local_llm_seed
+            )
+        else:
+            raise ValueError(f"Unknown provider: {provider}")
+
+    async def aclose(self):
+        """Close the shared connection pools. Called on application shutdown."""
+        with self._lock:
+            http_clients = list(self._http_clients.values())
+            async_http_clients = list(self._async_http_clients.values())
+            self._clients.clear()
+            self._http_clients.clear()
+            self._async_http_clients.clear()
+
+        for client in http_clients:
+            client.close()
+        for client in async_http_clients:
+            await client.aclose()
+
+
+model_registry = ModelClientRegistry()
@@ -0,0 +1,96 @@
+# model_router.py
+import re
+from collections import Counter
+from typing import Dict, List
+
+from langchain_core.messages import BaseMessage
+from config import settings
+from prompt_budget import count_tokens
+
+
+AUTO_MODEL = "auto"
+
+# Short acknowledgements and edit requests that any model handles well
+TRIVIAL_PATTERN = re.compile(
+    r"^\s*(thanks?( you)?|thx|ok(ay)?|cool|great|nice|got it|yes|no|sure|hi|hello|hey|"
+    r"(please )?(rephrase|reword|shorten|simplify|translate|summari[sz]e)\b.*)\W*$",
+    re.IGNORECASE,
+)
+REASONING_PATTERN = re.compile(
+    r"\b(why|prove|derive|analy[sz]e|compare|trade-?offs?|step by step|design|architect|"
+    r"optimi[sz]e|evaluate|critique|plan)\b",
+    re.IGNORECASE,
+)
+CODE_PATTERN = re.compile(
+    r"```|\bdef |\bclass |\bfunction\b|\btraceback\b|\bexception\b|\bstack trace\b|\bsql\b|\bregex\b|[{};]\s*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+MATH_PATTERN = re.compile(r"\d+\s*[-+*/^=]\s*\d+|\bintegral\b|\bequation\b|\bprobability\b", re.IGNORECASE)
+
+
+class ModelRouter:
+    """
+    Picks a latency/cost tier for an "auto" turn with a cheap rule-based classifier.
+
+    Features: prompt length in tokens, question type (trivial, reasoning, code,
+    maths), RAG mode and history depth. Tiers map to concrete MODELS entries
+    through settings.auto_route_tiers.
+    """
+
+    def __init__(self):
+        self.decisions: Counter = Counter()
+
+    def extract_features(self, prompt: str, chat_history: List[BaseMessage], rag_mode: bool) -> Dict:
+        return {
+            "prompt_tokens": count_tokens(prompt),
+            "trivial": bool(TRIVIAL_PATTERN.match(prompt)),
+            "reasoning": bool(REASONING_PATTERN.search(prompt)),
+            "code": bool(CODE_PATTERN.search(prompt)),
+            "math": bool(MATH_PATTERN.search(prompt)),
+            "rag_mode": rag_mode,
+            "history_depth": len(chat_history),
+        }
+
+    def classify(self, features: Dict) -> str:
+        if features["trivial"] and features["prompt_tokens"] <= 30:
+            return "fast"
+
+        score = 0
+        if features["prompt_tokens"] > 400:
+            score += 2
+        elif features["prompt_tokens"] > 60:
+            score += 1
+        if features["reasoning"]:
+            score += 2
+        if features["code"] or features["math"]:
+            score += 2
+        if features["rag_mode"]:
+            score += 1
+        if features["history_depth"] > 10:
+            score += 1
+
+        if score >= 4:
+            return "heavy"
+        if score >= 1:
+            return "balanced"
+        return "fast"
+
+    def route(self, prompt: str, chat_history: List[BaseMessage], rag_mode: bool = False) -> str:
+        """Returns the concrete model name for this turn and logs the decision."""
+        features = self.extract_features(prompt, chat_history, rag_mode)
+        tier = self.classify(features)
+        model_name = settings.auto_route_tiers.get(tier, settings.auto_route_tiers["balanced"])
+        self.decisions[(tier, model_name)] += 1
+        print(f"--- INFO: Auto-routed to {model_name} (tier={tier}, features={features}) ---")
+        return model_name
+
+    def stats(self) -> Dict:
+        by_tier: Dict[str, int] = Counter()
+        by_model: Dict[str, int] = Counter()
+        for (tier, model_name), count in self.decisions.items():
+            by_tier[tier] += count
+            by_model[model_name] += count
+        return {"by_tier": dict(by_tier), "by_model": dict(by_model)}
+
+
+model_router = ModelRouter()
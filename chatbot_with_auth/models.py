@@ -1,7 +1,7 @@
 from typing import Optional,List 
 from sqlmodel import Field,SQLModel,Relationship
 from enum import Enum
-from sqlalchemy import DateTime
+from sqlalchemy import DateTime, Index, text
 from datetime import datetime,timedelta,UTC
 from pydantic import EmailStr
 
@@ -9,9 +9,18 @@ class Role(str,Enum):
     USER = "user"
     ADMIN = "admin"
 
+class MessageStatus(str,Enum):
+    STREAMING = "streaming"
+    COMPLETE = "complete"
+    FAILED = "failed"
+
 
 class ChatSession(SQLModel, table=True):
     __tablename__ = "chat_sessions"
+    # Sidebar access path: a user's sessions, most recently active first
+    __table_args__ = (
+        Index("ix_chat_sessions_user_id_last_message_at", "user_id", text("last_message_at DESC"), text("id DESC")),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     title: str = Field(index=True, description="The title of the chat session, usually the first prompt.")
@@ -32,10 +41,17 @@ class ChatSession(SQLModel, table=True):
     )
     
     created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+    
+    # Denormalized created_at of the newest message, updated with every message write
+    last_message_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
 
 
 class ChatMessage(SQLModel, table=True):
     __tablename__ = "chat_messages"
+    # Newest-first access path for "last N messages of a session"
+    __table_args__ = (
+        Index("ix_chat_messages_session_id_created_at", "session_id", text("created_at DESC"), text("id DESC")),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     content: str
@@ -43,6 +59,20 @@ class ChatMessage(SQLModel, table=True):
     # 'user' for the user's prompt, 'model' for the AI's response
     role: str  
     
+    # The model that actually produced a 'model' message (may be a fallback of the requested one)
+    model_name: Optional[str] = Field(default=None)
+    
+    # Token usage of a 'model' message, as reported by the provider or counted locally
+    input_tokens: Optional[int] = Field(default=None)
+    output_tokens: Optional[int] = Field(default=None)
+    
+    # True when the client disconnected and only the partial answer was kept
+    truncated: bool = Field(default=False)
+    
+    # A 'model' message is STREAMING from the first token until it is COMPLETE or FAILED;
+    # meanwhile its content holds the latest checkpoint of the answer
+    status: MessageStatus = Field(default=MessageStatus.COMPLETE, nullable=False)
+    
     # Foreign key to link this message to a session
     session_id: int = Field(foreign_key="chat_sessions.id")
     
@@ -126,11 +156,14 @@ class UsageStats(SQLModel, table=True):
     date: datetime = Field(index=True)
     messages_sent: int = Field(default=0)
     tokens_used: int = Field(default=0)
+    input_tokens: int = Field(default=0)
+    output_tokens: int = Field(default=0)
     sessions_created: int = Field(default=0)
     web_searches_made: int = Field(default=0)
     
     # Model usage tracking
     model_usage: Optional[str] = Field(default="{}")  # JSON string storing model usage counts
+    model_tokens: Optional[str] = Field(default="{}")  # JSON string: {model: {"input_tokens", "output_tokens"}}
     
     created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
     updated_at: Optional[datetime] = Field(
@@ -146,9 +179,12 @@ class UsageStatsRead(SQLModel):
     date: datetime
     messages_sent: int
     tokens_used: int
+    input_tokens: int
+    output_tokens: int
     sessions_created: int
     web_searches_made: int
     model_usage: dict
+    model_tokens: dict
 
 
 
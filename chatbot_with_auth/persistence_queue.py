@@ -0,0 +1,275 @@
+# persistence_queue.py
+import asyncio
+import atexit
+import queue
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from sqlalchemy import update
+from sqlmodel import Session
+
+from chat_history import touch_session
+from config import settings
+from database import engine
+from models import ChatMessage
+from usage_tracker import UsageDelta, UsageTracker
+
+
+MESSAGE = "message"
+UPDATE = "update"
+USAGE = "usage"
+_STOP = object()
+# How often a coroutine waiting for room in a full queue retries
+FULL_QUEUE_POLL_SECONDS = 0.005
+
+
+class PersistenceQueue:
+    """
+    Write-behind queue for the writes of a chat turn.
+
+    Bot messages, their checkpoints and usage increments go to a single writer
+    thread, which groups everything that arrives within
+    persistence_flush_interval_ms (up to persistence_batch_size writes) into one
+    transaction: one INSERT batch for new messages, one UPDATE batch for existing
+    ones (several updates of the same message collapse into the latest), one
+    last_message_at update per session and one UsageStats update per user. With
+    SQLite this turns many small serialized commits into a few large ones.
+
+    Writers block once persistence_queue_max_size writes are pending. stop()
+    flushes everything still queued; it runs on application shutdown and at
+    interpreter exit. Writes still queued when the process is killed are lost.
+    """
+
+    def __init__(self, db_engine=None):
+        self._engine = db_engine if db_engine is not None else engine
+        self._queue: "queue.Queue" = queue.Queue(maxsize=settings.persistence_queue_max_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stopped = False
+        # Messages per session that are queued but not yet committed
+        self._pending_sessions: Counter = Counter()
+        self._pending_changed = threading.Condition(self._lock)
+        self.batches = 0
+        self.writes = 0
+        self.failed_writes = 0
+        self.largest_batch = 0
+        self.blocked_puts = 0
+
+    def save_message(self, message: ChatMessage):
+        """Queues a new chat message; blocks while the queue is full."""
+        self._put((MESSAGE, message, message.session_id))
+
+    async def asave_message(self, message: ChatMessage):
+        """Queues a new chat message; waits without blocking the event loop while the queue is full."""
+        await self._aput((MESSAGE, message, message.session_id))
+
+    def update_message(self, message_id: int, session_id: int, values: dict):
+        """Queues new column values for an existing chat message; blocks while the queue is full."""
+        self._put((UPDATE, dict(values, id=message_id), session_id))
+
+    async def aupdate_message(self, message_id: int, session_id: int, values: dict):
+        await self._aput((UPDATE, dict(values, id=message_id), session_id))
+
+    async def acheckpoint_message(self, message_id: int, session_id: int, values: dict) -> bool:
+        """
+        Like aupdate_message, but when the queue is full the update is dropped
+        (returns False) instead of waiting: a later checkpoint or the final write
+        supersedes it anyway, so checkpoints never hold up a stream.
+        """
+        op = (UPDATE, dict(values, id=message_id), session_id)
+        if not self._accept(op):
+            await asyncio.to_thread(self._write_batch, [op])
+            return True
+        try:
+            self._queue.put_nowait(op)
+            return True
+        except queue.Full:
+            self._release([op])
+            return False
+
+    def track_usage(self, user_id: int, delta: UsageDelta):
+        """Queues a usage increment for today's UsageStats row of the user."""
+        self._put((USAGE, user_id, delta))
+
+    async def atrack_usage(self, user_id: int, delta: UsageDelta):
+        await self._aput((USAGE, user_id, delta))
+
+    def wait_for_session(self, session_id: int, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until no queued message of the session is left uncommitted, so a
+        following read sees them. Returns False on timeout.
+        """
+        with self._pending_changed:
+            return self._pending_changed.wait_for(lambda: not self._pending_sessions[session_id], timeout)
+
+    def flush(self):
+        """Blocks until everything queued so far is committed (or has failed)."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+    def stop(self):
+        """Flushes the queue and stops the writer thread. Later writes are committed directly."""
+        with self._lock:
+            self._stopped = True
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join()
+            print(f"--- INFO: Persistence queue flushed on shutdown ({self.writes} writes in {self.batches} batches) ---")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "batches": self.batches,
+                "writes": self.writes,
+                "failed_writes": self.failed_writes,
+                "largest_batch": self.largest_batch,
+                "avg_batch": round(self.writes / self.batches, 1) if self.batches else 0.0,
+                "blocked_puts": self.blocked_puts,
+            }
+
+    def _put(self, op: tuple):
+        if not self._accept(op):
+            self._write_batch([op])
+            return
+        if self._try_put(op):
+            return
+        try:
+            self._queue.put(op)
+        except BaseException:
+            self._release([op])
+            raise
+
+    async def _aput(self, op: tuple):
+        if not self._accept(op):
+            await asyncio.to_thread(self._write_batch, [op])
+            return
+        # Back-pressure: this request waits for room, the event loop keeps running. It polls
+        # rather than blocking a worker thread in put(), which would still queue the op after
+        # the request was cancelled.
+        try:
+            while not self._try_put(op):
+                await asyncio.sleep(FULL_QUEUE_POLL_SECONDS)
+        except BaseException:
+            # Never queued, so no longer pending (or wait_for_session would wait forever)
+            self._release([op])
+            raise
+
+    def _try_put(self, op: tuple) -> bool:
+        try:
+            self._queue.put_nowait(op)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.blocked_puts += 1
+            return False
+
+    def _accept(self, op: tuple) -> bool:
+        """Registers a write that will be queued; False means write it through instead."""
+        with self._lock:
+            if self._stopped or not settings.persistence_queue_enabled:
+                return False
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="persistence-writer", daemon=True)
+                self._thread.start()
+            if op[0] in (MESSAGE, UPDATE):
+                self._pending_sessions[op[2]] += 1
+            return True
+
+    def _run(self):
+        interval = settings.persistence_flush_interval_ms / 1000
+        while True:
+            batch = [self._queue.get()]
+            # Give concurrent turns a moment to join this transaction
+            deadline = time.monotonic() + interval
+            while batch[-1] is not _STOP and len(batch) < settings.persistence_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            ops = [op for op in batch if op is not _STOP]
+            try:
+                if ops:
+                    self._write_batch(ops)
+            except Exception as e:
+                # Never let the writer die, or queued writes and waiting readers would hang
+                print(f"--- ERROR: Persistence writer failed on a batch of {len(ops)} items: {e} ---")
+            finally:
+                self._release(ops)
+                for _ in batch:
+                    self._queue.task_done()
+            if batch[-1] is _STOP:
+                return
+
+    def _write_batch(self, ops: List[tuple]):
+        failed = 0
+        try:
+            self._commit(ops)
+        except Exception as e:
+            print(f"--- ERROR: Batched write of {len(ops)} items failed, retrying one by one: {e} ---")
+            for op in ops:
+                try:
+                    self._commit([op])
+                except Exception as op_error:
+                    failed += 1
+                    print(f"--- ERROR: Dropped queued {op[0]} write: {op_error} ---")
+        # The writer thread and write-through callers in other threads update these concurrently
+        with self._lock:
+            self.failed_writes += failed
+            self.batches += 1
+            self.writes += len(ops)
+            self.largest_batch = max(self.largest_batch, len(ops))
+
+    def _commit(self, ops: List[tuple]):
+        messages = [op[1] for op in ops if op[0] == MESSAGE]
+        updates: Dict[int, dict] = {}
+        deltas: Dict[int, UsageDelta] = {}
+        for op in ops:
+            if op[0] == UPDATE:
+                # Later values win, so a burst of checkpoints becomes one UPDATE
+                updates.setdefault(op[1]["id"], {}).update(op[1])
+            elif op[0] == USAGE:
+                deltas.setdefault(op[1], UsageDelta()).merge(op[2])
+        # executemany needs the same columns in every parameter set
+        update_groups: Dict[tuple, List[dict]] = {}
+        for values in updates.values():
+            update_groups.setdefault(tuple(sorted(values)), []).append(values)
+
+        last_message_at = {}
+        for message in messages:
+            current = last_message_at.get(message.session_id)
+            if current is None or message.created_at > current:
+                last_message_at[message.session_id] = message.created_at
+
+        # Objects are not used after the commit, so skip expiring them
+        with Session(self._engine, expire_on_commit=False) as db_session:
+            try:
+                db_session.add_all(messages)
+                for params in update_groups.values():
+                    # Bulk UPDATE by primary key
+                    db_session.exec(update(ChatMessage), params=params)
+                for session_id, message_at in last_message_at.items():
+                    touch_session(db_session, session_id, message_at)
+                UsageTracker.apply_deltas(db_session, deltas)
+                db_session.commit()
+            except Exception:
+                db_session.rollback()
+                raise
+
+    def _release(self, ops: List[tuple]):
+        with self._pending_changed:
+            for op in ops:
+                if op[0] in (MESSAGE, UPDATE):
+                    self._pending_sessions[op[2]] -= 1
+                    if not self._pending_sessions[op[2]]:
+                        del self._pending_sessions[op[2]]
+            self._pending_changed.notify_all()
+
+
+persistence_queue = PersistenceQueue()
+# Scripts and test clients may never run the FastAPI shutdown hook
+atexit.register(persistence_queue.stop)
@@ -0,0 +1,128 @@
+# prompt_budget.py
+from typing import Dict, List, NamedTuple, Optional
+
+from langchain_core.documents import Document
+from langchain_core.messages import BaseMessage
+
+
+# Per-message framing tokens (role markers etc.) added by chat templates
+MESSAGE_OVERHEAD_TOKENS = 4
+# Our tokenizer is not the provider's, so keep some headroom
+SAFETY_MARGIN = 0.05
+# The latest exchange is worth more than any retrieved chunk or search result
+RECENT_HISTORY_MESSAGES = 2
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """Load the tiktoken encoding once; None if tiktoken or its BPE file is unavailable."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"--- WARNING: tiktoken unavailable, falling back to character estimate: {e} ---")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        # Rough approximation: 1 token ≈ 4 characters
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(message: BaseMessage) -> int:
+    return count_tokens(str(message.content)) + MESSAGE_OVERHEAD_TOKENS
+
+
+class FittedPrompt(NamedTuple):
+    chat_history: List[BaseMessage]
+    documents: List[Document]
+    web_results: List[Dict]
+    prompt_tokens: int
+
+
+def prompt_token_budget(model_config: dict) -> int:
+    """Tokens available for the prompt after reserving the model's output size."""
+    usable = model_config["context_window"] - model_config["max_output_tokens"]
+    return int(usable * (1 - SAFETY_MARGIN))
+
+
+def fit_prompt(
+    model_config: dict,
+    system_prompt: str,
+    user_prompt: str,
+    chat_history: List[BaseMessage],
+    documents: Optional[List[Document]] = None,
+    web_results: Optional[List[Dict]] = None,
+) -> FittedPrompt:
+    """
+    Selects the history, retrieved chunks and web results that fit the model's window.
+
+    The system prompt and the new user prompt are always kept. The rest is filled
+    greedily in order of value: the latest exchange, retrieved chunks by rank, web
+    results by rank, then older history newest-first. Whatever does not fit is
+    dropped, so the lowest-value segments are trimmed first. documents and
+    web_results are expected best-first, as returned by retrieval and search.
+    """
+    documents = documents or []
+    web_results = web_results or []
+    budget = prompt_token_budget(model_config)
+    used = count_tokens(system_prompt) + count_tokens(user_prompt) + 2 * MESSAGE_OVERHEAD_TOKENS
+
+    if used > budget:
+        print(f"--- WARNING: System and user prompt alone use {used} tokens (budget {budget}) ---")
+
+    kept_history: List[BaseMessage] = []
+    history_exhausted = False
+
+    def take_history(limit: Optional[int] = None):
+        nonlocal used, history_exhausted
+        # History must stay a contiguous suffix, so stop at the first message that does not fit
+        while not history_exhausted and len(kept_history) < len(chat_history):
+            if limit is not None and len(kept_history) >= limit:
+                return
+            message = chat_history[-(len(kept_history) + 1)]
+            cost = count_message_tokens(message)
+            if used + cost > budget:
+                history_exhausted = True
+                return
+            kept_history.append(message)
+            used += cost
+
+    take_history(limit=RECENT_HISTORY_MESSAGES)
+
+    kept_documents = []
+    for doc in documents:
+        cost = count_tokens(doc.page_content) + 2
+        if used + cost <= budget:
+            kept_documents.append(doc)
+            used += cost
+
+    kept_results = []
+    for result in web_results:
+        cost = count_tokens(result.get("title", "")) + count_tokens(result.get("content", "")) + count_tokens(result.get("url", "")) + 8
+        if used + cost <= budget:
+            kept_results.append(result)
+            used += cost
+
+    take_history()
+    kept_history.reverse()
+
+    dropped = (
+        (len(chat_history) - len(kept_history))
+        + (len(documents) - len(kept_documents))
+        + (len(web_results) - len(kept_results))
+    )
+    if dropped:
+        print(f"--- INFO: Prompt budget {budget} tokens: dropped {dropped} segments, using {used} ---")
+
+    return FittedPrompt(kept_history, kept_documents, kept_results, used)
@@ -0,0 +1,120 @@
+# prompts.py
+from typing import Iterable, List
+
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+
+CHAT_MODE = "chat"
+RAG_MODE = "rag"
+
+CHAT_SYSTEM_PROMPT = (
+    "You are a helpful assistant. You provide concise answers based on the provided context. "
+    "Format your responses using GitHub-flavored Markdown."
+)
+
+RAG_SYSTEM_PROMPT = """You are a document analysis assistant. Your ONLY job is to answer questions based STRICTLY on the provided context from uploaded documents.
+
+CRITICAL RULES:
+1. You MUST ONLY use information that is explicitly stated in the context provided below
+2. If the answer is not in the context, you MUST respond with: "I cannot answer this question as the information is not available in the uploaded documents."
+3. Do NOT use any general knowledge, assumptions, or information from outside the provided context
+4. Do NOT provide partial answers by mixing document content with general knowledge
+5. Do NOT make inferences beyond what is explicitly stated in the documents
+
+BEFORE answering any question:
+- First, carefully scan the provided context
+- Verify that the specific information needed to answer the question exists in the context
+- If you cannot find the specific information, use the rejection response above
+
+FORMAT REQUIREMENTS:
+- Use GitHub-flavored Markdown for formatting
+- Be concise and direct
+- Quote relevant sections when possible
+- If answering, cite which part of the document the information comes from
+
+CONTEXT:
+{context}
+
+THE CONTEXT IS YOUR KNOWLEDGE BASE THE CONTEXT IS ALL YOU KNOW
+
+Remember: It's better to say "I don't know based on the documents" than to provide information not found in the context."""
+
+SYSTEM_PROMPTS = {CHAT_MODE: CHAT_SYSTEM_PROMPT, RAG_MODE: RAG_SYSTEM_PROMPT}
+
+WEB_CONTEXT_HEADERS = {
+    CHAT_MODE: "\n\nHere is some relevant information from web search:\n\n",
+    RAG_MODE: "\n\nAdditional web search information (use only if relevant to document context):\n\n",
+}
+
+# Split once at import so the retrieved context is spliced in without re-templating the prompt
+_RAG_PREFIX, _RAG_SUFFIX = RAG_SYSTEM_PROMPT.split("{context}")
+
+_MESSAGE_CLASSES = {"user": HumanMessage, "model": AIMessage}
+
+
+def _build_template(system_prompt: str) -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_messages([
+        ("system", system_prompt + "{web_context}"),
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("user", "{input}"),
+    ])
+
+
+# Compiled once per mode. Web results and documents are passed as values, so braces in them are never parsed.
+PROMPT_TEMPLATES = {mode: _build_template(prompt) for mode, prompt in SYSTEM_PROMPTS.items()}
+
+
+def history_from_rows(rows: Iterable) -> List[BaseMessage]:
+    """
+    Turns ChatMessage rows (oldest first) into LangChain messages, sharing the row content strings.
+    Rows without content (an answer still waiting for its first checkpoint) are skipped.
+    """
+    return [_MESSAGE_CLASSES[row.role](content=row.content) for row in rows if row.role in _MESSAGE_CLASSES and row.content]
+
+
+def format_documents(documents: List[Document]) -> str:
+    if not documents:
+        return "No relevant documents found."
+    return "\n\n".join(doc.page_content for doc in documents)
+
+
+def build_system_message(mode: str, context: str = "", web_context: str = "") -> str:
+    web_part = WEB_CONTEXT_HEADERS[mode] + web_context if web_context else ""
+    if mode == RAG_MODE:
+        return "".join((_RAG_PREFIX, context, _RAG_SUFFIX, web_part))
+    return CHAT_SYSTEM_PROMPT + web_part
+
+
+def build_messages(
+    mode: str,
+    prompt: str,
+    chat_history: List[BaseMessage],
+    context: str = "",
+    web_context: str = "",
+) -> List[BaseMessage]:
+    """
+    Fast path: the provider message list for one turn, built without formatting a template.
+    Produces the same messages as PROMPT_TEMPLATES[mode].format_messages(...).
+    """
+    messages: List[BaseMessage] = [SystemMessage(content=build_system_message(mode, context, web_context))]
+    messages.extend(chat_history)
+    messages.append(HumanMessage(content=prompt))
+    return messages
+
+
+def format_messages_with_template(
+    mode: str,
+    prompt: str,
+    chat_history: List[BaseMessage],
+    context: str = "",
+    web_context: str = "",
+) -> List[BaseMessage]:
+    """Reference path through the prebuilt template; used to check build_messages against it."""
+    variables = {"input": prompt, "chat_history": chat_history, "web_context": ""}
+    if web_context:
+        variables["web_context"] = WEB_CONTEXT_HEADERS[mode] + web_context
+    if mode == RAG_MODE:
+        variables["context"] = context
+    return PROMPT_TEMPLATES[mode].format_messages(**variables)
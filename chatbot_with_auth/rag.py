@@ -7,6 +7,7 @@ from database import get_session
 from models import ChatSession, User
 from dependencies import get_current_user
 from rag_service import process_and_store_document
+from semantic_cache import semantic_cache
 
 router = APIRouter(
     prefix="/rag",
@@ -41,6 +42,8 @@ async def upload_document_for_session(
         # 3. Process the document and store embeddings with session_id metadata
         print(f"--- DEBUG: Processing file {file.filename} for session {session_id} ---")
         process_and_store_document(file_path, session_id)
+        # Answers cached before this upload were grounded in a different document set
+        semantic_cache.invalidate_session(session_id)
         
         # 4. Mark the session as having documents
         if not chat_session.has_documents:
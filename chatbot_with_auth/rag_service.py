@@ -5,6 +5,7 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
 from config import settings
 
 # --- 1. Document Loading and Splitting ---
@@ -34,9 +35,19 @@ def split_text(documents: list[Document]) -> list[Document]:
 
 # --- 2. Vector Store and Retriever ---
 
+def get_embeddings():
+    if settings.local_embeddings_enabled:
+        # Offline load tests: deterministic vectors, no API calls
+        return DeterministicFakeEmbedding(size=768)
+    return GoogleGenerativeAIEmbeddings(model="models/embedding-001" , google_api_key=settings.google_api_key)
+
+async def aembed_query(query: str) -> list[float]:
+    """Embeds a retrieval query without blocking the event loop."""
+    return await get_embeddings().aembed_query(query)
+
 def get_vector_store() -> Chroma:
     """Initializes the Chroma vector store."""
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001" , google_api_key=settings.google_api_key)
+    embeddings = get_embeddings()
     # Using a persistent directory and a single collection name
     print("--- INFO: Initializing Chroma vector store ---")
     return Chroma(
@@ -51,15 +62,34 @@ def process_and_store_document(file_path: str, session_id: int):
     documents = load_document(file_path)
     chunks = split_text(documents)
 
-    # Add session_id metadata to each chunk
+    # Add session_id metadata to each chunk, keeping the file name and page for citations
     for chunk in chunks:
-        chunk.metadata = {"session_id": str(session_id)}
+        metadata = {"session_id": str(session_id), "source": os.path.basename(chunk.metadata.get("source", ""))}
+        if chunk.metadata.get("page") is not None:
+            metadata["page"] = chunk.metadata["page"]
+        chunk.metadata = metadata
     
     # Get the vector store and add the new chunks
     vector_store = get_vector_store()
     vector_store.add_documents(chunks)
     print(f"--- INFO: Stored {len(chunks)} chunks for session_id: {session_id} ---")
 
+# Session ids per Chroma delete call, to keep each metadata filter small
+DELETE_BATCH_SIZE = 500
+
+def delete_session_documents(session_ids: list[int]):
+    """Removes every stored chunk of the given sessions. Meant to run as a background job."""
+    if not session_ids:
+        return
+    vector_store = get_vector_store()
+    for start in range(0, len(session_ids), DELETE_BATCH_SIZE):
+        batch = [str(session_id) for session_id in session_ids[start:start + DELETE_BATCH_SIZE]]
+        try:
+            vector_store.delete(where={"session_id": {"$in": batch}})
+        except Exception as e:
+            print(f"--- ERROR: Failed to delete document chunks for {len(batch)} sessions: {e} ---")
+    print(f"--- INFO: Deleted document chunks for {len(session_ids)} sessions ---")
+
 def get_session_retriever(session_id: int):
     """
     Creates a retriever that ONLY searches for documents matching the session_id.
@@ -72,22 +102,30 @@ def get_session_retriever(session_id: int):
 
 # ADD this new function after the existing get_session_retriever function (around line 45)
 
-def get_session_retriever_with_scores(session_id: int, similarity_threshold: float = 0.9):
+def get_session_retriever_with_scores(session_id: int, similarity_threshold: float = 0.9, query_embedding: list[float] = None):
     """
     Creates a retriever that returns documents with similarity scores and filters by threshold.
     Only returns documents that meet the minimum similarity threshold.
+    If query_embedding is given it is searched directly instead of embedding the query again.
     """
     vector_store = get_vector_store()
     print(f"--- INFO: Creating retriever with similarity threshold {similarity_threshold} for session_id: {session_id} ---")
     
     # Get documents with scores using similarity_search_with_score
     def retrieve_with_filtering(query: str) -> list:
-        # Perform similarity search with scores
-        docs_with_scores = vector_store.similarity_search_with_score(
-            query, 
-            k=10,  # Get more documents initially
-            filter={"session_id": str(session_id)}
-        )
+        # Perform similarity search with scores (Chroma distances either way)
+        if query_embedding is not None:
+            docs_with_scores = vector_store.similarity_search_by_vector_with_relevance_scores(
+                query_embedding,
+                k=10,
+                filter={"session_id": str(session_id)}
+            )
+        else:
+            docs_with_scores = vector_store.similarity_search_with_score(
+                query, 
+                k=10,  # Get more documents initially
+                filter={"session_id": str(session_id)}
+            )
         
         print(f"--- DEBUG: Retrieved {len(docs_with_scores)} documents before filtering ---")
         
@@ -95,6 +133,8 @@ def get_session_retriever_with_scores(session_id: int, similarity_threshold: flo
         filtered_docs = []
         for doc, score in docs_with_scores:
             print(f"--- DEBUG: Document score: {score} (threshold: {similarity_threshold}) ---")
+            # Kept with the document so the answer can cite how close each source was
+            doc.metadata["distance"] = score
             # Note: Chroma returns distance, lower is better, so we filter by < threshold
             if score <= similarity_threshold:
                 filtered_docs.append(doc)
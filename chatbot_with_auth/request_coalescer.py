@@ -0,0 +1,128 @@
+# request_coalescer.py
+import asyncio
+import hashlib
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from langchain_core.messages import BaseMessage
+
+
+class _Flight:
+    """One upstream stream plus the broadcast buffer its subscribers read from."""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.condition = asyncio.Condition()
+        self.subscribers = 0
+        # Filled by the upstream stream (e.g. which model answered) and copied to every subscriber
+        self.meta: Dict = {}
+        self.task: Optional[asyncio.Task] = None
+
+
+class RequestCoalescer:
+    """
+    Single-flight coalescing for identical concurrent chat requests.
+
+    The first request for a key starts the upstream stream in a background task;
+    requests with the same key that arrive while it is running subscribe to the
+    same buffer and receive every chunk from the start. Each caller still consumes
+    its own generator, so each one persists its own ChatMessage row.
+    """
+
+    def __init__(self):
+        self._flights: Dict[tuple, _Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def make_key(model_name: str, prompt: str, chat_history: List[BaseMessage], use_web_search: bool) -> tuple:
+        normalized_prompt = " ".join(prompt.lower().split())
+        history_hash = hashlib.sha256()
+        for message in chat_history:
+            history_hash.update(message.type.encode())
+            history_hash.update(b"\x00")
+            history_hash.update(str(message.content).encode())
+            history_hash.update(b"\x00")
+        return (model_name, normalized_prompt, history_hash.hexdigest(), bool(use_web_search))
+
+    async def stream(
+        self,
+        key: tuple,
+        produce: Callable[[Dict], AsyncIterator[str]],
+        response_meta: Optional[Dict] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Yield the chunks of the in-flight stream for key, starting one if needed.
+        produce is called with the flight's meta dict, which is copied into
+        response_meta along with new chunks (the answering model and sources are
+        known before the first one) and again once the stream finishes.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(key, flight, produce))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+            print(f"--- INFO: Coalesced request onto in-flight stream for model {key[0]} ---")
+
+        flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                async with flight.condition:
+                    await flight.condition.wait_for(lambda: len(flight.chunks) > index or flight.done)
+                    new_chunks = flight.chunks[index:]
+                    finished = flight.done
+
+                if new_chunks and response_meta is not None:
+                    response_meta.update(flight.meta)
+                for chunk in new_chunks:
+                    yield chunk
+                index += len(new_chunks)
+
+                if finished and index >= len(flight.chunks):
+                    if response_meta is not None:
+                        response_meta.update(flight.meta)
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+        finally:
+            flight.subscribers -= 1
+            # Nobody is listening any more, so stop paying for the upstream stream
+            if flight.subscribers == 0 and not flight.done and flight.task:
+                flight.task.cancel()
+                # Wait for the upstream to wind down so its model and usage so far are reported
+                await asyncio.wait({flight.task})
+                if response_meta is not None:
+                    response_meta.update(flight.meta)
+
+    async def _run(self, key: tuple, flight: _Flight, produce: Callable[[Dict], AsyncIterator[str]]):
+        try:
+            async for chunk in produce(flight.meta):
+                async with flight.condition:
+                    flight.chunks.append(chunk)
+                    flight.condition.notify_all()
+        except asyncio.CancelledError:
+            flight.error = RuntimeError("Upstream stream cancelled")
+        except Exception as e:
+            flight.error = e
+        finally:
+            # Late arrivals must start a fresh upstream call rather than join a finished one
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            async with flight.condition:
+                flight.done = True
+                flight.condition.notify_all()
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": len(self._flights),
+            "upstream_streams": self.leaders,
+            "coalesced_requests": self.coalesced,
+        }
+
+
+request_coalescer = RequestCoalescer()
@@ -0,0 +1,173 @@
+# semantic_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.messages import BaseMessage
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from config import settings
+
+
+# Cached answers are replayed in pieces of this size so the client sees a normal stream
+REPLAY_CHUNK_SIZE = 64
+
+
+class CacheEntry:
+    def __init__(self, scope: tuple, embedding: np.ndarray, response: str):
+        self.scope = scope
+        self.embedding = embedding
+        self.response = response
+        self.created_at = time.monotonic()
+
+
+class SemanticCache:
+    """
+    In-memory cache of answers keyed by prompt embedding.
+
+    Entries live in a scope: ("chat", model_name) for plain chats and
+    ("rag", model_name, session_id) for document sessions, so RAG answers are
+    never served to another session. Eviction is LRU across all scopes with a
+    TTL, and the total number of entries is capped by semantic_cache_max_entries.
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[int, CacheEntry]" = OrderedDict()
+        self._scopes: Dict[tuple, List[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._embeddings = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.semantic_cache_enabled
+
+    def is_eligible(self, chat_history: List[BaseMessage], use_web_search: bool) -> bool:
+        """
+        Web search answers are time-sensitive and follow-ups depend on earlier turns,
+        so only standalone prompts (up to semantic_cache_max_history) use the cache.
+        """
+        if not self.enabled or use_web_search:
+            return False
+        return len(chat_history) <= settings.semantic_cache_max_history
+
+    @staticmethod
+    def chat_scope(model_name: str) -> tuple:
+        return ("chat", model_name)
+
+    @staticmethod
+    def rag_scope(model_name: str, session_id: int) -> tuple:
+        return ("rag", model_name, session_id)
+
+    def _get_embeddings(self) -> GoogleGenerativeAIEmbeddings:
+        if self._embeddings is None:
+            self._embeddings = GoogleGenerativeAIEmbeddings(
+                model=settings.semantic_cache_embedding_model,
+                google_api_key=settings.google_api_key
+            )
+        return self._embeddings
+
+    async def embed(self, prompt: str) -> Optional[np.ndarray]:
+        """Embed and L2-normalise the prompt. Returns None if the embedding call fails."""
+        try:
+            vector = await self._get_embeddings().aembed_query(prompt.strip().lower())
+        except Exception as e:
+            print(f"--- ERROR: Semantic cache embedding failed: {e} ---")
+            return None
+        embedding = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    async def lookup(self, scope: tuple, prompt: str) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Returns (cached_response, embedding). The embedding is handed back so the
+        caller can store the fresh answer on a miss without embedding twice.
+        """
+        embedding = await self.embed(prompt)
+        if embedding is None:
+            return None, None
+
+        with self._lock:
+            self._evict_expired()
+            best_id, best_score = None, -1.0
+            for entry_id in self._scopes.get(scope, []):
+                score = float(np.dot(self._entries[entry_id].embedding, embedding))
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is not None and best_score >= settings.semantic_cache_threshold:
+                self._entries.move_to_end(best_id)
+                self.hits += 1
+                print(f"--- INFO: Semantic cache hit for {scope} (similarity {best_score:.3f}) ---")
+                return self._entries[best_id].response, embedding
+
+            self.misses += 1
+            return None, embedding
+
+    def store(self, scope: tuple, embedding: Optional[np.ndarray], response: str):
+        if embedding is None or not response:
+            return
+        if len(response) > settings.semantic_cache_max_response_chars:
+            return
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = CacheEntry(scope, embedding, response)
+            self._scopes.setdefault(scope, []).append(entry_id)
+
+            while len(self._entries) > settings.semantic_cache_max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self.evictions += 1
+
+    def invalidate_session(self, session_id: int):
+        """Drop every RAG entry for a session, e.g. after new documents are uploaded."""
+        self.invalidate_sessions([session_id])
+
+    def invalidate_sessions(self, session_ids):
+        """Drop every RAG entry for any of the given sessions in a single pass."""
+        session_ids = set(session_ids)
+        with self._lock:
+            for scope in [s for s in self._scopes if s[0] == "rag" and s[2] in session_ids]:
+                for entry_id in list(self._scopes[scope]):
+                    self._remove(entry_id)
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        scope_ids = self._scopes[entry.scope]
+        scope_ids.remove(entry_id)
+        if not scope_ids:
+            del self._scopes[entry.scope]
+
+    def _evict_expired(self):
+        cutoff = time.monotonic() - settings.semantic_cache_ttl_seconds
+        # Entries are in LRU order, not creation order, so check them all
+        for entry_id in [i for i, e in self._entries.items() if e.created_at < cutoff]:
+            self._remove(entry_id)
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+async def stream_cached_response(response: str):
+    """Replays a cached answer through the same async generator interface as a live stream."""
+    for i in range(0, len(response), REPLAY_CHUNK_SIZE):
+        yield response[i:i + REPLAY_CHUNK_SIZE]
+
+
+semantic_cache = SemanticCache()
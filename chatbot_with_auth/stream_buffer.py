@@ -0,0 +1,250 @@
+# stream_buffer.py
+import asyncio
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+
+from config import settings
+
+
+class StreamBuffer:
+    """
+    The text of one in-flight answer, decoupled from the HTTP response that asked for it.
+
+    A pump task pulls the answer from the producer into a bounded ring of chunks;
+    any number of readers follow it from a byte offset (UTF-8 bytes of the
+    response body, which is what a client counts on the wire). Once the total exceeds
+    stream_buffer_max_bytes the oldest chunks are dropped. When the last reader
+    leaves, the producer is cancelled, right away by default or after
+    stream_resume_grace_seconds if that is set so a client can reattach. If nobody ever
+    reads it, on_unread (run in a worker thread) cleans up what the producer
+    would have saved.
+    """
+
+    def __init__(
+        self,
+        session_id: int,
+        message_id: int,
+        producer: AsyncIterator[str],
+        media_type: str = "text/plain; charset=utf-8",
+        on_unread: Optional[Callable[[], None]] = None
+    ):
+        self.session_id = session_id
+        self.message_id = message_id
+        self.media_type = media_type
+        self.created_at = time.monotonic()
+        self._producer = producer
+        self._on_unread = on_unread
+        # (byte offset of the chunk's first byte, chunk text), oldest first
+        self._chunks: Deque[Tuple[int, str]] = deque()
+        self.start_offset = 0
+        self.end_offset = 0
+        self.done = False
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._abandon_handle: Optional[asyncio.TimerHandle] = None
+        self.on_done = None
+
+    @property
+    def started(self) -> bool:
+        return self._task is not None
+
+    def resolve_offset(self, offset: int) -> int:
+        """
+        The offset a reader asking for `offset` actually starts at: the same, or
+        the start of the UTF-8 character it falls inside of.
+        """
+        for chunk_start, text in reversed(self._chunks):
+            if chunk_start <= offset:
+                encoded = text.encode("utf-8")
+                position = offset - chunk_start
+                while 0 < position < len(encoded) and (encoded[position] & 0xC0) == 0x80:
+                    position -= 1
+                return chunk_start + position
+        return offset
+
+    async def follow(self, offset: int = 0) -> AsyncIterator[str]:
+        """
+        Yields the answer from `offset` (a value from resolve_offset) on, live, until it is finished.
+        Stops early if the reader falls so far behind that its position was dropped from the ring.
+        """
+        self._subscribe()
+        position = offset
+        try:
+            while True:
+                changed = self._changed
+                if position < self.start_offset:
+                    print(f"--- WARNING: Reader of message {self.message_id} fell behind the stream buffer ---")
+                    return
+                if position < self.end_offset:
+                    text = self._text_from(position)
+                    position = self.end_offset
+                    yield text
+                    continue
+                if self.done:
+                    return
+                await changed.wait()
+        finally:
+            self._unsubscribe()
+
+    def _text_from(self, position: int) -> str:
+        pieces = []
+        for chunk_start, text in reversed(self._chunks):
+            if chunk_start >= position:
+                pieces.append(text)
+                continue
+            # The reader starts inside this chunk (only on the first read of a resumed reader)
+            pieces.append(text.encode("utf-8")[position - chunk_start:].decode("utf-8"))
+            break
+        pieces.reverse()
+        return "".join(pieces)
+
+    def _append(self, text: str):
+        self._chunks.append((self.end_offset, text))
+        self.end_offset += len(text.encode("utf-8"))
+        # Ring: drop the oldest chunks beyond the limit, but always keep the newest one
+        while self.end_offset - self.start_offset > settings.stream_buffer_max_bytes and len(self._chunks) > 1:
+            self._chunks.popleft()
+            self.start_offset = self._chunks[0][0]
+        self._wake()
+
+    def _wake(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _subscribe(self):
+        self.subscribers += 1
+        if self._abandon_handle is not None:
+            self._abandon_handle.cancel()
+            self._abandon_handle = None
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._pump())
+
+    def _unsubscribe(self):
+        self.subscribers -= 1
+        if self.subscribers == 0 and not self.done:
+            if settings.stream_resume_grace_seconds <= 0:
+                self._abandon()
+                return
+            print(f"--- INFO: No client attached to message {self.message_id}, waiting {settings.stream_resume_grace_seconds}s for a reattach ---")
+            self._abandon_handle = asyncio.get_running_loop().call_later(
+                settings.stream_resume_grace_seconds, self._abandon
+            )
+
+    def _abandon(self):
+        self._abandon_handle = None
+        if self.subscribers == 0 and self._task is not None and not self._task.done():
+            print(f"--- INFO: No client attached to message {self.message_id}, cancelling its stream ---")
+            self._task.cancel()
+
+    async def close_unread(self):
+        """Closes the producer of an answer that was never read and runs on_unread."""
+        self.done = True
+        self._wake()
+        await self._producer.aclose()
+        if self._on_unread is not None:
+            await asyncio.to_thread(self._on_unread)
+
+    async def _pump(self):
+        try:
+            async for chunk in self._producer:
+                if chunk:
+                    self._append(chunk)
+        except asyncio.CancelledError:
+            # The producer has already kept the partial answer
+            pass
+        except Exception as e:
+            print(f"--- ERROR: Stream of message {self.message_id} failed: {e} ---")
+        finally:
+            self.done = True
+            self._wake()
+            if self.on_done is not None:
+                self.on_done(self)
+
+
+class StreamBufferRegistry:
+    """
+    In-flight answers by (session_id, message_id); finished ones are evicted after stream_buffer_ttl_seconds.
+
+    Like the buffers, it is only touched from the event loop: code running in a worker
+    thread registers answers through anyio.from_thread.
+    """
+
+    def __init__(self):
+        self._buffers: Dict[Tuple[int, int], StreamBuffer] = {}
+        # Newest message per session, for readers that only know the session
+        self._latest: Dict[int, int] = {}
+        self.opened = 0
+        self.reattached = 0
+
+    def open(
+        self,
+        session_id: int,
+        message_id: int,
+        producer: AsyncIterator[str],
+        media_type: str = "text/plain; charset=utf-8",
+        on_unread: Optional[Callable[[], None]] = None
+    ) -> StreamBuffer:
+        """
+        Registers an answer; it starts generating when its first reader follows it.
+        on_unread runs if it is evicted without ever being read (see evict_unstarted).
+        """
+        stream_buffer = StreamBuffer(session_id, message_id, producer, media_type, on_unread)
+        stream_buffer.on_done = self._schedule_eviction
+        self._buffers[(session_id, message_id)] = stream_buffer
+        self._latest[session_id] = message_id
+        self.opened += 1
+        return stream_buffer
+
+    def get(self, session_id: int, message_id: Optional[int] = None) -> Optional[StreamBuffer]:
+        if message_id is None:
+            message_id = self._latest.get(session_id)
+        stream_buffer = self._buffers.get((session_id, message_id))
+        if stream_buffer is not None:
+            self.reattached += 1
+        return stream_buffer
+
+    def message_ids(self) -> List[int]:
+        """Messages still being generated (or waiting for their first reader) in this process."""
+        return [b.message_id for b in self._buffers.values() if not b.done]
+
+    def _schedule_eviction(self, stream_buffer: StreamBuffer):
+        asyncio.get_running_loop().call_later(settings.stream_buffer_ttl_seconds, self._evict, stream_buffer)
+
+    def _evict(self, stream_buffer: StreamBuffer):
+        key = (stream_buffer.session_id, stream_buffer.message_id)
+        if self._buffers.get(key) is stream_buffer:
+            del self._buffers[key]
+            if self._latest.get(stream_buffer.session_id) == stream_buffer.message_id:
+                del self._latest[stream_buffer.session_id]
+
+    async def evict_unstarted(self) -> int:
+        """
+        Evicts answers whose response was never read (the client left before the body
+        started) once they are older than stream_buffer_ttl_seconds, closing their
+        producers and running their on_unread cleanup. Returns the number evicted.
+        """
+        cutoff = time.monotonic() - settings.stream_buffer_ttl_seconds
+        unread = [b for b in self._buffers.values() if not b.started and not b.done and b.created_at < cutoff]
+        for stream_buffer in unread:
+            self._evict(stream_buffer)
+        for stream_buffer in unread:
+            try:
+                await stream_buffer.close_unread()
+            except Exception as e:
+                print(f"--- ERROR: Cleaning up unread message {stream_buffer.message_id} failed: {e} ---")
+        return len(unread)
+
+    def stats(self) -> Dict:
+        buffers = list(self._buffers.values())
+        return {
+            "buffers": len(buffers),
+            "streaming": sum(1 for b in buffers if b.started and not b.done),
+            "buffered_bytes": sum(b.end_offset - b.start_offset for b in buffers),
+            "opened": self.opened,
+            "reattached": self.reattached,
+        }
+
+
+stream_buffers = StreamBufferRegistry()
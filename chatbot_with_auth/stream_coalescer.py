@@ -0,0 +1,105 @@
+# stream_coalescer.py
+import asyncio
+from typing import AsyncIterator, List, Optional
+
+from config import settings
+
+
+# Text read ahead of the client before the upstream reader pauses (back-pressure)
+READ_AHEAD_BYTES = 64 * 1024
+
+
+async def coalesce_chunks(
+    stream: AsyncIterator[str],
+    max_bytes: Optional[int] = None,
+    max_delay_seconds: Optional[float] = None,
+) -> AsyncIterator[str]:
+    """
+    Merges small text chunks into fewer, larger writes to the client.
+
+    Buffered text is flushed once it reaches max_bytes (UTF-8) or once the
+    oldest buffered chunk has waited max_delay_seconds, whichever comes first,
+    so a slow model never holds text back for longer than the delay. Defaults
+    come from settings.stream_flush_bytes and settings.stream_flush_interval_ms.
+
+    A helper task reads the upstream into the buffer and only wakes the writer
+    when a flush is due, so the writer runs once per flush instead of once per
+    chunk, and waiting for the deadline never cancels a pending upstream read.
+    """
+    if max_bytes is None:
+        max_bytes = settings.stream_flush_bytes
+    if max_delay_seconds is None:
+        max_delay_seconds = settings.stream_flush_interval_ms / 1000
+
+    if not settings.stream_coalescing_enabled or (max_bytes <= 1 and max_delay_seconds <= 0):
+        async for chunk in stream:
+            yield chunk
+        return
+
+    loop = asyncio.get_running_loop()
+    buffer: List[str] = []
+    buffered_bytes = 0
+    flush_deadline = 0.0
+    finished = False
+    error: Optional[Exception] = None
+    wakeup = asyncio.Event()
+    drained = asyncio.Event()
+
+    async def read_upstream():
+        nonlocal buffered_bytes, flush_deadline, finished, error
+        try:
+            async for chunk in stream:
+                if not chunk:
+                    continue
+                if not buffer:
+                    # The writer needs to learn the new flush deadline
+                    flush_deadline = loop.time() + max_delay_seconds
+                    wakeup.set()
+                buffer.append(chunk)
+                buffered_bytes += len(chunk.encode("utf-8"))
+                if buffered_bytes >= max_bytes:
+                    wakeup.set()
+                while buffered_bytes >= READ_AHEAD_BYTES:
+                    drained.clear()
+                    await drained.wait()
+        except Exception as e:
+            error = e
+        finally:
+            finished = True
+            wakeup.set()
+            await stream.aclose()
+
+    reader = asyncio.create_task(read_upstream())
+
+    try:
+        while True:
+            if buffer and (finished or buffered_bytes >= max_bytes or loop.time() >= flush_deadline):
+                text = "".join(buffer)
+                buffer.clear()
+                buffered_bytes = 0
+                drained.set()
+                yield text
+                continue
+            if finished:
+                if error is not None:
+                    raise error
+                return
+
+            wakeup.clear()
+            if buffer:
+                try:
+                    async with asyncio.timeout_at(flush_deadline):
+                        await wakeup.wait()
+                except TimeoutError:
+                    pass
+            else:
+                await wakeup.wait()
+    finally:
+        if not reader.done():
+            reader.cancel()
+            try:
+                # asyncio.wait rather than awaiting the task, so a repeated cancellation of
+                # this task (Starlette re-cancels on disconnect) does not interrupt the reader's cleanup
+                await asyncio.wait({reader})
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,111 @@
+# stream_protocol.py
+import json
+import os
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.documents import Document
+
+from models import MessageStatus
+
+
+TEXT_FORMAT = "text"
+NDJSON_FORMAT = "ndjson"
+SSE_FORMAT = "sse"
+
+MEDIA_TYPES = {
+    TEXT_FORMAT: "text/plain; charset=utf-8",
+    NDJSON_FORMAT: "application/x-ndjson",
+    SSE_FORMAT: "text/event-stream",
+}
+
+# Characters of each retrieved chunk sent with the sources event
+SOURCE_SNIPPET_CHARS = 200
+
+
+def format_event(stream_format: str, name: str, data: Dict) -> str:
+    """One event as an NDJSON line ({"type": name, ...data}) or an SSE frame (event: name, data: JSON)."""
+    if stream_format == SSE_FORMAT:
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({"type": name, **data}) + "\n"
+
+
+def describe_sources(documents: List[Document], web_results: List[Dict]) -> Dict:
+    """
+    The sources of an answer for the client: retrieved chunks with their Chroma
+    distance (lower is closer) and web results with the search provider's score.
+    """
+    return {
+        "documents": [
+            {
+                "source": os.path.basename(doc.metadata["source"]) if doc.metadata.get("source") else None,
+                "page": doc.metadata.get("page"),
+                "distance": doc.metadata.get("distance"),
+                "snippet": doc.page_content[:SOURCE_SNIPPET_CHARS],
+            }
+            for doc in documents
+        ],
+        "web": [
+            {"title": result.get("title"), "url": result.get("url"), "score": result.get("score")}
+            for result in web_results
+        ],
+    }
+
+
+async def frame_events(
+    chunks: AsyncIterator[str],
+    stream_format: str,
+    response_meta: Dict,
+    started_at: float,
+    start_data: Optional[Dict] = None,
+) -> AsyncIterator[str]:
+    """
+    Turns the text stream of an answer into framed events:
+
+      start    session_id, message_id, ... (start_data), right away
+      sources  retrieved documents and web results, before the first token
+      model    the model that answered (routed_from / cached when they apply)
+      ttft     ms from started_at (request received) to the first token
+      token    {"text": ...}, one per upstream chunk
+      done     status, usage, tokens_per_second, ttft_ms, duration_ms
+
+    response_meta is the dict the chatbot service fills while streaming, so it
+    is read before every token and once more at the end; a coalesced request only
+    learns its model and sources when the shared stream finishes.
+    """
+    sent = set()
+    first_token_at = None
+
+    def pending_events() -> Iterator[str]:
+        if "sources" not in sent and response_meta.get("sources") is not None:
+            sent.add("sources")
+            yield format_event(stream_format, "sources", response_meta["sources"])
+        if "model" not in sent and response_meta.get("model"):
+            sent.add("model")
+            yield format_event(stream_format, "model", {
+                "model": response_meta["model"],
+                "routed_from": response_meta.get("routed_from"),
+                "cached": bool(response_meta.get("cached")),
+            })
+
+    yield format_event(stream_format, "start", start_data or {})
+    async for chunk in chunks:
+        for event in pending_events():
+            yield event
+        if first_token_at is None:
+            first_token_at = time.monotonic()
+            yield format_event(stream_format, "ttft", {"ms": round((first_token_at - started_at) * 1000, 1)})
+        yield format_event(stream_format, "token", {"text": chunk})
+
+    finished_at = time.monotonic()
+    for event in pending_events():
+        yield event
+    usage = response_meta.get("usage") or {"input_tokens": 0, "output_tokens": 0, "source": "none"}
+    generation_seconds = finished_at - first_token_at if first_token_at is not None else 0.0
+    yield format_event(stream_format, "done", {
+        "status": (MessageStatus.FAILED if response_meta.get("error") else MessageStatus.COMPLETE).value,
+        "usage": usage,
+        "tokens_per_second": round(usage["output_tokens"] / generation_seconds, 1) if generation_seconds > 0 else None,
+        "ttft_ms": round((first_token_at - started_at) * 1000, 1) if first_token_at is not None else None,
+        "duration_ms": round((finished_at - started_at) * 1000, 1),
+    })
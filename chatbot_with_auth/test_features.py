@@ -12,7 +12,9 @@ def test_models():
     """Test that all configured models can be instantiated"""
     print("Testing model configurations...")
     
-    for model_name in MODELS.keys():
+    for model_name, config in MODELS.items():
+        if config["provider"] == "auto":
+            continue
         try:
             model = get_model_instance(model_name)
             print(f"✅ {model_name}: OK")
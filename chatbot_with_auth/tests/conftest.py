@@ -0,0 +1,86 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+import pytest
+
+APP_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(APP_DIR))
+
+# Settings are read when config is first imported, so the environment is set up before any app module
+TEST_DB_PATH = Path(tempfile.mkdtemp()) / "test.db"
+os.environ["DATABASE_URL"] = f"sqlite:///{TEST_DB_PATH}"
+for name, value in {
+    "SECRET_KEY": "test-secret",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+    "GOOGLE_API_KEY": "test",
+    "DEEPSEEK_API_KEY": "test",
+    "GROK_API_KEY": "test",
+    "OPENROUTER_API_KEY": "test",
+    "TAVILY_API_KEY": "test",
+    "MAIL_USERNAME": "test",
+    "MAIL_PASSWORD": "test",
+    "MAIL_FROM": "test@example.com",
+    "MAIL_PORT": "25",
+    "MAIL_SERVER": "localhost",
+    "MAIL_STARTTLS": "false",
+    "MAIL_SSL_TLS": "false",
+}.items():
+    os.environ.setdefault(name, value)
+
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from sqlmodel import Session
+
+import main
+from database import engine
+from model_registry import ModelClientRegistry
+from models import User
+from persistence_queue import persistence_queue
+from security import create_access_token
+
+FAKE_ANSWER = "Hello from the fake model"
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(autouse=True)
+def fake_models(monkeypatch):
+    """Every provider answers with FAKE_ANSWER instead of calling out."""
+    monkeypatch.setattr(
+        ModelClientRegistry, "get",
+        lambda self, key, config: GenericFakeChatModel(messages=iter([AIMessage(content=FAKE_ANSWER)] * 100))
+    )
+
+
+@pytest.fixture
+def db_session(client):
+    with Session(engine) as session:
+        yield session
+
+
+def make_user(db_session: Session) -> User:
+    name = f"user-{uuid.uuid4().hex[:8]}"
+    user = User(username=name, email=f"{name}@example.com", hashed_password="x", is_verified=True)
+    db_session.add(user)
+    db_session.commit()
+    db_session.refresh(user)
+    return user
+
+
+def auth_headers(user: User) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': user.username})}"}
+
+
+def flush_writes():
+    """Waits until the persistence queue has committed everything queued so far."""
+    persistence_queue.flush()
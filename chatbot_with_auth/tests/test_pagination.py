@@ -0,0 +1,101 @@
+# tests/test_pagination.py
+from datetime import datetime, timedelta, UTC
+
+from conftest import auth_headers, make_user
+from models import ChatMessage, ChatSession
+
+
+def make_sessions(db_session, user, count):
+    """Sessions of user, the first one most recently active."""
+    now = datetime.now(UTC)
+    sessions = [
+        ChatSession(title=f"chat {i}", user_id=user.id, last_message_at=now - timedelta(minutes=i))
+        for i in range(count)
+    ]
+    db_session.add_all(sessions)
+    db_session.commit()
+    return [chat_session.id for chat_session in sessions]
+
+
+def test_session_pages_follow_next_cursor_to_the_end(client, db_session):
+    user = make_user(db_session)
+    session_ids = make_sessions(db_session, user, 5)
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"before_id": cursor} if cursor else {})}
+        page = client.get("/chats/", params=params, headers=auth_headers(user)).json()
+        seen.extend(chat_session["id"] for chat_session in page["sessions"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == session_ids
+
+
+def test_session_cursor_of_another_user_returns_an_empty_page(client, db_session):
+    owner, other = make_user(db_session), make_user(db_session)
+    [foreign_id] = make_sessions(db_session, owner, 1)
+    make_sessions(db_session, other, 2)
+
+    page = client.get("/chats/", params={"before_id": foreign_id}, headers=auth_headers(other)).json()
+    assert page == {"sessions": [], "next_cursor": None}
+
+
+def test_unknown_session_cursor_returns_an_empty_page(client, db_session):
+    user = make_user(db_session)
+    make_sessions(db_session, user, 2)
+
+    page = client.get("/chats/", params={"before_id": 10**9}, headers=auth_headers(user)).json()
+    assert page == {"sessions": [], "next_cursor": None}
+
+
+def make_messages(db_session, chat_session_id, count):
+    """Messages of one session, oldest first."""
+    start = datetime.now(UTC) - timedelta(hours=1)
+    messages = [
+        ChatMessage(content=f"message {i}", role="user", session_id=chat_session_id, created_at=start + timedelta(seconds=i))
+        for i in range(count)
+    ]
+    db_session.add_all(messages)
+    db_session.commit()
+    return [message.id for message in messages]
+
+
+def test_message_pages_scroll_back_to_the_first_message(client, db_session):
+    user = make_user(db_session)
+    [session_id] = make_sessions(db_session, user, 1)
+    message_ids = make_messages(db_session, session_id, 5)
+
+    pages, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"before_id": cursor} if cursor else {})}
+        page = client.get(f"/chats/{session_id}", params=params, headers=auth_headers(user)).json()
+        pages.append([message["id"] for message in page["messages"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert pages == [message_ids[3:], message_ids[1:3], message_ids[:1]]
+
+
+def test_message_cursor_from_another_session_returns_an_empty_page(client, db_session):
+    user = make_user(db_session)
+    session_id, other_session_id = make_sessions(db_session, user, 2)
+    make_messages(db_session, session_id, 3)
+    foreign_ids = make_messages(db_session, other_session_id, 3)
+
+    page = client.get(f"/chats/{session_id}", params={"before_id": foreign_ids[-1]}, headers=auth_headers(user)).json()
+    assert (page["messages"], page["next_cursor"]) == ([], None)
+
+
+def test_message_cursor_of_another_user_returns_an_empty_page(client, db_session):
+    owner, other = make_user(db_session), make_user(db_session)
+    [owner_session_id] = make_sessions(db_session, owner, 1)
+    [other_session_id] = make_sessions(db_session, other, 1)
+    foreign_ids = make_messages(db_session, owner_session_id, 3)
+    make_messages(db_session, other_session_id, 3)
+
+    page = client.get(f"/chats/{other_session_id}", params={"before_id": foreign_ids[-1]}, headers=auth_headers(other)).json()
+    assert (page["messages"], page["next_cursor"]) == ([], None)
+    # The owner's session itself stays out of reach
+    response = client.get(f"/chats/{owner_session_id}", params={"before_id": foreign_ids[-1]}, headers=auth_headers(other))
+    assert response.status_code == 404
@@ -0,0 +1,49 @@
+# tests/test_persistence_queue.py
+import asyncio
+import queue
+import threading
+
+import pytest
+
+from persistence_queue import UPDATE, PersistenceQueue
+
+
+def full_queue() -> PersistenceQueue:
+    """A queue with no room left and a writer that never drains it."""
+    persistence = PersistenceQueue()
+    persistence._queue = queue.Queue(maxsize=1)
+    persistence._queue.put_nowait((UPDATE, {"id": 0}, 0))
+    persistence._thread = threading.current_thread()
+    return persistence
+
+
+def test_cancelled_wait_for_a_full_queue_releases_the_pending_write():
+    persistence = full_queue()
+
+    async def scenario():
+        waiting = asyncio.create_task(persistence.aupdate_message(1, 7, {"content": "x"}))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+    asyncio.run(scenario())
+    assert persistence.wait_for_session(7, timeout=0)
+    # The cancelled write was never queued
+    assert persistence._queue.qsize() == 1
+    assert persistence.stats()["blocked_puts"] >= 1
+
+
+def test_waiting_write_is_queued_once_there_is_room():
+    persistence = full_queue()
+
+    async def scenario():
+        waiting = asyncio.create_task(persistence.aupdate_message(1, 7, {"content": "x"}))
+        await asyncio.sleep(0.02)
+        persistence._queue.get_nowait()
+        await asyncio.wait_for(waiting, 1)
+
+    asyncio.run(scenario())
+    assert persistence._queue.get_nowait() == (UPDATE, {"content": "x", "id": 1}, 7)
+    assert not persistence.wait_for_session(7, timeout=0)
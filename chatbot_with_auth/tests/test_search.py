@@ -0,0 +1,54 @@
+# tests/test_search.py
+import pytest
+
+from chat_history import build_match_query
+from conftest import auth_headers, make_user
+from models import ChatMessage, ChatSession
+
+
+def test_words_are_quoted_and_scoped_to_the_user():
+    assert build_match_query(7, "latency budgets") == 'user_id : "7" AND content : "latency" AND content : "budgets"'
+
+
+@pytest.mark.parametrize("query", ['"', '***', '-:()', '   '])
+def test_input_without_words_matches_nothing(query):
+    assert build_match_query(7, query) is None
+
+
+@pytest.mark.parametrize("query, words", [
+    ('cats NOT dogs', ["cats", "NOT", "dogs"]),
+    ('a OR b NEAR(c d)', ["a", "OR", "b", "NEAR", "c", "d"]),
+    ('"unterminated phrase*', ["unterminated", "phrase"]),
+    ('user_id:1 content:"x"', ["user_id", "1", "content", "x"]),
+    ('^start -minus +plus', ["start", "minus", "plus"]),
+])
+def test_operators_and_syntax_are_searched_literally(query, words):
+    assert build_match_query(7, query) == " AND ".join(['user_id : "7"'] + [f'content : "{word}"' for word in words])
+
+
+def add_message(db_session, user, content):
+    chat_session = ChatSession(title="search", user_id=user.id)
+    db_session.add(chat_session)
+    db_session.commit()
+    message = ChatMessage(content=content, role="user", session_id=chat_session.id)
+    db_session.add(message)
+    db_session.commit()
+    return message.id
+
+
+@pytest.mark.parametrize("query", ['NOT "', 'OR', '(*', 'user_id : "1"', 'NEAR(x y, 2'])
+def test_hostile_queries_do_not_fail(client, db_session, query):
+    user = make_user(db_session)
+    add_message(db_session, user, "nothing to see here")
+
+    response = client.get("/chats/search", params={"q": query}, headers=auth_headers(user))
+    assert response.status_code == 200
+
+
+def test_operator_words_are_found_and_other_users_messages_are_not(client, db_session):
+    user, other = make_user(db_session), make_user(db_session)
+    own_id = add_message(db_session, user, "Do NOT restart the workers during the migration")
+    add_message(db_session, other, "Do NOT restart the workers during the backup")
+
+    response = client.get("/chats/search", params={"q": "NOT restarting"}, headers=auth_headers(user))
+    assert [hit["message_id"] for hit in response.json()["hits"]] == [own_id]
@@ -0,0 +1,134 @@
+# tests/test_stream_buffer.py
+import asyncio
+
+import pytest
+
+from chats import discard_bot_message
+from config import settings
+from conftest import FAKE_ANSWER, auth_headers, make_user
+from models import ChatMessage, ChatSession, MessageStatus
+from stream_buffer import StreamBufferRegistry
+
+
+async def words(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def test_unread_answer_is_evicted_closed_and_its_row_discarded(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "stream_buffer_ttl_seconds", 0)
+    user = make_user(db_session)
+    chat_session = ChatSession(title="unread", user_id=user.id)
+    db_session.add(chat_session)
+    db_session.commit()
+    placeholder = ChatMessage(content="", role="model", session_id=chat_session.id, status=MessageStatus.STREAMING)
+    db_session.add(placeholder)
+    db_session.commit()
+    message_id = placeholder.id
+
+    async def scenario():
+        registry = StreamBufferRegistry()
+        producer = words("never", "read")
+        stream_buffer = registry.open(
+            chat_session.id, message_id, producer, on_unread=lambda: discard_bot_message(message_id)
+        )
+        assert await registry.evict_unstarted() == 1
+        assert registry.get(chat_session.id) is None
+        assert stream_buffer.done
+        # A closed generator yields nothing more
+        assert [chunk async for chunk in producer] == []
+
+    asyncio.run(scenario())
+    db_session.expire_all()
+    assert db_session.get(ChatMessage, message_id) is None
+
+
+def test_answers_being_read_are_not_evicted(monkeypatch):
+    monkeypatch.setattr(settings, "stream_buffer_ttl_seconds", 0)
+    unread_calls = []
+
+    async def scenario():
+        registry = StreamBufferRegistry()
+        stream_buffer = registry.open(1, 1, words("a", "b"), on_unread=lambda: unread_calls.append(1))
+        assert "".join([chunk async for chunk in stream_buffer.follow(0)]) == "ab"
+        assert await registry.evict_unstarted() == 0
+
+    asyncio.run(scenario())
+    assert unread_calls == []
+
+
+async def slow_answer(cancelled):
+    try:
+        yield "first"
+        await asyncio.sleep(10)
+        yield "never"
+    except (asyncio.CancelledError, GeneratorExit):
+        cancelled.append(True)
+        raise
+
+
+def test_answer_is_cancelled_as_soon_as_its_last_reader_leaves(monkeypatch):
+    monkeypatch.setattr(settings, "stream_resume_grace_seconds", 0)
+    cancelled = []
+
+    async def scenario():
+        stream_buffer = StreamBufferRegistry().open(1, 1, slow_answer(cancelled))
+        reader = stream_buffer.follow(0)
+        assert await reader.__anext__() == "first"
+        await reader.aclose()
+        await asyncio.sleep(0.01)
+        assert stream_buffer.done
+
+    asyncio.run(scenario())
+    assert cancelled == [True]
+
+
+def test_grace_period_keeps_an_abandoned_answer_for_a_reattach(monkeypatch):
+    monkeypatch.setattr(settings, "stream_resume_grace_seconds", 0.05)
+    cancelled = []
+
+    async def scenario():
+        stream_buffer = StreamBufferRegistry().open(1, 1, slow_answer(cancelled))
+        reader = stream_buffer.follow(0)
+        assert await reader.__anext__() == "first"
+        await reader.aclose()
+        await asyncio.sleep(0.01)
+        # Reattached within the grace period: still generating
+        reader = stream_buffer.follow(stream_buffer.end_offset)
+        resumed = asyncio.ensure_future(reader.__anext__())
+        await asyncio.sleep(0.1)
+        assert cancelled == [] and not stream_buffer.done
+        # The second reader disconnects too
+        resumed.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await resumed
+        await asyncio.sleep(0.1)
+        assert stream_buffer.done
+
+    asyncio.run(scenario())
+    assert cancelled == [True]
+
+
+def test_cross_origin_clients_can_read_the_reattach_headers(client, db_session):
+    user = make_user(db_session)
+    response = client.post(
+        "/chats/",
+        json={"prompt": "hi", "model_name": "gemini-2.0-flash"},
+        headers={**auth_headers(user), "Origin": "http://localhost:5173"}
+    )
+    exposed = {name.strip() for name in response.headers["access-control-expose-headers"].split(",")}
+    assert {"X-Message-ID", "X-Stream-Offset"} <= exposed
+    assert response.headers["X-Message-ID"]
+
+
+def test_reattach_continues_from_an_offset(client, db_session):
+    user = make_user(db_session)
+    response = client.post("/chats/", json={"prompt": "hi", "model_name": "gemini-2.0-flash"}, headers=auth_headers(user))
+    session_id, message_id = response.headers["X-Session-ID"], response.headers["X-Message-ID"]
+
+    resumed = client.get(
+        f"/chats/{session_id}/stream", params={"message_id": message_id, "offset": 6}, headers=auth_headers(user)
+    )
+    assert resumed.status_code == 200
+    assert resumed.headers["X-Stream-Offset"] == "6"
+    assert resumed.text == FAKE_ANSWER[6:]
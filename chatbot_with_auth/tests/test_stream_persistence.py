@@ -0,0 +1,120 @@
+# tests/test_stream_persistence.py
+import asyncio
+from datetime import datetime, timedelta, UTC
+
+from sqlmodel import select
+
+import chatbot_service
+import main
+from chat_history import fail_stale_streams
+from chatbot_service import ERROR_REPLY
+from config import settings
+from conftest import FAKE_ANSWER, auth_headers, flush_writes, make_user
+from models import ChatMessage, ChatSession, MessageStatus, Role
+
+
+def bot_messages(db_session, session_id):
+    db_session.expire_all()
+    return db_session.exec(
+        select(ChatMessage).where(ChatMessage.session_id == session_id, ChatMessage.role == "model")
+    ).all()
+
+
+def test_answer_is_saved_complete(client, db_session):
+    user = make_user(db_session)
+    response = client.post("/chats/", json={"prompt": "hi", "model_name": "gemini-2.0-flash"}, headers=auth_headers(user))
+    assert response.status_code == 200
+    assert response.text == FAKE_ANSWER
+    flush_writes()
+    [bot_message] = bot_messages(db_session, int(response.headers["X-Session-ID"]))
+    assert bot_message.status == MessageStatus.COMPLETE
+    assert bot_message.content == FAKE_ANSWER
+
+
+def test_unknown_model_is_rejected_before_any_row_is_created(client, db_session):
+    user = make_user(db_session)
+    response = client.post("/chats/", json={"prompt": "hi", "model_name": "bogus"}, headers=auth_headers(user))
+    assert response.status_code == 400
+    db_session.expire_all()
+    assert db_session.exec(select(ChatSession).where(ChatSession.user_id == user.id)).all() == []
+
+
+def test_unknown_batch_model_is_rejected(client, db_session):
+    user = make_user(db_session)
+    user.role = Role.ADMIN
+    db_session.add(user)
+    db_session.commit()
+    response = client.post(
+        "/chats/batch",
+        json={"items": [{"prompt": "a"}, {"prompt": "b", "model_name": "bogus"}]},
+        headers=auth_headers(user)
+    )
+    assert response.status_code == 400
+
+
+def test_error_outside_the_chatbot_service_marks_the_row_failed(client, db_session, monkeypatch):
+    async def broken_retrieval(*args, **kwargs):
+        raise RuntimeError("vector store unavailable")
+
+    monkeypatch.setattr(chatbot_service, "gather_rag_context", broken_retrieval)
+    user = make_user(db_session)
+    chat_session = ChatSession(title="docs", user_id=user.id, has_documents=True)
+    db_session.add(chat_session)
+    db_session.commit()
+
+    response = client.post(
+        "/chats/",
+        json={"prompt": "what do the documents say?", "session_id": chat_session.id, "model_name": "gemini-2.0-flash"},
+        headers=auth_headers(user)
+    )
+    assert response.text == ERROR_REPLY
+    flush_writes()
+    [bot_message] = bot_messages(db_session, chat_session.id)
+    assert bot_message.status == MessageStatus.FAILED
+    assert bot_message.content == ERROR_REPLY
+    assert bot_message.output_tokens == 0
+
+
+
+def test_fail_stale_streams_skips_answers_still_streaming_here(client, db_session):
+    user = make_user(db_session)
+    chat_session = ChatSession(title="stale", user_id=user.id)
+    db_session.add(chat_session)
+    db_session.commit()
+    long_ago = datetime.now(UTC) - timedelta(hours=1)
+    orphaned, live = (
+        ChatMessage(content="partial", role="model", session_id=chat_session.id, status=MessageStatus.STREAMING, created_at=long_ago)
+        for _ in range(2)
+    )
+    db_session.add_all([orphaned, live])
+    db_session.commit()
+
+    fail_stale_streams(db_session, datetime.now(UTC), exclude_ids=[live.id])
+    db_session.commit()
+
+    db_session.refresh(orphaned)
+    db_session.refresh(live)
+    assert (orphaned.status, orphaned.truncated) == (MessageStatus.FAILED, True)
+    assert live.status == MessageStatus.STREAMING
+
+
+
+def test_stale_streams_are_swept_after_startup(client, db_session, monkeypatch):
+    monkeypatch.setattr(settings, "stream_stale_after_seconds", 0)
+    monkeypatch.setattr(settings, "stream_sweep_interval_seconds", 0.01)
+    user = make_user(db_session)
+    chat_session = ChatSession(title="restart", user_id=user.id)
+    db_session.add(chat_session)
+    db_session.commit()
+    interrupted = ChatMessage(content="partial", role="model", session_id=chat_session.id, status=MessageStatus.STREAMING)
+    db_session.add(interrupted)
+    db_session.commit()
+
+    async def run_sweeper_briefly():
+        sweeper = asyncio.create_task(main.run_stream_sweeper())
+        await asyncio.sleep(0.2)
+        sweeper.cancel()
+
+    asyncio.run(run_sweeper_briefly())
+    db_session.refresh(interrupted)
+    assert interrupted.status == MessageStatus.FAILED
@@ -0,0 +1,34 @@
+# tests/test_web_search.py
+import asyncio
+
+import httpx
+
+import web_search_service
+from web_search_service import TavilySearchService, aclose_search_client
+
+
+def test_searches_share_one_pooled_client(monkeypatch):
+    created = []
+    real_client = httpx.AsyncClient
+
+    def tavily(request):
+        return httpx.Response(200, json={"results": [{"title": "t", "content": "c", "url": "u", "score": 0.5}]})
+
+    def counting_client(**kwargs):
+        client = real_client(transport=httpx.MockTransport(tavily), **kwargs)
+        created.append(client)
+        return client
+
+    monkeypatch.setattr(web_search_service.httpx, "AsyncClient", counting_client)
+
+    async def scenario():
+        service = TavilySearchService()
+        first = await service.asearch("first", timeout=5)
+        second = await TavilySearchService().asearch("second", timeout=5)
+        await aclose_search_client()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == second == [{"title": "t", "content": "c", "url": "u", "score": 0.5}]
+    assert len(created) == 1
+    assert created[0].is_closed
@@ -0,0 +1,86 @@
+# token_usage.py
+from typing import AsyncIterator, Dict, Optional
+
+from langchain_core.messages import BaseMessageChunk
+from langchain_core.messages.ai import add_usage
+
+from prompt_budget import count_tokens
+
+
+class StreamUsage:
+    """
+    Input/output token counts for one upstream LLM stream.
+
+    Providers report usage on the stream's chunks: OpenAI-compatible APIs and
+    Groq send it once on the final chunk, Gemini sends per-chunk deltas, so the
+    reported values are summed. When a provider reports nothing, the counts fall
+    back to our tokenizer: the fitted prompt size and the generated text.
+    """
+
+    def __init__(self, estimated_input_tokens: int = 0):
+        self.estimated_input_tokens = estimated_input_tokens
+        self.reported = None
+        self.output_text_parts = []
+
+    @property
+    def source(self) -> str:
+        return "provider" if self.reported else "estimate"
+
+    @property
+    def input_tokens(self) -> int:
+        if self.reported and self.reported.get("input_tokens"):
+            return self.reported["input_tokens"]
+        return self.estimated_input_tokens
+
+    @property
+    def output_tokens(self) -> int:
+        if self.reported and self.reported.get("output_tokens"):
+            return self.reported["output_tokens"]
+        return count_tokens("".join(self.output_text_parts))
+
+    def as_dict(self) -> Dict:
+        return {
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "source": self.source,
+        }
+
+
+def chunk_text(chunk: BaseMessageChunk) -> str:
+    """The text of a streamed message chunk (some providers send a list of content parts)."""
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    return "".join(
+        part if isinstance(part, str) else part.get("text", "")
+        for part in content
+        if isinstance(part, str) or part.get("type") == "text"
+    )
+
+
+async def stream_text_with_usage(
+    message_stream: AsyncIterator[BaseMessageChunk], usage: StreamUsage
+) -> AsyncIterator[str]:
+    """Yields the text of each message chunk while collecting token usage into usage."""
+    try:
+        async for chunk in message_stream:
+            chunk_usage = getattr(chunk, "usage_metadata", None)
+            if chunk_usage:
+                usage.reported = add_usage(usage.reported, chunk_usage)
+            text = chunk_text(chunk)
+            if text:
+                usage.output_text_parts.append(text)
+                yield text
+    finally:
+        await message_stream.aclose()
+
+
+def cached_usage() -> Dict:
+    """Usage for an answer served from the semantic cache: no provider call was made."""
+    return {"input_tokens": 0, "output_tokens": 0, "source": "cache"}
+
+
+def resolve_usage(usage_by_model: Dict[str, StreamUsage], model_name: Optional[str]) -> Optional[Dict]:
+    """Usage of the stream that won failover, if it started at all."""
+    usage = usage_by_model.get(model_name) if model_name else None
+    return usage.as_dict() if usage is not None else None
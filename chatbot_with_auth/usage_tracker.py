@@ -7,60 +7,90 @@ from database import engine
 from models import UsageStats, User
 
 
+class UsageDelta:
+    """Increments for one user's daily UsageStats row; deltas for the same user can be merged before writing."""
+
+    def __init__(self, messages_sent: int = 0, tokens_used: int = 0, input_tokens: int = 0, output_tokens: int = 0,
+                 sessions_created: int = 0, web_searches_made: int = 0):
+        self.messages_sent = messages_sent
+        self.tokens_used = tokens_used
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.sessions_created = sessions_created
+        self.web_searches_made = web_searches_made
+        self.model_usage: Dict[str, int] = {}
+        self.model_tokens: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def for_message(cls, tokens_used: int = 0, model_name: str = None, web_search_used: bool = False,
+                    input_tokens: int = None, output_tokens: int = None) -> "UsageDelta":
+        """One message sent by the user. When token counts are given, tokens_used is their sum."""
+        if input_tokens is not None or output_tokens is not None:
+            input_tokens = input_tokens or 0
+            output_tokens = output_tokens or 0
+            tokens_used = input_tokens + output_tokens
+        else:
+            input_tokens, output_tokens = 0, 0
+        delta = cls(messages_sent=1, tokens_used=tokens_used, input_tokens=input_tokens,
+                    output_tokens=output_tokens, web_searches_made=1 if web_search_used else 0)
+        if model_name:
+            delta.model_usage[model_name] = 1
+            delta.model_tokens[model_name] = {"input_tokens": input_tokens, "output_tokens": output_tokens}
+        return delta
+
+    def merge(self, other: "UsageDelta"):
+        self.messages_sent += other.messages_sent
+        self.tokens_used += other.tokens_used
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.sessions_created += other.sessions_created
+        self.web_searches_made += other.web_searches_made
+        for model_name, count in other.model_usage.items():
+            self.model_usage[model_name] = self.model_usage.get(model_name, 0) + count
+        for model_name, counts in other.model_tokens.items():
+            totals = self.model_tokens.setdefault(model_name, {"input_tokens": 0, "output_tokens": 0})
+            totals["input_tokens"] += counts["input_tokens"]
+            totals["output_tokens"] += counts["output_tokens"]
+
+
 class UsageTracker:
     @staticmethod
-    def track_message(user_id: int, tokens_used: int = 0, model_name: str = None, web_search_used: bool = False):
-        """Track a message sent by the user"""
+    def track_message(user_id: int, tokens_used: int = 0, model_name: str = None, web_search_used: bool = False,
+                      input_tokens: int = None, output_tokens: int = None):
+        """Track a message sent by the user. When token counts are given, tokens_used is their sum."""
+        delta = UsageDelta.for_message(tokens_used, model_name, web_search_used, input_tokens, output_tokens)
         with Session(engine) as session:
-            today = datetime.now(UTC).date()
-            
-            # Get or create today's usage stats
-            statement = select(UsageStats).where(
-                UsageStats.user_id == user_id,
-                func.date(UsageStats.date) == today
-            )
-            usage_stat = session.exec(statement).first()
-            
-            if not usage_stat:
-                usage_stat = UsageStats(
-                    user_id=user_id,
-                    date=datetime.now(UTC),
-                    messages_sent=0,
-                    tokens_used=0,
-                    sessions_created=0,
-                    web_searches_made=0,
-                    model_usage="{}"
-                )
-                session.add(usage_stat)
-            
-            # Update stats
-            usage_stat.messages_sent += 1
-            usage_stat.tokens_used += tokens_used
-            
-            if web_search_used:
-                usage_stat.web_searches_made += 1
-            
-            # Update model usage
-            model_usage = json.loads(usage_stat.model_usage) if usage_stat.model_usage else {}
-            if model_name:
-                model_usage[model_name] = model_usage.get(model_name, 0) + 1
-                usage_stat.model_usage = json.dumps(model_usage)
-            
+            UsageTracker.apply_deltas(session, {user_id: delta})
             session.commit()
     
     @staticmethod
     def track_session_created(user_id: int):
         """Track a new session creation"""
         with Session(engine) as session:
-            today = datetime.now(UTC).date()
-            
-            # Get or create today's usage stats
-            statement = select(UsageStats).where(
-                UsageStats.user_id == user_id,
-                func.date(UsageStats.date) == today
-            )
-            usage_stat = session.exec(statement).first()
-            
+            UsageTracker.apply_deltas(session, {user_id: UsageDelta(sessions_created=1)})
+            session.commit()
+    
+    @staticmethod
+    def apply_deltas(session: Session, deltas: Dict[int, UsageDelta]):
+        """
+        Adds each user's delta to today's UsageStats row, creating missing rows.
+        Reads all the rows with one query and leaves committing to the caller.
+        """
+        if not deltas:
+            return
+        today = datetime.now(UTC).date()
+        
+        # Get or create today's usage stats
+        statement = select(UsageStats).where(
+            UsageStats.user_id.in_(list(deltas)),
+            func.date(UsageStats.date) == today
+        )
+        usage_stats = {}
+        for usage_stat in session.exec(statement).all():
+            usage_stats.setdefault(usage_stat.user_id, usage_stat)
+        
+        for user_id, delta in deltas.items():
+            usage_stat = usage_stats.get(user_id)
             if not usage_stat:
                 usage_stat = UsageStats(
                     user_id=user_id,
@@ -69,12 +99,32 @@ class UsageTracker:
                     tokens_used=0,
                     sessions_created=0,
                     web_searches_made=0,
-                    model_usage="{}"
+                    model_usage="{}",
+                    model_tokens="{}"
                 )
                 session.add(usage_stat)
             
-            usage_stat.sessions_created += 1
-            session.commit()
+            # Update stats
+            usage_stat.messages_sent += delta.messages_sent
+            usage_stat.tokens_used += delta.tokens_used
+            usage_stat.input_tokens = (usage_stat.input_tokens or 0) + delta.input_tokens
+            usage_stat.output_tokens = (usage_stat.output_tokens or 0) + delta.output_tokens
+            usage_stat.sessions_created += delta.sessions_created
+            usage_stat.web_searches_made += delta.web_searches_made
+            
+            # Update model usage and per-model token counts
+            if delta.model_usage:
+                model_usage = json.loads(usage_stat.model_usage) if usage_stat.model_usage else {}
+                for model_name, count in delta.model_usage.items():
+                    model_usage[model_name] = model_usage.get(model_name, 0) + count
+                usage_stat.model_usage = json.dumps(model_usage)
+                
+                model_tokens = json.loads(usage_stat.model_tokens) if usage_stat.model_tokens else {}
+                for model_name, added in delta.model_tokens.items():
+                    counts = model_tokens.setdefault(model_name, {"input_tokens": 0, "output_tokens": 0})
+                    counts["input_tokens"] += added["input_tokens"]
+                    counts["output_tokens"] += added["output_tokens"]
+                usage_stat.model_tokens = json.dumps(model_tokens)
     
     @staticmethod
     def get_user_usage_stats(user_id: int, days: int = 30) -> List[Dict]:
@@ -94,13 +144,17 @@ class UsageTracker:
             result = []
             for stat in usage_stats:
                 model_usage = json.loads(stat.model_usage) if stat.model_usage else {}
+                model_tokens = json.loads(stat.model_tokens) if stat.model_tokens else {}
                 result.append({
                     "date": stat.date.strftime("%Y-%m-%d"),
                     "messages_sent": stat.messages_sent,
                     "tokens_used": stat.tokens_used,
+                    "input_tokens": stat.input_tokens or 0,
+                    "output_tokens": stat.output_tokens or 0,
                     "sessions_created": stat.sessions_created,
                     "web_searches_made": stat.web_searches_made,
-                    "model_usage": model_usage
+                    "model_usage": model_usage,
+                    "model_tokens": model_tokens
                 })
             
             return result
@@ -113,26 +167,37 @@ class UsageTracker:
                 func.sum(UsageStats.messages_sent).label("total_messages"),
                 func.sum(UsageStats.tokens_used).label("total_tokens"),
                 func.sum(UsageStats.sessions_created).label("total_sessions"),
-                func.sum(UsageStats.web_searches_made).label("total_searches")
+                func.sum(UsageStats.web_searches_made).label("total_searches"),
+                func.sum(UsageStats.input_tokens).label("total_input_tokens"),
+                func.sum(UsageStats.output_tokens).label("total_output_tokens")
             ).where(UsageStats.user_id == user_id)
             
             result = session.exec(statement).first()
             
             # Get aggregated model usage
-            model_statement = select(UsageStats.model_usage).where(UsageStats.user_id == user_id)
+            model_statement = select(UsageStats.model_usage, UsageStats.model_tokens).where(UsageStats.user_id == user_id)
             model_usages = session.exec(model_statement).all()
             
             aggregated_models = {}
-            for usage_json in model_usages:
+            aggregated_tokens = {}
+            for usage_json, tokens_json in model_usages:
                 if usage_json:
                     model_data = json.loads(usage_json)
                     for model, count in model_data.items():
                         aggregated_models[model] = aggregated_models.get(model, 0) + count
+                if tokens_json:
+                    for model, counts in json.loads(tokens_json).items():
+                        totals = aggregated_tokens.setdefault(model, {"input_tokens": 0, "output_tokens": 0})
+                        totals["input_tokens"] += counts.get("input_tokens", 0)
+                        totals["output_tokens"] += counts.get("output_tokens", 0)
             
             return {
                 "total_messages": result[0] or 0,
                 "total_tokens": result[1] or 0,
                 "total_sessions": result[2] or 0,
                 "total_searches": result[3] or 0,
-                "model_usage": aggregated_models
+                "total_input_tokens": result[4] or 0,
+                "total_output_tokens": result[5] or 0,
+                "model_usage": aggregated_models,
+                "model_tokens": aggregated_tokens
             }
@@ -1,8 +1,35 @@
+import asyncio
 import requests
-from typing import List, Dict
+import httpx
+from typing import List, Dict, Optional
 from config import settings
 
 
+# Shared by every web search so it reuses a warm keep-alive connection to Tavily
+# instead of paying a TCP/TLS handshake per answer; closed on application shutdown
+_async_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _search_http_client() -> httpx.AsyncClient:
+    global _async_http_client
+    if _async_http_client is None or _async_http_client.is_closed:
+        max_connections = settings.llm_max_connections.get("tavily", settings.llm_default_max_connections)
+        _async_http_client = httpx.AsyncClient(limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=settings.llm_keepalive_expiry_seconds,
+        ))
+    return _async_http_client
+
+
+async def aclose_search_client():
+    """Close the shared web search connection pool. Called on application shutdown."""
+    global _async_http_client
+    client, _async_http_client = _async_http_client, None
+    if client is not None:
+        await client.aclose()
+
+
 class TavilySearchService:
     def __init__(self):
         self.api_key = settings.tavily_api_key
@@ -20,34 +47,58 @@ class TavilySearchService:
             List of search results with title, content, and URL
         """
         try:
-            payload = {
-                "api_key": self.api_key,
-                "query": query,
-                "search_depth": "basic",
-                "include_answer": True,
-                "include_images": False,
-                "include_raw_content": False,
-                "max_results": max_results
-            }
+            payload = self._build_payload(query, max_results)
             
             response = requests.post(self.base_url, json=payload)
             response.raise_for_status()
             
-            data = response.json()
+            return self._parse_results(response.json())
             
-            # Format the results
-            results = []
-            if "results" in data:
-                for result in data["results"]:
-                    results.append({
-                        "title": result.get("title", ""),
-                        "content": result.get("content", ""),
-                        "url": result.get("url", ""),
-                        "score": result.get("score", 0)
-                    })
+        except Exception as e:
+            print(f"Error in web search: {e}")
+            return []
+    
+    def _build_payload(self, query: str, max_results: int) -> Dict:
+        return {
+            "api_key": self.api_key,
+            "query": query,
+            "search_depth": "basic",
+            "include_answer": True,
+            "include_images": False,
+            "include_raw_content": False,
+            "max_results": max_results
+        }
+    
+    def _parse_results(self, data: Dict) -> List[Dict]:
+        # Format the results
+        results = []
+        if "results" in data:
+            for result in data["results"]:
+                results.append({
+                    "title": result.get("title", ""),
+                    "content": result.get("content", ""),
+                    "url": result.get("url", ""),
+                    "score": result.get("score", 0)
+                })
+        
+        return results
+    
+    async def asearch(self, query: str, max_results: int = 5, timeout: Optional[float] = None) -> List[Dict]:
+        """
+        Async variant of search() for the streaming chat path.
+        Same payload and result format; returns [] on any error or after timeout seconds.
+        """
+        try:
+            payload = self._build_payload(query, max_results)
+            
+            response = await asyncio.wait_for(_search_http_client().post(self.base_url, json=payload), timeout)
+            response.raise_for_status()
             
-            return results
+            return self._parse_results(response.json())
             
+        except asyncio.TimeoutError:
+            print(f"--- INFO: Web search took longer than {timeout}s, continuing without web context ---")
+            return []
         except Exception as e:
             print(f"Error in web search: {e}")
             return []
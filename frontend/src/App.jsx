@@ -46,15 +46,19 @@ const api = {
         const data = await response.json();
         return data.access_token;
     },
-    async getChatSessions(token) {
-        const response = await fetch(`${API_BASE_URL}/chats/`, {
+    async getChatSessions(token, beforeId = null) {
+        // Most recently active first; pass the previous response's next_cursor for the next page
+        const query = beforeId ? `?before_id=${beforeId}` : '';
+        const response = await fetch(`${API_BASE_URL}/chats/${query}`, {
             headers: { 'Authorization': `Bearer ${token}` }
         });
         if (!response.ok) throw new Error('Failed to fetch sessions');
         return response.json();
     },
-    async getChatHistory(token, sessionId) {
-        const response = await fetch(`${API_BASE_URL}/chats/${sessionId}`, {
+    async getChatHistory(token, sessionId, beforeId = null) {
+        // Latest page by default; pass the previous response's next_cursor to load older messages
+        const query = beforeId ? `?before_id=${beforeId}` : '';
+        const response = await fetch(`${API_BASE_URL}/chats/${sessionId}${query}`, {
             headers: { 'Authorization': `Bearer ${token}` }
         });
         if (!response.ok) throw new Error('Failed to fetch history');
@@ -127,7 +131,7 @@ const LoginPage = () => {
     );
 };
 
-const Sidebar = ({ sessions, onSelectSession, onNewChat, activeSessionId, isLoading }) => {
+const Sidebar = ({ sessions, onSelectSession, onNewChat, activeSessionId, isLoading, hasMoreSessions, onLoadMoreSessions }) => {
     const { logout } = useAuth();
     return (
         <div className="w-64 bg-gray-800 flex flex-col p-4">
@@ -151,6 +155,14 @@ const Sidebar = ({ sessions, onSelectSession, onNewChat, activeSessionId, isLoad
                         </button>
                     ))
                 )}
+                {!isLoading && hasMoreSessions && (
+                    <button
+                        onClick={onLoadMoreSessions}
+                        className="w-full px-3 py-2 mt-1 text-xs text-gray-400 rounded-md hover:bg-gray-700 hover:text-white transition-colors"
+                    >
+                        Load older chats
+                    </button>
+                )}
             </div>
             <button onClick={logout} className="flex items-center justify-center w-full px-4 py-2 mt-4 text-sm font-semibold text-gray-300 bg-gray-700 rounded-md hover:bg-red-600 hover:text-white transition-colors">
                 <LogOut className="w-4 h-4 mr-2" /> Logout
@@ -172,13 +184,15 @@ const ChatMessageComponent = ({ message }) => {
     );
 };
 
-const ChatWindow = ({ messages, onSendMessage, isLoading }) => {
+const ChatWindow = ({ messages, onSendMessage, isLoading, hasOlderMessages, onLoadOlderMessages, isOlderLoading }) => {
     const [input, setInput] = useState('');
     const messagesEndRef = useRef(null);
+    // Loading earlier messages keeps the last one, so it does not scroll to the bottom
+    const lastMessage = messages[messages.length - 1];
 
     useEffect(() => {
         messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
-    }, [messages]);
+    }, [lastMessage]);
 
     const handleSend = () => {
         if (input.trim()) {
@@ -197,6 +211,17 @@ const ChatWindow = ({ messages, onSendMessage, isLoading }) => {
                         <p>Start a new conversation or select one from the history.</p>
                     </div>
                 )}
+                {hasOlderMessages && (
+                    <div className="flex justify-center mb-4">
+                        <button
+                            onClick={onLoadOlderMessages}
+                            disabled={isOlderLoading}
+                            className="px-3 py-1 text-sm text-gray-400 border border-gray-700 rounded-md hover:text-white disabled:opacity-50"
+                        >
+                            {isOlderLoading ? 'Loading...' : 'Load earlier messages'}
+                        </button>
+                    </div>
+                )}
                 {messages.map((msg, index) => <ChatMessageComponent key={index} message={msg} />)}
                 {isLoading && <ChatMessageComponent message={{ role: 'model', content: 'Thinking...' }} />}
                 <div ref={messagesEndRef} />
@@ -223,9 +248,14 @@ const ChatWindow = ({ messages, onSendMessage, isLoading }) => {
 const ChatPage = () => {
     const { token } = useAuth();
     const [sessions, setSessions] = useState([]);
+    // next_cursor of the last session page shown; null once every session is listed
+    const [sessionsCursor, setSessionsCursor] = useState(null);
     const [activeSession, setActiveSession] = useState(null);
     const [messages, setMessages] = useState([]);
+    // next_cursor of the oldest history page shown; null once the first message is loaded
+    const [historyCursor, setHistoryCursor] = useState(null);
     const [isLoading, setIsLoading] = useState(false);
+    const [isOlderLoading, setIsOlderLoading] = useState(false);
     const [isHistoryLoading, setIsHistoryLoading] = useState(false);
 
     useEffect(() => {
@@ -234,7 +264,8 @@ const ChatPage = () => {
                 setIsHistoryLoading(true);
                 try {
                     const data = await api.getChatSessions(token);
-                    setSessions(data);
+                    setSessions(data.sessions);
+                    setSessionsCursor(data.next_cursor);
                 } catch (error) {
                     console.error("Failed to fetch sessions:", error);
                 } finally {
@@ -245,22 +276,50 @@ const ChatPage = () => {
         }
     }, [token]);
 
+    const fetchMoreSessions = async () => {
+        if (!token || !sessionsCursor) return;
+        try {
+            const data = await api.getChatSessions(token, sessionsCursor);
+            setSessions(prev => [...prev, ...data.sessions]);
+            setSessionsCursor(data.next_cursor);
+        } catch (error) {
+            console.error("Failed to fetch more sessions:", error);
+        }
+    };
+
     const handleSelectSession = async (sessionId) => {
         setIsLoading(true);
         setActiveSession(sessionId);
         try {
             const data = await api.getChatHistory(token, sessionId);
             setMessages(data.messages);
+            setHistoryCursor(data.next_cursor);
         } catch (error) {
             console.error("Failed to fetch chat history:", error);
+            setHistoryCursor(null);
         } finally {
             setIsLoading(false);
         }
     };
+
+    const handleLoadOlderMessages = async () => {
+        if (!activeSession || !historyCursor || isOlderLoading) return;
+        setIsOlderLoading(true);
+        try {
+            const data = await api.getChatHistory(token, activeSession, historyCursor);
+            setMessages(prev => [...data.messages, ...prev]);
+            setHistoryCursor(data.next_cursor);
+        } catch (error) {
+            console.error("Failed to fetch older messages:", error);
+        } finally {
+            setIsOlderLoading(false);
+        }
+    };
     
     const handleNewChat = () => {
         setActiveSession(null);
         setMessages([]);
+        setHistoryCursor(null);
     };
 
     const handleSendMessage = async (prompt) => {
@@ -292,11 +351,16 @@ const ChatPage = () => {
                 onNewChat={handleNewChat}
                 activeSessionId={activeSession}
                 isLoading={isHistoryLoading}
+                hasMoreSessions={!!sessionsCursor}
+                onLoadMoreSessions={fetchMoreSessions}
             />
             <ChatWindow
                 messages={messages}
                 onSendMessage={handleSendMessage}
                 isLoading={isLoading}
+                hasOlderMessages={!!historyCursor}
+                onLoadOlderMessages={handleLoadOlderMessages}
+                isOlderLoading={isOlderLoading}
             />
         </div>
     );